@@ -1,33 +1,157 @@
 import os
 import json
+import io
 import base64
+import hashlib
 import random
-import tempfile
+import re
 import datetime
+import time
+import contextvars
+import threading
+import uuid
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime as dt
 import pytz
-from flask import Flask, request, jsonify, send_file
-import vertexai
-from vertexai.generative_models import GenerativeModel
-from vertexai.preview.vision_models import ImageGenerationModel
-from src.utils.text_overlay import overlay_greeting
+from flask import Flask, Request, request, jsonify, send_file, g, Response
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.utils import safe_join
+from PIL import Image
+from src.utils.text_overlay import overlay_greeting, preload_fonts, find_font, pick_layout
+from src.utils.debug_sink import DebugSink
+from src.utils.background_pool import BackgroundPool
+from src.utils.prompt_cache import PromptCache, normalize_input
+from src.utils.cache import ResultCache
+from src.utils.jobs import JobManager, JobQueueFull
+from src.utils.encoder import OutputEncoder, negotiate, extension
+from src.utils.upload import ingest_upload, UploadError, MAX_UPLOAD_BYTES
+from src.utils.admission import AdmissionController, AdmissionRejected
+from src.utils.metrics import StageMetrics, server_timing
 import traceback
 
+class InMemoryRequest(Request):
+    """Keep multipart file parts in memory (werkzeug spools parts > 500 KB to temp files)"""
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return io.BytesIO()
+
 app = Flask(__name__)
+app.request_class = InMemoryRequest
+# Whole-request cap: the upload limit plus room for the other form fields
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES + 64 * 1024
 
-# Initialize Vertex AI
+# Vertex AI is imported and initialized on the first model call (get_models) or
+# by /warmup, so importing this module stays fast and works offline.
+# VERTEX_BACKEND=fake swaps in the offline models from src/utils/fake_vertex.py.
 PROJECT_ID = "hackathon-468512"
 LOCATION = "us-central1"
-vertexai.init(project=PROJECT_ID, location=LOCATION)
+VERTEX_BACKEND = os.environ.get('VERTEX_BACKEND', 'vertex').lower()
 
 # Global variables
 image_model = None
 text_model = None
 morning_config = None
+_models_lock = threading.Lock()
+
+# Worker pool for concurrent pipeline nodes (Imagen background || blessing text)
+PIPELINE_WORKERS = int(os.environ.get('PIPELINE_WORKERS', '8'))
+pipeline_executor = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix='pipeline')
+
+# Debug artifacts (request JSON, backgrounds, final images) go through an
+# asynchronous sink grouped per request id with a byte budget; /tmp on Cloud
+# Run is memory-backed. DEBUG_SINK_MODE: off (production) | sampled | all.
+DEBUG_DIR = os.environ.get('DEBUG_DIR', "/tmp/morning_debug")
+DEBUG_SINK_MODE = os.environ.get(
+    'DEBUG_SINK_MODE',
+    'all' if os.environ.get('DEBUG_ARTIFACTS', 'false').lower() == 'true' else 'off'
+).lower()
+debug_sink = DebugSink(
+    DEBUG_DIR,
+    mode=DEBUG_SINK_MODE,
+    sample_rate=float(os.environ.get('DEBUG_SAMPLE_RATE', '0.05')),
+    max_bytes=int(os.environ.get('DEBUG_MAX_BYTES', str(64 * 1024 * 1024))),
+)
+JPEG_QUALITY = 95
+
+# Pre-generated backgrounds per (style, holiday, period) for prompt-less
+# requests; each Imagen PNG is ~1.5 MB, kept in memory. 0 disables the pool.
+BACKGROUND_POOL_SIZE = int(os.environ.get('BACKGROUND_POOL_SIZE', '2'))
+BACKGROUND_POOL_MAX_BYTES = int(os.environ.get('BACKGROUND_POOL_MAX_BYTES', str(64 * 1024 * 1024)))
+BACKGROUND_POOL_TTL = int(os.environ.get('BACKGROUND_POOL_TTL', str(3 * 3600)))
+
+# Gemini image prompt + blessing pairs per (normalized input, template,
+# holiday, period); a hit skips both Gemini calls. 0 disables the cache.
+PROMPT_CACHE_SIZE = int(os.environ.get('PROMPT_CACHE_SIZE', '3'))
+PROMPT_CACHE_TTL = int(os.environ.get('PROMPT_CACHE_TTL', str(6 * 3600)))
+PROMPT_CACHE_MAX_USES = int(os.environ.get('PROMPT_CACHE_MAX_USES', '5'))
+
+# Final images for prompt-less, upload-less requests, keyed by
+# (template, custom_text, period, holiday, layout seed). 0 disables the cache.
+RESULT_CACHE_TTL = int(os.environ.get('RESULT_CACHE_TTL', '600'))
+RESULT_CACHE_MAX_BYTES = int(os.environ.get('RESULT_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+LAYOUT_SEEDS = 4  # a request without layout_seed picks one, so cached results still vary
+MAX_VARIANTS = 4  # Imagen returns at most 4 images per call
+
+# Re-encoded outputs (webp / progressive jpeg / png at thumb|share|full),
+# encoded once per (image, format, size)
+ENCODED_CACHE_TTL = int(os.environ.get('ENCODED_CACHE_TTL', '600'))
+ENCODED_CACHE_MAX_BYTES = int(os.environ.get('ENCODED_CACHE_MAX_BYTES', str(16 * 1024 * 1024)))
+
+# Composed JPEGs addressed by sha256(background, overlay parameters): repeat
+# compositions (retries, variants of one upload) skip the overlay and
+# GET /images/<key> serves re-downloads. 0 disables storage.
+COMPOSED_STORE_TTL = int(os.environ.get('COMPOSED_STORE_TTL', '3600'))
+COMPOSED_STORE_MAX_BYTES = int(os.environ.get('COMPOSED_STORE_MAX_BYTES', str(64 * 1024 * 1024)))
+composed_store = ResultCache(ttl=COMPOSED_STORE_TTL, max_bytes=COMPOSED_STORE_MAX_BYTES)
+
+# Every generation (sync routes included) runs on the job pool; this bounds
+# concurrent pipelines independently of the number of HTTP threads.
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '8'))
+JOB_MAX_PENDING = int(os.environ.get('JOB_MAX_PENDING', '64'))
+JOB_RESULT_TTL = int(os.environ.get('JOB_RESULT_TTL', '600'))
+JOB_MAX_WAIT = float(os.environ.get('JOB_MAX_WAIT', '30'))
+# Finished /jobs results hold up to MAX_VARIANTS final images each; the oldest are dropped beyond this budget
+JOB_RESULT_MAX_BYTES = int(os.environ.get('JOB_RESULT_MAX_BYTES', str(64 * 1024 * 1024)))
+
+def greeting_result_bytes(result):
+    """Final image bytes held by a render_greeting result"""
+    return sum(len(v['final_image_bytes']) for v in result['variants'])
+
+job_manager = JobManager(workers=JOB_WORKERS, max_pending=JOB_MAX_PENDING, result_ttl=JOB_RESULT_TTL,
+                         max_bytes=JOB_RESULT_MAX_BYTES, size_of=greeting_result_bytes)
 
-# Create debug directory
-DEBUG_DIR = "/tmp/morning_debug"
-os.makedirs(DEBUG_DIR, exist_ok=True)
+# Admission control in front of Vertex AI: token bucket at the project quota,
+# a concurrency cap and a bounded wait queue. Imagen rejections answer 429 +
+# Retry-After; Gemini rejections fall back to the config prompt / blessing.
+imagen_admission = AdmissionController(
+    'imagen',
+    rate_per_minute=float(os.environ.get('IMAGEN_QPM', '30')),
+    burst=int(os.environ.get('IMAGEN_BURST', '4')),
+    max_concurrent=int(os.environ.get('IMAGEN_MAX_CONCURRENT', '4')),
+    max_queue=int(os.environ.get('IMAGEN_MAX_QUEUE', '16')),
+    max_wait=float(os.environ.get('IMAGEN_MAX_WAIT', '20')),
+)
+# Per-stage latency histograms for /metrics. Pipeline stages are recorded when a
+# generation finishes (sync or job); ROUTE_STAGES when the HTTP response is sent.
+stage_metrics = StageMetrics()
+ROUTE_STAGES = ('encode', 'response', 'total')
+
+gemini_admission = AdmissionController(
+    'gemini',
+    rate_per_minute=float(os.environ.get('GEMINI_QPM', '300')),
+    burst=int(os.environ.get('GEMINI_BURST', '10')),
+    max_concurrent=int(os.environ.get('GEMINI_MAX_CONCURRENT', '16')),
+    max_queue=int(os.environ.get('GEMINI_MAX_QUEUE', '64')),
+    max_wait=float(os.environ.get('GEMINI_MAX_WAIT', '10')),
+)
+
+# Common font sizes resolved by warmup(); WARMUP_ON_START runs it in the
+# background when the server starts, /warmup lets a startup probe wait for it
+FONT_PRELOAD_WIDTHS = [int(w) for w in os.environ.get('FONT_PRELOAD_WIDTHS', '1024').split(',') if w.strip()]
+WARMUP_ON_START = os.environ.get('WARMUP_ON_START', 'true').lower() == 'true'
+warmup_state = {'status': 'cold', 'timings_ms': {}, 'error': None}
+_warmup_lock = threading.Lock()
 
 # Holiday mapping (from prompt_generation.py)
 HOLIDAY_MAP = {
@@ -52,29 +176,36 @@ def get_time_based_greeting():
         return "晚安"
 
 def log_debug(step, data, save_file=None):
-    """Debug logging with savepoints"""
+    """Debug logging with savepoints (files go through the async debug sink)"""
     timestamp = dt.now().strftime("%Y%m%d_%H%M%S_%f")
     print(f"[DEBUG {timestamp}] Step {step}: {data}")
     
-    # Save to file if specified
-    if save_file:
-        debug_file = os.path.join(DEBUG_DIR, f"{timestamp}_{step}_{save_file}")
+    # Save to file if specified and this request is sampled
+    if save_file and debug_sink.is_sampled():
         if isinstance(data, (dict, list)):
-            with open(debug_file + ".json", 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            ext = ".json"
         elif isinstance(data, bytes):
-            with open(debug_file + ".bin", 'wb') as f:
-                f.write(data)
+            ext = ".bin"
         else:
-            with open(debug_file + ".txt", 'w', encoding='utf-8') as f:
-                f.write(str(data))
-        print(f"[DEBUG] Saved to: {debug_file}")
+            ext = ".txt"
+        debug_sink.write(f"{timestamp}_{step}_{save_file}{ext}", data)
+
+def save_debug_artifact(name, data):
+    """Queue bytes for the debug sink; returns the future path or None when not sampled"""
+    return debug_sink.write(name, data)
+
+def submit_in_context(executor, fn, *args, **kwargs):
+    """Submit to a pool while keeping the caller's context (debug request id, timings)"""
+    ctx = contextvars.copy_context()
+    return executor.submit(ctx.run, fn, *args, **kwargs)
 
 def load_morning_config():
     """Load morning image configuration from JSON file"""
     global morning_config
     if morning_config is None:
-        config_path = os.path.join(os.path.dirname(__file__), 'config', 'morning_image_config.json')
+        # config/ lives at the service root (/app/config in the image), not next to this file
+        service_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        config_path = os.path.join(service_root, 'config', 'morning_image_config.json')
         try:
             with open(config_path, 'r', encoding='utf-8') as f:
                 morning_config = json.load(f)
@@ -85,13 +216,40 @@ def load_morning_config():
     return morning_config
 
 def get_models():
+    """Imagen and Gemini models; the Vertex AI SDK is imported and initialized on first use"""
     global image_model, text_model
     if image_model is None or text_model is None:
-        image_model = ImageGenerationModel.from_pretrained("imagen-3.0-generate-001")
-        text_model = GenerativeModel(model_name="gemini-2.5-flash")
-        log_debug("MODELS_INIT", "Models initialized successfully")
+        with _models_lock:
+            if image_model is None or text_model is None:
+                if VERTEX_BACKEND == 'fake':
+                    from src.utils.fake_vertex import FakeGenerativeModel as GenerativeModel
+                    from src.utils.fake_vertex import FakeImageGenerationModel as ImageGenerationModel
+                else:
+                    import vertexai
+                    from vertexai.generative_models import GenerativeModel
+                    from vertexai.preview.vision_models import ImageGenerationModel
+                    vertexai.init(project=PROJECT_ID, location=LOCATION)
+                image_model = ImageGenerationModel.from_pretrained("imagen-3.0-generate-001")
+                text_model = GenerativeModel(model_name="gemini-2.5-flash")
+                log_debug("MODELS_INIT", f"Models initialized successfully ({VERTEX_BACKEND} backend)")
     return image_model, text_model
 
+def warmup():
+    """Load the config, fonts and Vertex models once and start the workers; returns warmup_state (safe to call concurrently)"""
+    with _warmup_lock:
+        if warmup_state['status'] != 'ready':
+            timings = {}
+            try:
+                _timed(timings, 'config', load_morning_config)
+                _timed(timings, 'fonts', preload_fonts, FONT_PRELOAD_WIDTHS)
+                _timed(timings, 'models', get_models)
+                start_workers()
+                warmup_state.update(status='ready', timings_ms=timings, error=None)
+            except Exception as e:
+                warmup_state.update(status='failed', timings_ms=timings, error=str(e))
+            log_debug("WARMUP", dict(warmup_state))
+        return dict(warmup_state)
+
 def detect_holiday_from_date(date_str):
     """Detect holiday/solar term from date string (enhanced from prompt_generation.py)"""
     try:
@@ -132,7 +290,7 @@ Requirements:
 {input_text}
     """.strip()
 
-    response = text_model.generate_content(system_prompt)
+    response = gemini_admission.call(text_model.generate_content, system_prompt)
     return response.text.strip()
 
 def generate_blessing_text(user_input=None, image_prompt=None, holiday=None):
@@ -154,33 +312,45 @@ def generate_blessing_text(user_input=None, image_prompt=None, holiday=None):
 只輸出祝福文字，不要其他描述。
     """.strip()
 
-    response = text_model.generate_content(system_prompt)
+    response = gemini_admission.call(text_model.generate_content, system_prompt)
     return response.text.strip()
 
-def generate_display_text(config, prompt=None, date=None, custom_text=None):
-    """Enhanced text generation using prompt_generation.py logic"""
+def fallback_blessing(holiday=None):
+    """Blessing used when Gemini is unavailable"""
+    if holiday:
+        return f"{holiday}快樂"
+    return f"{get_time_based_greeting()}祝福"
+
+def fallback_image_prompt():
+    """Config-style background prompt used when Gemini prompt generation fails"""
+    time_greeting = get_time_based_greeting()
+    return f"""生成一張{time_greeting}祝福背景圖片，台灣日常質感。
+金色晨光 + 淺景深 + 柔和散景，畫面乾淨、通透。
+構圖：三分法構圖，背景層次分明。
+重要：請不要包含任何文字、字體或文案，只要純淨的背景畫面。
+相機質感：50mm F1.8 寫實攝影，比例：1:1正方形。
+關鍵詞：台味、溫暖、吉祥、乾淨背景、無文字。"""
+
+def generate_display_text(config, prompt=None, date=None, custom_text=None, image_prompt=None, holiday=None, cached_blessing=None):
+    """Build overlay texts; the blessing reuses the already generated image prompt as context"""
     log_debug("TEXT_GEN_START", {"prompt": prompt, "date": date, "custom_text": custom_text})
     
     # Detect holiday from date
-    holiday = detect_holiday_from_date(date) if date else None
+    if holiday is None and date:
+        holiday = detect_holiday_from_date(date)
     
-    # Generate blessing text using new Gemini approach
     if custom_text:
-        blessing_text = custom_text
-    else:
-        # Use prompt generation logic to create smart blessing
+        blessing_text, blessing_source = custom_text, "custom"
+    elif cached_blessing:
+        blessing_text, blessing_source = cached_blessing, "prompt_cache"
+    elif image_prompt:
         try:
-            # First generate image prompt for context
-            temp_image_prompt = generate_image_prompt_with_gemini(prompt, holiday)
-            # Then generate blessing based on that context
-            blessing_text = generate_blessing_text(prompt, temp_image_prompt, holiday)
+            blessing_text, blessing_source = generate_blessing_text(prompt, image_prompt, holiday), "gemini"
         except Exception as e:
             log_debug("BLESSING_GEN_ERROR", f"Error generating blessing: {e}")
-            # Fallback to simple blessing
-            if holiday:
-                blessing_text = f"{holiday}快樂"
-            else:
-                blessing_text = f"{get_time_based_greeting()}祝福"
+            blessing_text, blessing_source = fallback_blessing(holiday), "fallback"
+    else:
+        blessing_text, blessing_source = fallback_blessing(holiday), "fallback"
     
     # Get time-based greeting instead of static default
     main_text = get_time_based_greeting()
@@ -188,6 +358,7 @@ def generate_display_text(config, prompt=None, date=None, custom_text=None):
     result = {
         "main_text": main_text,
         "blessing_text": blessing_text,
+        "blessing_source": blessing_source,
         "holiday": holiday,
         "prompt_input": prompt
     }
@@ -195,164 +366,648 @@ def generate_display_text(config, prompt=None, date=None, custom_text=None):
     log_debug("TEXT_GEN_RESULT", result, "text_generation")
     return result
 
-def build_image_prompt(config, text_data, uploaded_image=None, style=None):
-    """Enhanced prompt building using prompt_generation.py logic"""
+def effective_prompt_input(config, prompt_input=None, holiday=None, style=None):
+    """Without user input, an image_styles template (e.g. coffee_rose) steers the theme"""
+    style_config = (config or {}).get('image_styles', {}).get(style) if style else None
+    if not prompt_input and style_config:
+        return style_config['background'].replace('{節氣}', holiday or '')
+    return prompt_input
+
+def build_image_prompt(config, prompt_input=None, holiday=None, style=None):
+    """Generate the image prompt once with Gemini (falls back to a config-style prompt)"""
     log_debug("PROMPT_BUILD_START", {
-        "text_data": text_data, 
-        "has_uploaded": uploaded_image is not None,
+        "prompt_input": prompt_input,
+        "holiday": holiday,
         "style": style
     })
     
-    if uploaded_image:
-        log_debug("PROMPT_BUILD_SKIP", "Using uploaded image, skipping generation")
-        return None, "user_uploaded"
+    prompt_input = effective_prompt_input(config, prompt_input, holiday, style)
     
-    # Use the new Gemini-based prompt generation
     try:
-        prompt_input = text_data.get('prompt_input')
-        holiday = text_data.get('holiday')
-        
-        # Generate smart prompt using Gemini
         formatted_prompt = generate_image_prompt_with_gemini(prompt_input, holiday)
-        
         log_debug("PROMPT_BUILD_RESULT", {"prompt": formatted_prompt}, "image_prompt")
         return formatted_prompt, "gemini_generated"
         
     except Exception as e:
         log_debug("PROMPT_BUILD_ERROR", f"Error with Gemini prompt generation: {e}")
-        
-        # Fallback to original logic
-        prompt_templates = config.get('prompt_templates', {})
-        main_template = prompt_templates.get('main_template', {})
-        
-        # Fallback template with time-based greeting
-        time_greeting = get_time_based_greeting()
-        formatted_prompt = f"""生成一張{time_greeting}祝福背景圖片，台灣日常質感。
-金色晨光 + 淺景深 + 柔和散景，畫面乾淨、通透。
-構圖：三分法構圖，背景層次分明。
-重要：請不要包含任何文字、字體或文案，只要純淨的背景畫面。
-相機質感：50mm F1.8 寫實攝影，比例：1:1正方形。
-關鍵詞：台味、溫暖、吉祥、乾淨背景、無文字。"""
-        
+        formatted_prompt = fallback_image_prompt()
         log_debug("PROMPT_BUILD_FALLBACK", {"prompt": formatted_prompt})
         return formatted_prompt, "config_fallback"
 
+def request_timings(stages=None):
+    """This request's stage timings (ms), sent as Server-Timing; stages seeds it (pipeline timings)"""
+    if 'timings' not in g:
+        g.timings = {}
+    if stages:
+        g.timings.update(stages)
+    return g.timings
+
+def _timed(timings, name, fn, *args, **kwargs):
+    start = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        timings[name] = round((time.perf_counter() - start) * 1000, 2)
+
+def run_generation_pipeline(config, prompt=None, date=None, custom_text=None, style=None, uploaded_image=None, variants=1):
+    """Run the generation graph and return everything compose_final_image needs.
+
+        holiday ──► image_prompt ──┬──► blessing_text ──┐
+                                   └──► background ─────┴──► compose (caller)
+
+    The image prompt is generated once and shared; the blessing and the
+    Imagen background run concurrently once it exists. Prompt-less requests
+    without an upload skip both with a pooled background when one is ready
+    ("background_pool": hit|miss|bypass). Otherwise a cached prompt/blessing
+    pair skips both Gemini calls ("prompt_cache": hit|miss|bypass); freshly
+    generated pairs are stored for the next request. variants > 1 asks Imagen for that
+    many backgrounds in the same call ("image_sources"). Per-node wall times
+    (ms) are returned in "timings".
+    """
+    timings = {}
+    holiday = _timed(timings, "holiday", detect_holiday_from_date, date) if date else None
+    needs_background = uploaded_image is None
+    needs_blessing = not custom_text
+    
+    # Prompt-less requests take a ready background (and its prompt) from the pool
+    pooled = None
+    pool_status = "bypass"
+    if needs_background and not prompt and variants == 1 and background_pool.enabled:
+        pooled = background_pool.take(background_pool_key(config, style, holiday))
+        pool_status = "hit" if pooled else "miss"
+    
+    # Otherwise a cached Gemini prompt/blessing pair for the same input stands in for both calls
+    cached = None
+    cache_status = "bypass"
+    if not pooled and (needs_background or needs_blessing) and prompt_cache.enabled:
+        cache_key = prompt_cache_key(config, prompt, style, holiday)
+        cached = prompt_cache.take(cache_key)
+        cache_status = "hit" if cached else "miss"
+    
+    # Admit the Imagen call before spending a Gemini call on its prompt: when Imagen
+    # is saturated the request gets its 429 at once (the background node then uses this admission)
+    imagen_admitted = imagen_admission.acquire() if needs_background and not pooled else None
+    
+    image_prompt, prompt_source = None, None
+    try:
+        if pooled:
+            image_prompt, prompt_source = pooled.prompt, pooled.prompt_source
+        elif cached:
+            image_prompt, prompt_source = cached.prompt, "gemini_generated"
+        elif needs_background or needs_blessing:
+            image_prompt, prompt_source = _timed(timings, "image_prompt", build_image_prompt, config, prompt, holiday, style)
+    except Exception:
+        if imagen_admitted is not None:
+            imagen_admission.release()
+        raise
+    # The blessing only uses Gemini when it had a real prompt as context
+    blessing_context = image_prompt if prompt_source == "gemini_generated" else None
+    
+    background_future = None
+    if imagen_admitted is not None:
+        background_future = submit_in_context(pipeline_executor, _timed, timings, "background", generate_background_images,
+                                              image_prompt, variants, timings, imagen_admitted)
+    text_data = _timed(timings, "blessing_text", generate_display_text, config, prompt, date, custom_text, blessing_context, holiday,
+                       cached.blessing if cached else None)
+    if cache_status == "miss" and prompt_source == "gemini_generated" and text_data["blessing_source"] == "gemini":
+        prompt_cache.put(cache_key, image_prompt, text_data["blessing_text"])
+    
+    if pooled:
+        image_sources = [pooled.image_bytes]
+        source_type = prompt_source
+    elif needs_background:
+        image_sources = [image_bytes for image_bytes, _ in background_future.result()]
+        source_type = prompt_source
+    else:
+        image_sources = [uploaded_image]
+        source_type = "user_uploaded"
+    
+    log_debug("PIPELINE_TIMINGS", dict(timings))
+    return {
+        "text_data": text_data,
+        "image_prompt": image_prompt if needs_background else None,
+        "source_type": source_type,
+        "image_sources": image_sources,
+        "background_pool": pool_status,
+        "prompt_cache": cache_status,
+        "timings": timings,
+    }
+
 def generate_background_image(prompt):
     """Step 4: Generate background image using Imagen"""
-    log_debug("IMAGE_GEN_START", {"prompt": prompt[:100] + "..."})
+    return generate_background_images(prompt, 1)[0]
+
+def generate_background_images(prompt, number_of_images=1, timings=None, admitted=None):
+    """Step 4: Generate number_of_images backgrounds in one Imagen call.
+    
+    Returns [(image_bytes, debug_path)]; Imagen may return fewer than asked (safety filter).
+    The admission wait and the Imagen call itself go into timings ("imagen_queue", "imagen").
+    admitted is the queue wait of an Imagen admission the caller already holds (released here).
+    """
+    log_debug("IMAGE_GEN_START", {"prompt": prompt[:100] + "...", "number_of_images": number_of_images})
     
     try:
-        image_model, _ = get_models()
-        
-        # Get negative prompt from config
-        config = load_morning_config()
-        negative_prompt = config.get('prompt_templates', {}).get('negative_prompt', '')
-        
-        # Generate image
-        generate_params = {
-            'prompt': prompt,
-            'number_of_images': 1,
-            'guidance_scale': 20,
-            'safety_filter_level': 'block_few'
-        }
-        
-        if negative_prompt:
-            generate_params['negative_prompt'] = negative_prompt
-        
-        log_debug("IMAGE_GEN_PARAMS", generate_params)
-        
-        images = image_model.generate_images(**generate_params)
+        # The slot covers the setup too so a caller's admission is released if it fails
+        with imagen_admission.slot(admitted) as queued:
+            image_model, _ = get_models()
+            
+            # Get negative prompt from config
+            config = load_morning_config()
+            negative_prompt = config.get('prompt_templates', {}).get('negative_prompt', '')
+            
+            # Generate image
+            generate_params = {
+                'prompt': prompt,
+                'number_of_images': number_of_images,
+                'guidance_scale': 20,
+                'safety_filter_level': 'block_few'
+            }
+            
+            if negative_prompt:
+                generate_params['negative_prompt'] = negative_prompt
+            
+            log_debug("IMAGE_GEN_PARAMS", generate_params)
+            
+            start = time.perf_counter()
+            images = image_model.generate_images(**generate_params)
+        if timings is not None:
+            timings['imagen_queue'] = round(queued * 1000, 2)
+            timings['imagen'] = round((time.perf_counter() - start) * 1000, 2)
         
         if not images:
             raise Exception("No images generated")
         
-        # Get image bytes
-        image_bytes = images[0]._image_bytes
-        
-        # Save debug image
-        debug_image_path = os.path.join(DEBUG_DIR, f"generated_bg_{dt.now().strftime('%H%M%S')}.png")
-        with open(debug_image_path, 'wb') as f:
-            f.write(image_bytes)
+        # Get image bytes, saving debug copies (only when the request is sampled)
+        results = []
+        for i, image in enumerate(images):
+            image_bytes = image._image_bytes
+            debug_image_path = save_debug_artifact(f"generated_bg_{dt.now().strftime('%H%M%S')}_{i}.png", image_bytes)
+            results.append((image_bytes, debug_image_path))
         
-        log_debug("IMAGE_GEN_SUCCESS", f"Image generated and saved to {debug_image_path}")
-        return image_bytes, debug_image_path
+        log_debug("IMAGE_GEN_SUCCESS", f"{len(results)} image(s) generated ({[len(b) for b, _ in results]} bytes)")
+        return results
         
+    except AdmissionRejected as e:
+        log_debug("IMAGE_GEN_REJECTED", str(e))
+        raise
     except Exception as e:
         log_debug("IMAGE_GEN_ERROR", f"Error generating image: {e}")
         traceback.print_exc()
         raise
 
-def compose_final_image(image_source, text_data, source_type="generated"):
-    """Step 5: Compose final result with text overlay (enhanced with smart text)"""
+def background_pool_key(config, style=None, holiday=None, period=None):
+    """Pool key: (image_styles template or None, holiday or None, 早安/午安/晚安)"""
+    if style not in (config or {}).get('image_styles', {}):
+        style = None
+    return (style, holiday, period or get_time_based_greeting())
+
+def produce_pool_background(key):
+    """Pool worker: generate one background for (style, holiday, period) off the request path"""
+    style, holiday, _ = key
+    image_prompt, prompt_source = build_image_prompt(load_morning_config(), None, holiday, style)
+    image_bytes, _ = generate_background_image(image_prompt)
+    return image_bytes, image_prompt, prompt_source
+
+def warm_pool_keys():
+    """Keys kept warm without prior demand: default style, today's holiday, current period"""
+    today = dt.now(pytz.timezone('Asia/Taipei'))
+    holiday = HOLIDAY_MAP.get(f"{today.month}-{today.day}")
+    return [background_pool_key(load_morning_config(), None, holiday)]
+
+background_pool = BackgroundPool(
+    produce_pool_background,
+    size=BACKGROUND_POOL_SIZE,
+    max_bytes=BACKGROUND_POOL_MAX_BYTES,
+    ttl=BACKGROUND_POOL_TTL,
+    warm_keys=warm_pool_keys,
+)
+
+def prompt_cache_key(config, prompt=None, style=None, holiday=None, period=None):
+    """Prompt cache key: (normalized user input, template when there is no input, holiday, period)"""
+    prompt = normalize_input(prompt)
+    if prompt or style not in (config or {}).get('image_styles', {}):
+        style = None
+    return (prompt, style, holiday, period or get_time_based_greeting())
+
+def produce_prompt_pair(key):
+    """Prompt cache worker: one Gemini prompt + blessing for the key (raises instead of falling back)"""
+    prompt, style, holiday, _ = key
+    prompt_input = effective_prompt_input(load_morning_config(), prompt, holiday, style)
+    image_prompt = generate_image_prompt_with_gemini(prompt_input, holiday)
+    return image_prompt, generate_blessing_text(prompt, image_prompt, holiday)
+
+prompt_cache = PromptCache(
+    produce_prompt_pair,
+    size=PROMPT_CACHE_SIZE,
+    ttl=PROMPT_CACHE_TTL,
+    max_uses=PROMPT_CACHE_MAX_USES,
+)
+
+def start_workers():
+    """Start the background pool and prompt cache workers. Not done at import: the
+    workers call Gemini / Imagen, so only a serving process starts them, from
+    warmup() or on its first request"""
+    background_pool.start()
+    prompt_cache.start()
+
+def encode_jpeg(image, quality=JPEG_QUALITY):
+    """Encode a PIL image to JPEG bytes in memory"""
+    buf = io.BytesIO()
+    image.save(buf, format='JPEG', quality=quality)
+    return buf.getvalue()
+
+def background_digest(image_source):
+    """sha256 of a background given as bytes or a (decoded upload) PIL image"""
+    digest = hashlib.sha256()
+    if isinstance(image_source, Image.Image):
+        digest.update(f"{image_source.mode}:{image_source.size}".encode('ascii'))
+        digest.update(image_source.tobytes())
+    else:
+        digest.update(image_source)
+    return digest.hexdigest()
+
+def composition_key(image_source, text_data, layout):
+    """Content address of a composed image: the background hash plus every overlay parameter"""
+    params = json.dumps(
+        [text_data['main_text'], text_data['blessing_text'], layout, JPEG_QUALITY, find_font()],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(f"{background_digest(image_source)}|{params}".encode('utf-8')).hexdigest()
+
+def compose_final_image(image_source, text_data, source_type="generated", layout='random'):
+    """Step 5: Compose final result with text overlay, fully in memory.
+    
+    image_source is the background as bytes (generated or uploaded) or a PIL image.
+    Returns (jpeg_bytes, debug_path, image_key): debug_path is None unless the request is
+    sampled by the debug sink; image_key addresses the JPEG in composed_store (/images/<key>).
+    """
     log_debug("COMPOSE_START", {"source_type": source_type, "text_data": text_data})
     
-    try:
-        # Create temporary files
-        if source_type == "generated" or source_type == "gemini_generated" or source_type == "config_fallback":
-            # image_source is bytes
-            with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as temp_bg:
-                temp_bg.write(image_source)
-                bg_path = temp_bg.name
-        else:
-            # image_source is file path (uploaded image)
-            bg_path = image_source
-        
-        # SAVE ORIGINAL BACKGROUND IMAGE FOR DEBUGGING
-        bg_debug_path = os.path.join(DEBUG_DIR, f"background_only_{dt.now().strftime('%H%M%S')}.png")
-        if source_type != "user_uploaded":
-            with open(bg_debug_path, 'wb') as f:
-                f.write(image_source)
-            log_debug("BACKGROUND_SAVED", f"Original background saved: {bg_debug_path}")
-        
-        # Create output path
-        final_path = os.path.join(DEBUG_DIR, f"final_image_{dt.now().strftime('%H%M%S')}.jpg")
-        
+    if layout == 'random':
+        layout = pick_layout()
+    image_key = composition_key(image_source, text_data, layout)
+    
+    def render():
         # Log text overlay details
         log_debug("TEXT_OVERLAY_START", {
             "main_text": text_data['main_text'],
             "blessing_text": text_data['blessing_text'],
-            "background_path": bg_path,
-            "output_path": final_path
+            "source_type": source_type,
+            "layout": layout
         }, "text_overlay_params")
         
         # Apply text overlay using smart generated text
-        overlay_greeting(
-            image_path=bg_path,
+        final_image = overlay_greeting(
+            image=image_source,
             top_text=text_data['main_text'],
             small_vertical_text=text_data['blessing_text'],
-            output_path=final_path,
-            layout='random'  # Use random layout
+            layout=layout
         )
+        return encode_jpeg(final_image)
+    
+    try:
+        final_image_bytes, status = composed_store.get_or_compute(image_key, render)
+        final_path = save_debug_artifact(f"final_{image_key[:16]}.jpg", final_image_bytes)
         
-        # Read final image
-        with open(final_path, 'rb') as f:
-            final_image_bytes = f.read()
-        
-        log_debug("COMPOSE_SUCCESS", f"Final image created: {final_path}")
+        log_debug("COMPOSE_SUCCESS", f"Final image {image_key[:16]} ({status}): {len(final_image_bytes)} bytes")
         log_debug("FILES_AVAILABLE", {
-            "original_background": bg_debug_path if source_type != "user_uploaded" else bg_path,
             "final_with_text": final_path,
             "sizes": {
-                "background": len(image_source) if isinstance(image_source, bytes) else os.path.getsize(bg_path),
+                "background": len(image_source) if isinstance(image_source, bytes) else None,
                 "final": len(final_image_bytes)
             }
         }, "debug_files")
         
-        return final_image_bytes, final_path
+        return final_image_bytes, final_path, image_key
         
     except Exception as e:
         log_debug("COMPOSE_ERROR", f"Error composing final image: {e}")
         traceback.print_exc()
         raise
-    finally:
-        # DON'T clean up temp background - keep for debugging
-        pass
+
+def layout_for_seed(layout_seed):
+    """Overlay layout (1-4) for a layout seed"""
+    return layout_seed % 4 + 1
+
+def parse_variants(value):
+    """variants form/JSON field, clamped to 1..MAX_VARIANTS"""
+    try:
+        return min(max(int(value), 1), MAX_VARIANTS) if value not in (None, '') else 1
+    except (TypeError, ValueError):
+        return 1
+
+def variants_payload(result, url_prefix=None, encoded=None):
+    """Per-variant metadata; image URLs point at url_prefix?variant=i when given, else at
+    the content-addressed /images/<key> (images are attached by generation_response)"""
+    entries = []
+    for i, variant in enumerate(result['variants']):
+        entry = {
+            'index': i,
+            'layout_seed': variant['layout_seed'],
+            'image_key': variant['image_key'],
+            'final_size_bytes': len(variant['final_image_bytes'])
+        }
+        if url_prefix:
+            entry['image_url'] = f"{url_prefix}?variant={i}"
+        else:
+            entry['image_url'] = f"/images/{variant['image_key']}"
+        if encoded:
+            entry['encoded_size_bytes'] = len(encoded[i][0])
+        entries.append(entry)
+    return entries
+
+output_encoder = OutputEncoder(ResultCache(ttl=ENCODED_CACHE_TTL, max_bytes=ENCODED_CACHE_MAX_BYTES))
+
+def negotiate_output(fields=None, use_accept=True):
+    """(format, size) from ?format=&size= (or form/JSON fields), else the Accept header"""
+    fields = fields or {}
+    fmt = request.args.get('format') or fields.get('format')
+    size = request.args.get('size') or fields.get('size')
+    return negotiate(request.headers.get('Accept') if use_accept else None, fmt, size)
+
+def send_image(final_image_bytes, output, download_stem):
+    """Encode (cached) and send an image with the negotiated format"""
+    image_bytes, mimetype = _timed(request_timings(), 'encode', output_encoder.encode, final_image_bytes, *output)
+    response = send_file(
+        io.BytesIO(image_bytes),
+        mimetype=mimetype,
+        as_attachment=False,
+        download_name=f'{download_stem}.{extension(output[0])}'
+    )
+    response.headers['Vary'] = 'Accept'
+    return response
+
+def bad_output_response(e):
+    return jsonify({'status': 'error', 'message': str(e)}), 400
+
+RESPONSE_MODES = ('json', 'raw', 'multipart')
+SAVEPOINTS_HEADER_LIMIT = 6000  # stay well under common 8 KB header limits
+
+def parse_response_mode(fields=None):
+    """?response=json|raw|multipart (or the form/JSON field); Accept: multipart/mixed also selects multipart"""
+    mode = request.args.get('response') or (fields or {}).get('response')
+    if not mode:
+        return 'multipart' if 'multipart/mixed' in request.headers.get('Accept', '') else 'json'
+    mode = mode.lower()
+    if mode not in RESPONSE_MODES:
+        raise ValueError(f"response must be one of {', '.join(RESPONSE_MODES)}")
+    return mode
+
+def _truncate_strings(value, limit):
+    if isinstance(value, dict):
+        return {k: _truncate_strings(v, limit) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_truncate_strings(v, limit) for v in value]
+    if isinstance(value, str) and len(value) > limit:
+        return value[:limit] + '...'
+    return value
+
+def savepoints_header(savepoints):
+    """Compact ASCII JSON for the X-Savepoints header; long texts (prompts) are cut to fit"""
+    value = json.dumps(savepoints, separators=(',', ':'), default=str)
+    limit = 200
+    while len(value) > SAVEPOINTS_HEADER_LIMIT and limit >= 25:
+        value = json.dumps(_truncate_strings(savepoints, limit), separators=(',', ':'), default=str)
+        limit //= 2
+    return value
+
+def content_disposition(download_stem, ext, name=None, index=None):
+    """Content-Disposition value for a download name taken from user input (template names).
+
+    filename= keeps only [A-Za-z0-9_-] (falling back to 'morning'); the full name goes in
+    an RFC 5987 filename*= so quotes, CR/LF and non-ASCII text never reach the header.
+    """
+    download_stem = str(download_stem or '')
+    ascii_stem = re.sub(r'[^A-Za-z0-9_-]', '', download_stem)[:64] or 'morning'
+    suffix = f'_{index}.{ext}' if index is not None else f'.{ext}'
+    value = 'inline'
+    if name:
+        value += f'; name="{name}"'
+    value += f'; filename="{ascii_stem}{suffix}"'
+    if ascii_stem != download_stem:
+        value += f"; filename*=UTF-8''{quote(download_stem, safe='')}{suffix}"
+    return value
+
+def generation_response(mode, metadata, encoded, download_stem='morning'):
+    """Send a finished generation.
+    
+    json: metadata plus base64 images (the original format); raw: the first image (variant 0)
+    as the body with savepoints in headers, X-Variants giving the variant count and
+    X-Variant-Urls the /images/<key> URLs of all of them; multipart: multipart/mixed with a
+    JSON metadata part followed by one raw part per image. Image parts are streamed from
+    the encoded buffers.
+    """
+    image_bytes, mimetype = encoded[0]
+    if mode == 'json':
+        body = {**metadata, 'image_base64': base64.b64encode(image_bytes).decode('utf-8'), 'mime_type': mimetype}
+        for entry, (variant_bytes, _) in zip(body.get('variants', []), encoded):
+            entry['image_base64'] = base64.b64encode(variant_bytes).decode('utf-8')
+        return jsonify(body), 200
+    
+    ext = mimetype.split('/')[-1].replace('jpeg', 'jpg')
+    if mode == 'raw':
+        response = Response(image_bytes, mimetype=mimetype)
+        response.headers['Content-Disposition'] = content_disposition(download_stem, ext)
+        response.headers['X-Savepoints'] = savepoints_header(metadata.get('savepoints', {}))
+        response.headers['X-Variants'] = str(len(encoded))
+        if metadata.get('variants'):
+            response.headers['X-Variant-Urls'] = ', '.join(v['image_url'] for v in metadata['variants'])
+        return response, 200
+    
+    boundary = uuid.uuid4().hex
+    meta = json.dumps({**metadata, 'mime_type': mimetype}, ensure_ascii=False).encode('utf-8')
+    chunks = [
+        f'--{boundary}\r\nContent-Type: application/json; charset=utf-8\r\n'
+        f'Content-Disposition: inline; name="metadata"\r\nContent-Length: {len(meta)}\r\n\r\n'.encode('ascii'),
+        meta,
+    ]
+    for i, (part_bytes, part_mime) in enumerate(encoded):
+        chunks.append(
+            f'\r\n--{boundary}\r\nContent-Type: {part_mime}\r\n'
+            f'Content-Disposition: {content_disposition(download_stem, ext, name="image", index=i)}\r\n'
+            f'Content-Length: {len(part_bytes)}\r\n\r\n'.encode('ascii')
+        )
+        chunks.append(part_bytes)
+    chunks.append(f'\r\n--{boundary}--\r\n'.encode('ascii'))
+    response = Response(iter(chunks), mimetype=f'multipart/mixed; boundary={boundary}')
+    response.headers['Content-Length'] = str(sum(len(c) for c in chunks))
+    return response, 200
+
+def parse_layout_seed(value):
+    try:
+        return int(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+result_cache = ResultCache(
+    ttl=RESULT_CACHE_TTL,
+    max_bytes=RESULT_CACHE_MAX_BYTES,
+    size_of=greeting_result_bytes,
+)
+
+def compose_variants(image_sources, text_data, source_type, layout_seed):
+    """Compose one final image per background in parallel; variant i uses layout_seed + i"""
+    futures = [
+        submit_in_context(pipeline_executor, compose_final_image, image_source, text_data, source_type, layout_for_seed(layout_seed + i))
+        for i, image_source in enumerate(image_sources)
+    ]
+    variants = []
+    for i, (image_source, future) in enumerate(zip(image_sources, futures)):
+        final_image_bytes, final_path, image_key = future.result()
+        variants.append({
+            'final_image_bytes': final_image_bytes,
+            'final_path': final_path,
+            'image_key': image_key,
+            'layout_seed': layout_seed + i,
+            'background_size': len(image_source) if isinstance(image_source, bytes) else None,
+        })
+    return variants
+
+def render_greeting(config, prompt=None, date=None, custom_text=None, style=None, uploaded_image=None, layout_seed=None, variants=1):
+    """Pipeline + compose. Prompt-less, upload-less results go through the result cache;
+    concurrent identical requests share one generation ("result_cache": hit|miss|coalesced|bypass).
+    
+    variants > 1 reuses the one prompt and blessing for N Imagen backgrounds (N layouts
+    of the same photo for uploads); the top-level image fields describe variant 0.
+    """
+    if layout_seed is None:
+        layout_seed = random.randrange(LAYOUT_SEEDS)
+    
+    def compute():
+        pipeline = run_generation_pipeline(config, prompt, date, custom_text, style, uploaded_image, variants)
+        image_sources = pipeline.pop('image_sources')
+        if len(image_sources) < variants:
+            # Uploaded photo (or Imagen filtered some): vary the layout instead
+            image_sources = [image_sources[i % len(image_sources)] for i in range(variants)]
+        composed = _timed(
+            pipeline['timings'], 'compose', compose_variants,
+            image_sources, pipeline['text_data'], pipeline['source_type'], layout_seed
+        )
+        return {**pipeline, **composed[0], 'variants': composed}
+    
+    if prompt or uploaded_image is not None or not result_cache.enabled:
+        result = compute()
+        stage_metrics.record(result['timings'])
+        return {**result, 'result_cache': 'bypass'}
+    
+    holiday = detect_holiday_from_date(date) if date else None
+    style_key, holiday, period = background_pool_key(config, style, holiday)
+    key = (style_key, custom_text or '', period, holiday, layout_seed, variants)
+    start = time.perf_counter()
+    result, status = result_cache.get_or_compute(key, compute)
+    if status != 'miss':
+        # Shared result: this request's own timing is just the lookup / wait
+        result = {**result, 'final_path': None, 'timings': {'result_cache': round((time.perf_counter() - start) * 1000, 2)}}
+    log_debug("RESULT_CACHE", {"key": list(key), "status": status})
+    stage_metrics.record(result['timings'])
+    return {**result, 'result_cache': status}
+
+def busy_response(e):
+    """503 when the job pool is saturated"""
+    log_debug("JOB_QUEUE_FULL", str(e))
+    response = jsonify({'status': 'error', 'message': f'Server busy: {e}'})
+    response.headers['Retry-After'] = '5'
+    return response, 503
+
+def rejected_response(e):
+    """429 + Retry-After when Imagen admission control turns the request away"""
+    log_debug("ADMISSION_REJECTED", {"upstream": e.name, "reason": e.reason, "retry_after": e.retry_after})
+    response = jsonify({'status': 'error', 'message': f'Too many requests: {e}', 'retry_after': e.retry_after})
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, 429
+
+def job_payload(job):
+    """Status JSON for a job; finished jobs include the result metadata and image URL"""
+    payload = {**job.to_dict(), 'status_url': f"/jobs/{job.id}"}
+    if job.status == 'succeeded':
+        result = job.result
+        payload['result'] = {
+            'image_url': f"/jobs/{job.id}/image",
+            'image_key': result['image_key'],
+            'mime_type': 'image/jpeg',
+            'final_size_bytes': len(result['final_image_bytes']),
+            'text_data': result['text_data'],
+            'image_prompt': result['image_prompt'],
+            'source_type': result['source_type'],
+            'background_pool': result['background_pool'],
+            'prompt_cache': result['prompt_cache'],
+            'result_cache': result['result_cache'],
+            'layout_seed': result['layout_seed'],
+            'timings_ms': result['timings']
+        }
+        if len(result['variants']) > 1:
+            payload['result']['variants'] = variants_payload(result, f"/jobs/{job.id}/image")
+    return payload
+
+def read_upload():
+    """Ingest the multipart 'image' field as a square RGB image (None when absent); raises UploadError"""
+    image_file = request.files.get('image')
+    if not image_file or not image_file.filename:
+        return None
+    image, info = ingest_upload(image_file.stream)
+    log_debug("UPLOAD_INGESTED", info, "upload")
+    return image
+
+def upload_error_response(e):
+    log_debug("UPLOAD_REJECTED", f"{e.status}: {e}")
+    return jsonify({'status': 'error', 'message': str(e)}), e.status
+
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    return upload_error_response(UploadError(413, f"Request larger than {app.config['MAX_CONTENT_LENGTH']} bytes"))
+
+def parse_job_request():
+    """POST /jobs inputs: multipart form (as /generate-json) or a JSON body (as /generate-template)"""
+    if request.content_type and 'multipart/form-data' in request.content_type:
+        data = request.form
+        uploaded_image = read_upload()
+    else:
+        data = request.get_json(silent=True) or {}
+        uploaded_image = None
+    return {
+        'prompt': data.get('prompt'),
+        'date': data.get('date'),
+        'custom_text': data.get('custom_text'),
+        'style': data.get('style') or data.get('template'),
+        'uploaded_image': uploaded_image,
+        'layout_seed': parse_layout_seed(data.get('layout_seed')),
+        'variants': parse_variants(data.get('variants'))
+    }
 
 # ============= API ENDPOINTS (MAINTAINING EXACT SAME FORMAT) =============
 
+@app.before_request
+def begin_debug_scope():
+    g.request_start = time.perf_counter()
+    start_workers()
+    g.request_id, g.debug_token = debug_sink.begin_request(request.headers.get('X-Request-Id'))
+
+@app.after_request
+def end_debug_scope(response):
+    if getattr(g, 'request_id', None):
+        response.headers['X-Request-Id'] = g.request_id
+    timings = g.get('timings')
+    if timings is not None:
+        # Only requests that generated or encoded an image carry stage timings
+        timings['total'] = round((time.perf_counter() - g.request_start) * 1000, 2)
+        response.headers['Server-Timing'] = server_timing(timings)
+        stage_metrics.record(timings, ROUTE_STAGES)
+    return response
+
+@app.teardown_request
+def reset_debug_scope(exc):
+    token = getattr(g, 'debug_token', None)
+    if token is not None:
+        debug_sink.end_request(token)
+        g.debug_token = None
+
 @app.route('/generate', methods=['POST'])
 def generate():
     """Main generate endpoint - ENHANCED with smart prompt generation and text overlay"""
+    try:
+        output = negotiate_output(request.form)
+    except ValueError as e:
+        return bad_output_response(e)
     try:
         config = load_morning_config()
         log_debug("API_START", "Generate endpoint called with enhanced features")
@@ -362,6 +1017,7 @@ def generate():
         date = None
         custom_text = None
         style = None
+        layout_seed = None
         uploaded_image = None
         
         # Handle multipart form data
@@ -370,16 +1026,12 @@ def generate():
             date = request.form.get('date')  
             custom_text = request.form.get('custom_text')
             style = request.form.get('style')
+            layout_seed = parse_layout_seed(request.form.get('layout_seed'))
             
-            # Handle uploaded image
-            if 'image' in request.files:
-                image_file = request.files['image']
-                if image_file and image_file.filename:
-                    # Save uploaded image
-                    upload_path = os.path.join(DEBUG_DIR, f"uploaded_{dt.now().strftime('%H%M%S')}_{image_file.filename}")
-                    image_file.save(upload_path)
-                    uploaded_image = upload_path
-                    log_debug("UPLOAD_SUCCESS", f"Image uploaded: {upload_path}")
+            # Handle uploaded image: size-capped, sniffed, decoded and square-cropped in memory
+            uploaded_image = read_upload()
+            if uploaded_image is not None:
+                log_debug("UPLOAD_SUCCESS", f"Image uploaded: {uploaded_image.size[0]}x{uploaded_image.size[1]}")
         
         # Handle empty POST request (Basic Random Image case)
         elif not request.data and not request.form:
@@ -393,32 +1045,21 @@ def generate():
             "has_upload": uploaded_image is not None
         }, "input_data")
         
-        # Step 2: Generate display text using ENHANCED logic with Gemini
-        text_data = generate_display_text(config, prompt, date, custom_text)
-        
-        # Step 3: Build image prompt using ENHANCED logic with Gemini
-        image_prompt, source_type = build_image_prompt(config, text_data, uploaded_image, style)
-        
-        # Step 4: Generate or use uploaded image
-        if source_type == "user_uploaded":
-            image_source = uploaded_image
-        else:
-            image_source, debug_path = generate_background_image(image_prompt)
-        
-        # Step 5: Compose final image with SMART TEXT OVERLAY
-        final_image_bytes, final_path = compose_final_image(image_source, text_data, source_type)
+        # Steps 2-5: Image prompt once, then blessing text || background image, then SMART TEXT OVERLAY
+        result = job_manager.run('generate', render_greeting, config, prompt, date, custom_text, style, uploaded_image, layout_seed)
+        final_image_bytes = result['final_image_bytes']
+        request_timings(result['timings'])
         
-        # Step 6: Return raw image file (SAME FORMAT AS BEFORE)
-        log_debug("API_SUCCESS", f"Returning image file: {len(final_image_bytes)} bytes")
-        
-        # Return the image directly as file
-        return send_file(
-            final_path, 
-            mimetype='image/jpeg',
-            as_attachment=False,
-            download_name='morning.png'
-        )
+        # Step 6: Return raw image file (JPEG full size unless ?format=&size= or Accept asks otherwise)
+        log_debug("API_SUCCESS", f"Returning image file: {len(final_image_bytes)} bytes as {output}")
+        return send_image(final_image_bytes, output, 'morning')
         
+    except UploadError as e:
+        return upload_error_response(e)
+    except JobQueueFull as e:
+        return busy_response(e)
+    except AdmissionRejected as e:
+        return rejected_response(e)
     except Exception as e:
         log_debug("API_ERROR", f"Generate endpoint error: {e}")
         traceback.print_exc()
@@ -431,6 +1072,11 @@ def generate():
 @app.route('/generate-json', methods=['POST'])  
 def generate_json():
     """Generate endpoint - returns JSON with base64 image and full debug info (ENHANCED)"""
+    try:
+        output = negotiate_output(request.form, use_accept=False)
+        mode = parse_response_mode(request.form)
+    except ValueError as e:
+        return bad_output_response(e)
     try:
         config = load_morning_config()
         log_debug("API_JSON_START", "Generate-json endpoint called with enhanced features")
@@ -440,6 +1086,8 @@ def generate_json():
         date = None
         custom_text = None
         style = None
+        layout_seed = None
+        variants = 1
         uploaded_image = None
         
         # Handle multipart form data
@@ -448,32 +1096,26 @@ def generate_json():
             date = request.form.get('date')
             custom_text = request.form.get('custom_text')
             style = request.form.get('style')
+            layout_seed = parse_layout_seed(request.form.get('layout_seed'))
+            variants = parse_variants(request.form.get('variants'))
             
-            if 'image' in request.files:
-                image_file = request.files['image']
-                if image_file and image_file.filename:
-                    upload_path = os.path.join(DEBUG_DIR, f"uploaded_{dt.now().strftime('%H%M%S')}_{image_file.filename}")
-                    image_file.save(upload_path)
-                    uploaded_image = upload_path
-        
-        # Steps 2-5: Enhanced processing with Gemini
-        text_data = generate_display_text(config, prompt, date, custom_text)
-        image_prompt, source_type = build_image_prompt(config, text_data, uploaded_image, style)
-        
-        if source_type == "user_uploaded":
-            image_source = uploaded_image
-        else:
-            image_source, debug_path = generate_background_image(image_prompt)
+            uploaded_image = read_upload()
         
-        final_image_bytes, final_path = compose_final_image(image_source, text_data, source_type)
+        # Steps 2-5: Image prompt once, then blessing text || background image, then compose
+        generated = job_manager.run('generate', render_greeting, config, prompt, date, custom_text, style, uploaded_image, layout_seed, variants)
+        text_data = generated['text_data']
+        image_prompt = generated['image_prompt']
+        source_type = generated['source_type']
+        final_image_bytes = generated['final_image_bytes']
+        final_path = generated['final_path']
         
-        # Step 6: Return JSON with comprehensive debug info (ENHANCED SAVEPOINTS)
-        final_image_b64 = base64.b64encode(final_image_bytes).decode('utf-8')
+        # Step 6: Return JSON (or raw / multipart) with comprehensive debug info (ENHANCED SAVEPOINTS)
+        timings = request_timings(generated['timings'])
+        encoded = _timed(timings, 'encode', lambda: [output_encoder.encode(v['final_image_bytes'], *output) for v in generated['variants']])
+        output_bytes = encoded[0][0]
         
         result = {
             'status': 'success',
-            'image_base64': final_image_b64,
-            'mime_type': 'image/jpeg',
             'savepoints': {
                 '1_input_parsing': {
                     'prompt': prompt,
@@ -490,20 +1132,37 @@ def generate_json():
                 },
                 '4_image_generation': {
                     'source_type': source_type,
-                    'background_image_size': len(image_source) if isinstance(image_source, bytes) else 'uploaded_file'
+                    'background_pool': generated['background_pool'],
+                    'prompt_cache': generated['prompt_cache'],
+                    'background_image_size': generated['background_size']
                 },
                 '5_final_composition': {
                     'final_size_bytes': len(final_image_bytes),
                     'output_file': final_path,
-                    'text_overlay_method': 'smart_generated'
-                }
+                    'image_key': generated['image_key'],
+                    'image_url': f"/images/{generated['image_key']}",
+                    'text_overlay_method': 'smart_generated',
+                    'layout_seed': generated['layout_seed'],
+                    'variants': len(generated['variants']),
+                    'result_cache': generated['result_cache'],
+                    'output': {'format': output[0], 'size': output[1], 'bytes': len(output_bytes)}
+                },
+                '6_timings_ms': dict(timings)
             },
             'debug_dir': DEBUG_DIR
         }
+        if variants > 1:
+            result['variants'] = variants_payload(generated, encoded=encoded)
         
-        log_debug("API_JSON_SUCCESS", "JSON response ready with enhanced savepoints", "final_response")
-        return jsonify(result), 200
+        log_debug("API_JSON_SUCCESS", f"{mode} response ready with enhanced savepoints", "final_response")
+        return _timed(timings, 'response', generation_response, mode, result, encoded)
         
+    except UploadError as e:
+        return upload_error_response(e)
+    except JobQueueFull as e:
+        return busy_response(e)
+    except AdmissionRejected as e:
+        return rejected_response(e)
     except Exception as e:
         log_debug("API_JSON_ERROR", f"Generate-json endpoint error: {e}")
         traceback.print_exc()
@@ -526,42 +1185,62 @@ def generate_template():
         if not data:
             return jsonify({'status': 'error', 'message': 'Missing JSON body'}), 400
         
+        try:
+            output = negotiate_output(data, use_accept=False)
+            mode = parse_response_mode(data)
+        except ValueError as e:
+            return bad_output_response(e)
+        
         template = data.get('template', 'countryside_landscape')
         custom_text = data.get('custom_text', '')
         
-        log_debug("TEMPLATE_INPUT", {"template": template, "custom_text": custom_text})
+        layout_seed = parse_layout_seed(data.get('layout_seed'))
+        variants = parse_variants(data.get('variants'))
         
-        # Generate text data with enhanced logic
-        text_data = generate_display_text(config, None, None, custom_text)
+        log_debug("TEMPLATE_INPUT", {"template": template, "custom_text": custom_text, "layout_seed": layout_seed, "variants": variants})
         
-        # Use specific style template from config
-        image_prompt, source_type = build_image_prompt(config, text_data, None, template)
+        # Image prompt once, then blessing text || background image (cached per template/text/period)
+        generated = job_manager.run('generate-template', render_greeting, config, None, None, custom_text, template, layout_seed=layout_seed, variants=variants)
+        text_data = generated['text_data']
+        image_prompt = generated['image_prompt']
+        source_type = generated['source_type']
+        final_image_bytes = generated['final_image_bytes']
         
-        # Generate image
-        image_source, debug_path = generate_background_image(image_prompt)
-        final_image_bytes, final_path = compose_final_image(image_source, text_data, source_type)
-        
-        # Return JSON with debug info
-        final_image_b64 = base64.b64encode(final_image_bytes).decode('utf-8')
+        # Return JSON (or raw / multipart) with debug info
+        timings = request_timings(generated['timings'])
+        encoded = _timed(timings, 'encode', lambda: [output_encoder.encode(v['final_image_bytes'], *output) for v in generated['variants']])
+        output_bytes = encoded[0][0]
         
         result = {
             'status': 'success',
             'template': template,
-            'image_base64': final_image_b64,
-            'mime_type': 'image/jpeg',
             'savepoints': {
                 'generated_prompt': image_prompt,
                 'text_data': text_data,
                 'source_type': source_type,
+                'background_pool': generated['background_pool'],
+                'prompt_cache': generated['prompt_cache'],
+                'result_cache': generated['result_cache'],
+                'layout_seed': generated['layout_seed'],
+                'image_key': generated['image_key'],
+                'image_url': f"/images/{generated['image_key']}",
                 'final_size': len(final_image_bytes),
-                'enhancement': 'gemini_powered'
+                'output': {'format': output[0], 'size': output[1], 'bytes': len(output_bytes)},
+                'enhancement': 'gemini_powered',
+                'timings_ms': dict(timings)
             },
             'debug_dir': DEBUG_DIR
         }
+        if variants > 1:
+            result['variants'] = variants_payload(generated, encoded=encoded)
         
-        log_debug("TEMPLATE_SUCCESS", "Template generation complete with enhancements")
-        return jsonify(result), 200
+        log_debug("TEMPLATE_SUCCESS", f"Template generation complete with enhancements ({mode})")
+        return _timed(timings, 'response', generation_response, mode, result, encoded, template)
         
+    except JobQueueFull as e:
+        return busy_response(e)
+    except AdmissionRejected as e:
+        return rejected_response(e)
     except Exception as e:
         log_debug("TEMPLATE_ERROR", f"Template endpoint error: {e}")
         traceback.print_exc()
@@ -571,6 +1250,99 @@ def generate_template():
             'debug_dir': DEBUG_DIR
         }), 500
 
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """Queue a generation and return its id immediately (202); poll GET /jobs/<id>"""
+    try:
+        config = load_morning_config()
+        inputs = parse_job_request()
+        log_debug("JOB_SUBMIT", {**inputs, 'uploaded_image': inputs['uploaded_image'] is not None})
+        job = job_manager.submit('generate', render_greeting, config, **inputs)
+        response = jsonify(job_payload(job))
+        response.headers['Location'] = f"/jobs/{job.id}"
+        return response, 202
+    except RequestEntityTooLarge as e:
+        return request_too_large(e)
+    except UploadError as e:
+        return upload_error_response(e)
+    except JobQueueFull as e:
+        return busy_response(e)
+    except Exception as e:
+        log_debug("JOB_SUBMIT_ERROR", f"Job submit error: {e}")
+        traceback.print_exc()
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Job status; ?wait=<seconds> long-polls until the job finishes (max JOB_MAX_WAIT)"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Job not found or expired'}), 404
+    try:
+        wait = min(max(float(request.args.get('wait', 0)), 0), JOB_MAX_WAIT)
+    except ValueError:
+        wait = 0
+    if wait:
+        job.wait(wait)
+    return jsonify(job_payload(job)), 200
+
+@app.route('/jobs/<job_id>/image', methods=['GET'])
+def get_job_image(job_id):
+    """Final image of a finished job (?variant=<i>, ?format=webp|jpeg|png, ?size=thumb|share|full)"""
+    try:
+        output = negotiate_output()
+    except ValueError as e:
+        return bad_output_response(e)
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Job not found or expired'}), 404
+    if job.status != 'succeeded':
+        return jsonify(job_payload(job)), 409
+    variants = job.result['variants']
+    index = request.args.get('variant', '0')
+    if not index.isdigit() or int(index) >= len(variants):
+        return jsonify({'status': 'error', 'message': f'variant must be 0..{len(variants) - 1}'}), 404
+    return send_image(variants[int(index)]['final_image_bytes'], output, f'{job.id}_{index}')
+
+@app.route('/images/<image_key>', methods=['GET'])
+def get_composed_image(image_key):
+    """Composed image by content address (?format=webp|jpeg|png, ?size=thumb|share|full)"""
+    try:
+        output = negotiate_output()
+    except ValueError as e:
+        return bad_output_response(e)
+    if not re.fullmatch(r'[0-9a-f]{64}', image_key):
+        return jsonify({'status': 'error', 'message': 'Invalid image key'}), 400
+    etag = f'"{image_key}-{output[0]}-{output[1]}"'
+    if request.headers.get('If-None-Match') == etag:
+        return Response(status=304, headers={'ETag': etag})
+    final_image_bytes = composed_store.get(image_key)
+    if final_image_bytes is None:
+        return jsonify({'status': 'error', 'message': 'Image not found or expired'}), 404
+    response = send_image(final_image_bytes, output, image_key[:16])
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = f'public, max-age={COMPOSED_STORE_TTL}, immutable'
+    return response
+
+@app.route('/warmup', methods=['GET', 'POST'])
+def warmup_endpoint():
+    """Startup probe target: 200 once config, fonts and models are loaded, 503 while warm-up fails"""
+    state = warmup()
+    return jsonify(state), 200 if state['status'] == 'ready' else 503
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Per-stage latency histograms, admission control (queue waits, rejections) and job pool counters"""
+    return jsonify({
+        'stages_ms': stage_metrics.snapshot(),
+        'admission': {
+            'imagen': imagen_admission.snapshot(),
+            'gemini': gemini_admission.snapshot(),
+        },
+        'jobs': job_manager.snapshot(),
+        'timestamp': dt.now().isoformat()
+    }), 200
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -581,6 +1353,10 @@ def health_check():
         'features': ['gemini_prompt_generation', 'smart_text_overlay', 'holiday_detection'],
         'debug_dir': DEBUG_DIR,
         'config_loaded': morning_config is not None,
+        'warmup': warmup_state['status'],
+        'result_cache': result_cache.snapshot(),
+        'composed_store': composed_store.snapshot(),
+        'jobs': job_manager.snapshot(),
         'timestamp': dt.now().isoformat()
     }), 200
 
@@ -588,16 +1364,12 @@ def health_check():
 def debug_info():
     """Debug information endpoint"""
     try:
-        # List debug files
-        debug_files = []
-        if os.path.exists(DEBUG_DIR):
-            for file in sorted(os.listdir(DEBUG_DIR))[-10:]:  # Last 10 files
-                file_path = os.path.join(DEBUG_DIR, file)
-                debug_files.append({
-                    'name': file,
-                    'size': os.path.getsize(file_path),
-                    'modified': os.path.getmtime(file_path)
-                })
+        # Recent request directories captured by the debug sink
+        recent = []
+        for entry in debug_sink.recent_requests(10):
+            request_dir = os.path.join(DEBUG_DIR, entry['request_id'])
+            files = sorted(os.listdir(request_dir)) if os.path.isdir(request_dir) else []
+            recent.append({**entry, 'files': files})
         
         # Check font availability
         from src.utils.text_overlay import find_font, CANDIDATE_FONTS
@@ -614,9 +1386,13 @@ def debug_info():
         
         return jsonify({
             'debug_directory': DEBUG_DIR,
-            'recent_files': debug_files,
+            'debug_sink': debug_sink.snapshot(),
+            'background_pool': background_pool.snapshot(),
+            'prompt_cache': prompt_cache.snapshot(),
+            'recent_requests': recent,
             'config_loaded': morning_config is not None,
             'models_initialized': image_model is not None and text_model is not None,
+            'vertex_backend': VERTEX_BACKEND,
             'enhancements': {
                 'gemini_prompt_generation': True,
                 'smart_blessing_text': True,
@@ -628,12 +1404,12 @@ def debug_info():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/debug/files/<filename>', methods=['GET'])
+@app.route('/debug/files/<path:filename>', methods=['GET'])
 def get_debug_file(filename):
-    """Download debug files"""
+    """Download debug files (<request_id>/<name>)"""
     try:
-        file_path = os.path.join(DEBUG_DIR, filename)
-        if os.path.exists(file_path):
+        file_path = safe_join(DEBUG_DIR, filename)
+        if file_path and os.path.isfile(file_path):
             if filename.endswith(('.png', '.jpg', '.jpeg')):
                 return send_file(file_path, mimetype='image/jpeg')
             elif filename.endswith('.json'):
@@ -646,8 +1422,15 @@ def get_debug_file(filename):
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
-    # Load configuration on startup
-    load_morning_config()
+    # With debug=True the Werkzeug reloader runs this block twice: in a watcher
+    # process and in the child (WERKZEUG_RUN_MAIN=true) that serves requests.
+    # Only the serving process warms up, so models and workers start once.
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        # Load configuration, fonts and models without delaying the first request
+        if WARMUP_ON_START:
+            threading.Thread(target=warmup, name='warmup', daemon=True).start()
+        else:
+            load_morning_config()
     log_debug("STARTUP", f"Server starting with enhanced Gemini features, debug directory: {DEBUG_DIR}")
     
     port = int(os.environ.get('PORT', 8081))
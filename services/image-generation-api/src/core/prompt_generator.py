@@ -1,15 +1,29 @@
-import vertexai
-from vertexai.generative_models import GenerativeModel
 from datetime import datetime as dt
+import os
 import random
+import threading
 
-# ======== Initialize Vertex AI ========
+# ======== Vertex AI (initialized on first use; VERTEX_BACKEND=fake runs offline) ========
 PROJECT_ID = "hackathon-468512"
 LOCATION = "us-central1"
-vertexai.init(project=PROJECT_ID, location=LOCATION)
-
-# ======== Load Gemini text model ========
-text_model = GenerativeModel(model_name="gemini-2.5-flash")
+VERTEX_BACKEND = os.environ.get("VERTEX_BACKEND", "vertex").lower()
+text_model = None
+_text_model_lock = threading.Lock()
+
+def get_text_model():
+    """Gemini text model; imports and initializes the Vertex AI SDK on the first call (once across threads)"""
+    global text_model
+    if text_model is None:
+        with _text_model_lock:
+            if text_model is None:
+                if VERTEX_BACKEND == "fake":
+                    from src.utils.fake_vertex import FakeGenerativeModel as GenerativeModel
+                else:
+                    import vertexai
+                    from vertexai.generative_models import GenerativeModel
+                    vertexai.init(project=PROJECT_ID, location=LOCATION)
+                text_model = GenerativeModel(model_name="gemini-2.5-flash")
+    return text_model
 
 # ======== Holiday mapping (optional) ========
 HOLIDAY_MAP = {
@@ -47,7 +61,7 @@ Requirements:
 {input_text}
     """.strip()
 
-    response = text_model.generate_content(system_prompt)
+    response = get_text_model().generate_content(system_prompt)
     return response.text.strip()
 
 # ======== Step 2: Generate blessing text in Chinese ========
@@ -66,7 +80,7 @@ def generate_blessing(user_input=None, image_prompt=None, holiday=None):
 只輸出祝福文字，不要其他描述。
     """.strip()
 
-    response = text_model.generate_content(system_prompt)
+    response = get_text_model().generate_content(system_prompt)
     return response.text.strip()
 
 # ======== Demo interface ========
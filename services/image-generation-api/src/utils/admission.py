@@ -0,0 +1,148 @@
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+QUOTA_ERROR_NAMES = ("ResourceExhausted", "TooManyRequests")
+
+class AdmissionRejected(Exception):
+    """Raised when a call is not admitted (wait queue full, wait timed out, or upstream quota hit)"""
+
+    def __init__(self, name, reason, retry_after):
+        super().__init__(f"{name} {reason}, retry in {retry_after}s")
+        self.name = name
+        self.reason = reason
+        self.retry_after = retry_after
+
+def is_quota_error(error):
+    """Vertex AI quota / rate-limit errors (google.api_core ResourceExhausted, HTTP 429)"""
+    if type(error).__name__ in QUOTA_ERROR_NAMES or getattr(error, "code", None) == 429:
+        return True
+    message = str(error)
+    return "429" in message and "quota" in message.lower()
+
+class AdmissionController:
+    """Token bucket + concurrency limit + bounded wait queue in front of an upstream API.
+
+    A call needs a token (refilled at `rate_per_minute`, up to `burst`) and
+    one of `max_concurrent` slots. Up to `max_queue` callers wait for both,
+    each for at most `max_wait` seconds; beyond that they are rejected at
+    once with AdmissionRejected carrying a Retry-After estimate. A quota
+    error from the upstream empties the bucket so the queue backs off too.
+    rate_per_minute <= 0 or max_concurrent <= 0 lifts that limit.
+    """
+
+    def __init__(self, name, rate_per_minute=60, burst=5, max_concurrent=4, max_queue=16, max_wait=20):
+        self.name = name
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._tokens = float(burst)
+        self._refilled = time.monotonic()
+        self._in_flight = 0
+        self._queued = 0
+        self._waits = deque(maxlen=1000)  # recent queue waits (s) of admitted calls
+        self._cond = threading.Condition()
+        self.stats = {"admitted": 0, "rejected_queue_full": 0, "rejected_timeout": 0, "quota_errors": 0}
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate > 0:
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+
+    def _can_run(self):
+        has_token = self.rate <= 0 or self._tokens >= 1
+        has_slot = self.max_concurrent <= 0 or self._in_flight < self.max_concurrent
+        return has_token and has_slot
+
+    def _retry_after(self):
+        """Seconds until the queue ahead has likely drained (at least 1)"""
+        if self.rate <= 0:
+            return 1
+        return max(1, math.ceil((self._queued + 1 - self._tokens) / self.rate))
+
+    def acquire(self):
+        """Block until admitted; returns the queue wait in seconds or raises AdmissionRejected"""
+        start = time.monotonic()
+        deadline = start + self.max_wait
+        with self._cond:
+            self._refill()
+            if not self._can_run() and self._queued >= self.max_queue:
+                self.stats["rejected_queue_full"] += 1
+                raise AdmissionRejected(self.name, "queue full", self._retry_after())
+            self._queued += 1
+            try:
+                while True:
+                    self._refill()
+                    if self._can_run():
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.stats["rejected_timeout"] += 1
+                        raise AdmissionRejected(self.name, "queue wait timed out", self._retry_after())
+                    if self.rate > 0 and self._tokens < 1:
+                        remaining = min(remaining, (1 - self._tokens) / self.rate)
+                    self._cond.wait(remaining)
+            finally:
+                self._queued -= 1
+            if self.rate > 0:
+                self._tokens -= 1
+            self._in_flight += 1
+            waited = time.monotonic() - start
+            self._waits.append(waited)
+            self.stats["admitted"] += 1
+            return waited
+
+    def release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, admitted=None):
+        """Admitted section (yields the queue wait in seconds); upstream quota errors become AdmissionRejected.
+
+        admitted is the queue wait of an acquire() the caller already did (to fail fast before
+        earlier work); the slot then takes over that admission instead of acquiring again.
+        """
+        waited = self.acquire() if admitted is None else admitted
+        try:
+            yield waited
+        except Exception as e:
+            if not is_quota_error(e):
+                raise
+            with self._cond:
+                self.stats["quota_errors"] += 1
+                self._tokens = min(self._tokens, 0.0)
+                retry_after = self._retry_after()
+            raise AdmissionRejected(self.name, "quota exceeded", retry_after) from e
+        finally:
+            self.release()
+
+    def call(self, fn, *args, **kwargs):
+        with self.slot():
+            return fn(*args, **kwargs)
+
+    def snapshot(self):
+        with self._cond:
+            self._refill()
+            waits = sorted(self._waits)
+            return {
+                "rate_per_minute": round(self.rate * 60, 2),
+                "burst": self.burst,
+                "tokens": round(self._tokens, 2),
+                "max_concurrent": self.max_concurrent,
+                "in_flight": self._in_flight,
+                "queued": self._queued,
+                "max_queue": self.max_queue,
+                "queue_wait_ms": {
+                    "avg": round(sum(waits) / len(waits) * 1000, 2) if waits else None,
+                    "p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 2) if waits else None,
+                    "max": round(waits[-1] * 1000, 2) if waits else None,
+                },
+                **self.stats,
+            }
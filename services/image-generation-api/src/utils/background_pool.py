@@ -0,0 +1,157 @@
+import threading
+import time
+from collections import OrderedDict
+
+def _key_label(key):
+    return "|".join(str(part) for part in key) if isinstance(key, tuple) else str(key)
+
+class PoolItem:
+    """A pre-generated background plus the prompt it was generated from"""
+    __slots__ = ("image_bytes", "prompt", "prompt_source", "created")
+
+    def __init__(self, image_bytes, prompt, prompt_source):
+        self.image_bytes = image_bytes
+        self.prompt = prompt
+        self.prompt_source = prompt_source
+        self.created = time.time()
+
+class BackgroundPool:
+    """Keeps `size` ready backgrounds per key, refilled by a worker thread.
+
+    `produce(key)` returns (image_bytes, prompt, prompt_source) and is only
+    called from the worker. Keys are refilled when they are in `warm_keys()`
+    or were requested within `idle_ttl` seconds. Items older than `ttl` are
+    dropped; above `max_bytes` the oldest items of the least recently
+    requested keys are evicted first. size=0 disables the pool.
+    """
+
+    def __init__(self, produce, size=2, max_bytes=64 * 1024 * 1024, ttl=3 * 3600,
+                 idle_ttl=3600, warm_keys=None, poll_interval=30):
+        self.produce = produce
+        self.size = size
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.idle_ttl = idle_ttl
+        self.warm_keys = warm_keys or (lambda: [])
+        self.poll_interval = poll_interval
+        self._items = {}              # key -> [PoolItem], oldest first
+        self._demand = OrderedDict()  # key -> last request time, LRU order
+        self._bytes = 0
+        self._cond = threading.Condition()
+        self._worker = None
+        self.stats = {"hits": 0, "misses": 0, "produced": 0, "evicted": 0, "expired": 0, "errors": 0}
+
+    @property
+    def enabled(self):
+        return self.size > 0
+
+    def start(self):
+        """Start the worker thread (once; safe to call from concurrent requests)"""
+        with self._cond:
+            if self.enabled and self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="background-pool", daemon=True)
+                self._worker.start()
+        return self
+
+    def take(self, key):
+        """Pop a ready background for key (None on a miss) and schedule a refill"""
+        if not self.enabled:
+            return None
+        with self._cond:
+            self._demand[key] = time.time()
+            self._demand.move_to_end(key)
+            self._expire()
+            items = self._items.get(key)
+            item = items.pop(0) if items else None
+            if item is not None:
+                self._bytes -= len(item.image_bytes)
+                self.stats["hits"] += 1
+            else:
+                self.stats["misses"] += 1
+            self._cond.notify()
+        return item
+
+    # ---- worker ----
+    def _run(self):
+        while True:
+            key = self._next_key()
+            if key is None:
+                with self._cond:
+                    self._cond.wait(self.poll_interval)
+                continue
+            try:
+                image_bytes, prompt, prompt_source = self.produce(key)
+            except Exception as e:
+                print(f"[BACKGROUND_POOL] Failed to produce {key}: {e}")
+                with self._cond:
+                    self.stats["errors"] += 1
+                    self._cond.wait(self.poll_interval)
+                continue
+            with self._cond:
+                self._items.setdefault(key, []).append(PoolItem(image_bytes, prompt, prompt_source))
+                self._bytes += len(image_bytes)
+                self.stats["produced"] += 1
+                self._enforce_budget()
+
+    def _targets(self):
+        now = time.time()
+        for key, last in list(self._demand.items()):
+            if now - last > self.idle_ttl:
+                del self._demand[key]
+        targets = list(reversed(self._demand))  # most recently requested first
+        for key in self.warm_keys():
+            if key not in self._demand:
+                targets.append(key)
+        return targets
+
+    def _next_key(self):
+        """The target key with the fewest ready items, if any is below size and fits the budget"""
+        with self._cond:
+            self._expire()
+            best, best_count = None, self.size
+            for key in self._targets():
+                count = len(self._items.get(key, []))
+                if count < best_count:
+                    best, best_count = key, count
+            if best is not None and best_count > 0 and self._bytes >= self.max_bytes:
+                return None  # keep what we have rather than churn
+            return best
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        for key in list(self._items):
+            items = self._items[key]
+            while items and items[0].created < cutoff:
+                self._bytes -= len(items.pop(0).image_bytes)
+                self.stats["expired"] += 1
+            if not items:
+                del self._items[key]
+
+    def _enforce_budget(self):
+        if self._bytes <= self.max_bytes:
+            return
+        # Keys never or least recently requested go first
+        order = [k for k in self._items if k not in self._demand] + [k for k in self._demand if k in self._items]
+        for key in order:
+            items = self._items.get(key, [])
+            while items and self._bytes > self.max_bytes:
+                self._bytes -= len(items.pop(0).image_bytes)
+                self.stats["evicted"] += 1
+            if not items:
+                self._items.pop(key, None)
+            if self._bytes <= self.max_bytes:
+                break
+
+    # ---- introspection ----
+    def snapshot(self):
+        with self._cond:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                "enabled": self.enabled,
+                "size_per_key": self.size,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ready": {_key_label(key): len(items) for key, items in self._items.items()},
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else None,
+                **self.stats,
+            }
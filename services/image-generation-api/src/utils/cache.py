@@ -0,0 +1,118 @@
+import threading
+import time
+from collections import OrderedDict
+
+class _Flight:
+    """An in-progress computation other callers can wait on"""
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+class ResultCache:
+    """In-memory LRU cache with a TTL, a byte budget and single-flight computes.
+
+    `size_of(value)` gives the bytes charged against `max_bytes`; values larger
+    than the whole budget are returned but not stored. Concurrent
+    get_or_compute() calls for the same key run `compute` once; the others
+    wait for it ("coalesced") and see its result or its exception.
+    ttl <= 0 or max_bytes <= 0 disables storage (coalescing still applies).
+    """
+
+    def __init__(self, ttl=600, max_bytes=32 * 1024 * 1024, size_of=len):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.size_of = size_of
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self._flights = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "evicted": 0, "expired": 0}
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_bytes > 0
+
+    def get(self, key):
+        with self._lock:
+            return self._lookup(key)
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        size = self.size_of(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (value, size, time.time() + self.ttl)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.stats["evicted"] += 1
+
+    def get_or_compute(self, key, compute):
+        """Returns (value, status) with status "hit", "miss" or "coalesced" """
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                self.stats["hits"] += 1
+                return value, "hit"
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.stats["misses"] += 1
+            else:
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, "coalesced"
+
+        try:
+            flight.value = compute()
+            self.put(key, flight.value)
+            return flight.value, "miss"
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[2] < time.time():
+            self._drop(key)
+            self.stats["expired"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"] + self.stats["coalesced"]
+            served = self.stats["hits"] + self.stats["coalesced"]
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "hit_rate": round(served / lookups, 4) if lookups else None,
+                **self.stats,
+            }
@@ -0,0 +1,156 @@
+import contextvars
+import json
+import os
+import queue
+import random
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+
+# Current request: (request_id, sampled). Copied into pipeline worker threads
+# together with the rest of the context (see submit_in_context in app.py).
+_current = contextvars.ContextVar("debug_sink_request", default=(None, False))
+
+class DebugSink:
+    """Asynchronous, sampled, size-capped sink for debug artifacts.
+
+    Artifacts are grouped per request id under `root/<request_id>/`. Writes are
+    queued and serialized on a background thread; when the total size exceeds
+    `max_bytes`, whole request directories are evicted least recently written
+    first. mode: "off" (default, write() is a no-op), "sampled" (capture
+    `sample_rate` of requests) or "all".
+    """
+
+    def __init__(self, root, mode="off", sample_rate=0.0, max_bytes=64 * 1024 * 1024, queue_size=1000):
+        self.root = root
+        self.mode = mode if mode in ("off", "sampled", "all") else "off"
+        self.sample_rate = max(0.0, min(1.0, sample_rate))
+        self.max_bytes = max_bytes
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._sizes = OrderedDict()  # request_id -> bytes on disk, LRU order
+        self._lock = threading.Lock()
+        self.stats = {"written": 0, "dropped": 0, "evicted_requests": 0, "bytes": 0}
+        self._worker = None
+        if self.enabled:
+            os.makedirs(self.root, exist_ok=True)
+            self._load_existing()
+            self._worker = threading.Thread(target=self._run, name="debug-sink", daemon=True)
+            self._worker.start()
+
+    @property
+    def enabled(self):
+        return self.mode != "off"
+
+    # ---- request scope ----
+    def begin_request(self, request_id=None):
+        request_id = request_id or uuid.uuid4().hex[:16]
+        if self.mode == "all":
+            sampled = True
+        elif self.mode == "sampled":
+            sampled = random.random() < self.sample_rate
+        else:
+            sampled = False
+        return request_id, _current.set((request_id, sampled))
+
+    def end_request(self, token):
+        _current.reset(token)
+
+    @staticmethod
+    def current_request_id():
+        return _current.get()[0]
+
+    def is_sampled(self):
+        return self.enabled and _current.get()[1]
+
+    # ---- writes ----
+    def write(self, name, data):
+        """Queue an artifact for the current request; returns its future path or None"""
+        if not self.enabled:
+            return None
+        request_id, sampled = _current.get()
+        if not sampled:
+            return None
+        request_id = request_id or "no-request"
+        path = os.path.join(self.root, request_id, name)
+        try:
+            self._queue.put_nowait((request_id, path, data))
+        except queue.Full:
+            with self._lock:
+                self.stats["dropped"] += 1
+            return None
+        return path
+
+    def flush(self):
+        """Block until queued artifacts are written (tests / shutdown)"""
+        if self._worker is not None:
+            self._queue.join()
+
+    def _run(self):
+        while True:
+            request_id, path, data = self._queue.get()
+            try:
+                payload = self._serialize(data)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "wb") as f:
+                    f.write(payload)
+                self._account(request_id, len(payload))
+            except Exception as e:
+                print(f"[DEBUG_SINK] Failed to write {path}: {e}")
+            finally:
+                self._queue.task_done()
+
+    @staticmethod
+    def _serialize(data):
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            return bytes(data)
+        if isinstance(data, (dict, list)):
+            return json.dumps(data, ensure_ascii=False, indent=2, default=str).encode("utf-8")
+        return str(data).encode("utf-8")
+
+    def _account(self, request_id, size):
+        evict = []
+        with self._lock:
+            self._sizes[request_id] = self._sizes.get(request_id, 0) + size
+            self._sizes.move_to_end(request_id)
+            self.stats["written"] += 1
+            self.stats["bytes"] += size
+            while self.stats["bytes"] > self.max_bytes and len(self._sizes) > 1:
+                old_id, old_size = self._sizes.popitem(last=False)
+                self.stats["bytes"] -= old_size
+                self.stats["evicted_requests"] += 1
+                evict.append(old_id)
+        for old_id in evict:
+            shutil.rmtree(os.path.join(self.root, old_id), ignore_errors=True)
+
+    def _load_existing(self):
+        """Account for request directories left by a previous process"""
+        entries = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if not os.path.isdir(path):
+                continue
+            size = 0
+            for dirpath, _, files in os.walk(path):
+                size += sum(os.path.getsize(os.path.join(dirpath, f)) for f in files)
+            entries.append((os.path.getmtime(path), name, size))
+        for _, name, size in sorted(entries):
+            self._sizes[name] = size
+            self.stats["bytes"] += size
+
+    # ---- introspection ----
+    def recent_requests(self, limit=10):
+        with self._lock:
+            items = list(self._sizes.items())[-limit:]
+        return [{"request_id": rid, "bytes": size} for rid, size in reversed(items)]
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "sample_rate": self.sample_rate,
+                "max_bytes": self.max_bytes,
+                "requests": len(self._sizes),
+                "queued": self._queue.qsize(),
+                **self.stats,
+            }
@@ -0,0 +1,96 @@
+from PIL import Image
+import hashlib
+import io
+
+# Output sizes (long edge in px; None keeps the composed resolution)
+SIZES = {
+    "thumb": 256,
+    "share": 720,
+    "full": None,
+}
+
+# format -> (PIL format, mime type, file extension, save options)
+FORMATS = {
+    "webp": ("WEBP", "image/webp", "webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "image/jpeg", "jpg", {"quality": 85, "progressive": True, "optimize": True}),
+    "png": ("PNG", "image/png", "png", {"compress_level": 6}),
+}
+
+FORMAT_ALIASES = {"jpg": "jpeg", "image/jpeg": "jpeg", "image/webp": "webp", "image/png": "png"}
+
+DEFAULT_FORMAT = "jpeg"
+DEFAULT_SIZE = "full"
+
+def parse_accept(accept_header):
+    """Best supported format in an Accept header (q-values honoured), or None"""
+    best, best_q = None, 0.0
+    for part in (accept_header or "").split(","):
+        fields = [f.strip() for f in part.split(";")]
+        fmt = FORMAT_ALIASES.get(fields[0].lower())
+        if not fmt:
+            continue
+        q = 1.0
+        for field in fields[1:]:
+            if field.startswith("q="):
+                try:
+                    q = float(field[2:])
+                except ValueError:
+                    q = 0.0
+        # On ties prefer the smaller encoding (webp > jpeg > png)
+        if q > best_q or (q == best_q and best and list(FORMATS).index(fmt) < list(FORMATS).index(best)):
+            best, best_q = fmt, q
+    return best
+
+def negotiate(accept_header=None, fmt=None, size=None):
+    """(format, size) from explicit parameters, else the Accept header, else JPEG full size.
+
+    Raises ValueError for an unknown explicit format or size.
+    """
+    if fmt:
+        fmt = FORMAT_ALIASES.get(fmt.lower(), fmt.lower())
+        if fmt not in FORMATS:
+            raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    else:
+        fmt = parse_accept(accept_header) or DEFAULT_FORMAT
+    size = (size or DEFAULT_SIZE).lower()
+    if size not in SIZES:
+        raise ValueError(f"size must be one of {', '.join(SIZES)}")
+    return fmt, size
+
+def mime_type(fmt):
+    return FORMATS[fmt][1]
+
+def extension(fmt):
+    return FORMATS[fmt][2]
+
+def encode(source_bytes, fmt, size):
+    """Re-encode a composed JPEG into fmt at the given size name"""
+    pil_format, _, _, options = FORMATS[fmt]
+    target = SIZES[size]
+    image = Image.open(io.BytesIO(source_bytes))
+    if target and image.format == "JPEG":
+        # Let libjpeg decode at 1/2, 1/4 or 1/8 scale when shrinking a lot
+        image.draft("RGB", (target, target))
+    image = image.convert("RGB")
+    if target and max(image.size) > target:
+        image.thumbnail((target, target), Image.LANCZOS)
+    buf = io.BytesIO()
+    image.save(buf, format=pil_format, **options)
+    return buf.getvalue()
+
+class OutputEncoder:
+    """Encodes composed images once per (content, format, size) through a ResultCache.
+
+    Full-size JPEG requests return the composed bytes untouched.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def encode(self, source_bytes, fmt=DEFAULT_FORMAT, size=DEFAULT_SIZE):
+        """Returns (bytes, mime_type)"""
+        if fmt == "jpeg" and size == "full":
+            return source_bytes, mime_type(fmt)
+        key = (hashlib.sha1(source_bytes).hexdigest(), fmt, size)
+        data, _ = self.cache.get_or_compute(key, lambda: encode(source_bytes, fmt, size))
+        return data, mime_type(fmt)
@@ -0,0 +1,104 @@
+"""Offline stand-ins for the Vertex AI models (VERTEX_BACKEND=fake).
+
+FakeGenerativeModel and FakeImageGenerationModel expose the calls the
+service makes (generate_content / from_pretrained + generate_images) and
+sleep for a configurable latency instead of calling Google. Images are
+procedurally generated square PNGs derived from the prompt, so identical
+prompts give identical backgrounds.
+
+    FAKE_GEMINI_LATENCY   seconds per Gemini call (default 0.5)
+    FAKE_IMAGEN_LATENCY   seconds per Imagen call (default 3.0)
+    FAKE_LATENCY_JITTER   +/- fraction applied to both (default 0.2)
+    FAKE_IMAGE_SIZE       generated image side in px (default 1024)
+"""
+
+import hashlib
+import io
+import os
+import random
+import threading
+import time
+
+from PIL import Image, ImageDraw
+
+BLESSINGS = ["平安喜樂", "萬事如意", "心想事成", "身體健康", "順心如意", "福氣滿滿", "笑口常開", "闔家平安"]
+THEMES = [
+    "A sunlit tea garden at dawn with soft mist, warm golden tones, watercolor style",
+    "Pink lotus flowers on a calm pond, gentle morning light, pastel palette",
+    "A cozy cafe table with coffee and roses, shallow depth of field, warm film look",
+    "Rolling green hills under a clear blue sky, fresh and bright, photorealistic",
+    "Red lanterns along an old street at sunrise, festive and warm, soft bokeh",
+]
+
+def _latency(env_name, default):
+    base = float(os.environ.get(env_name, default))
+    jitter = float(os.environ.get("FAKE_LATENCY_JITTER", "0.2"))
+    return max(0.0, base * random.uniform(1 - jitter, 1 + jitter))
+
+def _seed(text):
+    return int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:8], "big")
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+class FakeGenerativeModel:
+    """Gemini stand-in: a blessing for the blessing prompt, an English image prompt otherwise"""
+
+    calls = 0
+    _lock = threading.Lock()
+
+    def __init__(self, model_name=None, **kwargs):
+        self.model_name = model_name
+
+    def generate_content(self, contents, **kwargs):
+        with self._lock:
+            FakeGenerativeModel.calls += 1
+        time.sleep(_latency("FAKE_GEMINI_LATENCY", "0.5"))
+        rng = random.Random(_seed(str(contents)))
+        if "祝福" in str(contents):
+            return FakeResponse(rng.choice(BLESSINGS))
+        return FakeResponse(f"{rng.choice(THEMES)}, 1:1 square composition, no text")
+
+class FakeImage:
+    """Mirrors vertexai's GeneratedImage: the PNG bytes live in _image_bytes"""
+
+    def __init__(self, image_bytes):
+        self._image_bytes = image_bytes
+
+def render_background(seed, size):
+    """Square PNG: a two-colour gradient with a few soft circles, all derived from seed"""
+    rng = random.Random(seed)
+    top = tuple(rng.randrange(40, 256) for _ in range(3))
+    bottom = tuple(rng.randrange(0, 200) for _ in range(3))
+    mask = Image.linear_gradient("L").resize((size, size))
+    img = Image.composite(Image.new("RGB", (size, size), bottom), Image.new("RGB", (size, size), top), mask)
+    draw = ImageDraw.Draw(img)
+    for _ in range(6):
+        r = rng.randrange(size // 16, size // 4)
+        x, y = rng.randrange(size), rng.randrange(size)
+        color = tuple(min(255, c + 40) for c in top)
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=color)
+    buf = io.BytesIO()
+    img.save(buf, format="PNG", compress_level=1)
+    return buf.getvalue()
+
+class FakeImageGenerationModel:
+    """Imagen stand-in returning procedurally generated square backgrounds"""
+
+    calls = 0
+    _lock = threading.Lock()
+
+    def __init__(self, model_name=None):
+        self.model_name = model_name
+
+    @classmethod
+    def from_pretrained(cls, model_name):
+        return cls(model_name)
+
+    def generate_images(self, prompt, number_of_images=1, **kwargs):
+        with self._lock:
+            FakeImageGenerationModel.calls += 1
+        time.sleep(_latency("FAKE_IMAGEN_LATENCY", "3.0"))
+        size = int(os.environ.get("FAKE_IMAGE_SIZE", "1024"))
+        return [FakeImage(render_background(_seed(f"{prompt}#{i}"), size)) for i in range(number_of_images)]
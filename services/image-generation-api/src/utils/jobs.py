@@ -0,0 +1,152 @@
+import contextvars
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+class JobQueueFull(Exception):
+    """Raised by submit() when max_pending jobs are already queued or running"""
+
+class Job:
+    """One unit of work on the job pool; status: queued -> running -> succeeded | failed"""
+
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = "queued"
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.size = 0  # result bytes charged against JobManager.max_bytes
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the job finishes (or timeout seconds); returns done"""
+        return self._done.wait(timeout)
+
+    def to_dict(self):
+        end = self.finished or time.time()
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "created_at": self.created,
+            "started_at": self.started,
+            "finished_at": self.finished,
+            "queued_ms": round(((self.started or end) - self.created) * 1000, 2),
+            "elapsed_ms": round((end - self.created) * 1000, 2),
+            "error": str(self.error) if self.error is not None else None,
+        }
+
+class JobManager:
+    """Bounded worker pool for long-running jobs, with results kept for result_ttl seconds.
+
+    Jobs run with a copy of the submitter's context (debug sink request id).
+    At most `max_pending` jobs may be queued or running at once; finished
+    jobs are dropped after `result_ttl` seconds, beyond `max_retained`, or
+    oldest first while their results (`size_of(result)` bytes) exceed
+    `max_bytes`. max_bytes <= 0 lifts the byte budget.
+    """
+
+    def __init__(self, workers=4, max_pending=64, result_ttl=600, max_retained=200,
+                 max_bytes=64 * 1024 * 1024, size_of=lambda result: 0):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self.max_retained = max_retained
+        self.max_bytes = max_bytes
+        self.size_of = size_of
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._jobs = OrderedDict()  # job_id -> Job, submission order
+        self._pending = 0
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"submitted": 0, "succeeded": 0, "failed": 0, "rejected": 0, "evicted": 0}
+
+    def submit(self, kind, fn, *args, **kwargs):
+        """Queue fn and return its Job; the job stays retrievable with get() until purged"""
+        return self._enqueue(Job(kind), fn, args, kwargs, retain=True)
+
+    def run(self, kind, fn, *args, **kwargs):
+        """Run on the pool and wait: returns fn's result or raises its exception.
+        The job is not retained, nothing polls a synchronous job afterwards."""
+        job = self._enqueue(Job(kind), fn, args, kwargs, retain=False)
+        job.wait()
+        if job.error is not None:
+            raise job.error
+        return job.result
+
+    def _enqueue(self, job, fn, args, kwargs, retain):
+        with self._lock:
+            self._purge()
+            if self._pending >= self.max_pending:
+                self.stats["rejected"] += 1
+                raise JobQueueFull(f"{self._pending} jobs pending (max {self.max_pending})")
+            self._pending += 1
+            self.stats["submitted"] += 1
+            if retain:
+                self._jobs[job.id] = job
+        ctx = contextvars.copy_context()
+        self._executor.submit(ctx.run, self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            self._purge()
+            return self._jobs.get(job_id)
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = "running"
+        job.started = time.time()
+        size = 0
+        try:
+            job.result = fn(*args, **kwargs)
+            job.status = "succeeded"
+            size = self.size_of(job.result)
+        except Exception as e:
+            job.error = e
+            job.status = "failed"
+        finally:
+            job.finished = time.time()
+            with self._lock:
+                self._pending -= 1
+                self.stats[job.status] += 1
+                if job.id in self._jobs:
+                    job.size = size
+                    self._bytes += size
+                    self._purge()
+            job._done.set()
+
+    def _purge(self):
+        cutoff = time.time() - self.result_ttl
+        finished = [j for j in self._jobs.values() if j.finished is not None]
+        excess = len(finished) - self.max_retained
+        for job in finished:
+            over_budget = self.max_bytes > 0 and self._bytes > self.max_bytes
+            if job.finished < cutoff or excess > 0 or over_budget:
+                if job.finished >= cutoff and excess <= 0:
+                    self.stats["evicted"] += 1
+                del self._jobs[job.id]
+                self._bytes -= job.size
+                excess -= 1
+
+    def snapshot(self):
+        with self._lock:
+            self._purge()
+            return {
+                "workers": self.workers,
+                "pending": self._pending,
+                "max_pending": self.max_pending,
+                "retained": len(self._jobs),
+                "retained_bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "result_ttl_seconds": self.result_ttl,
+                **self.stats,
+            }
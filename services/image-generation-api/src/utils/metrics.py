@@ -0,0 +1,83 @@
+import bisect
+import threading
+
+# Upper bounds (ms): our own CPU stages land in the low buckets, Gemini and Imagen in the high ones
+DEFAULT_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 20000, 30000, 60000)
+
+class Histogram:
+    """Fixed-bucket latency histogram (ms); quantiles are interpolated inside a bucket
+    and clamped to the observed min / max"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot: above the largest bound
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                estimate = lower + (upper - lower) * (rank - seen) / n
+                return round(min(max(estimate, self.min), self.max), 2)
+            seen += n
+        return round(self.max, 2)
+
+    def snapshot(self):
+        cumulative, buckets = 0, {}
+        for bound, n in zip(list(self.buckets) + ["+Inf"], self.counts):
+            cumulative += n
+            buckets[str(bound)] = cumulative
+        return {
+            "count": self.count,
+            "sum_ms": round(self.sum, 2),
+            "avg_ms": round(self.sum / self.count, 2) if self.count else None,
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+            "max_ms": round(self.max, 2),
+            "buckets_le_ms": buckets,
+        }
+
+class StageMetrics:
+    """Per-stage latency histograms fed with {stage: ms} timing dicts"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS_MS):
+        self.buckets = buckets
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, ms):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram(self.buckets)
+            histogram.observe(ms)
+
+    def record(self, timings, stages=None):
+        """Observe every (or only the listed) stage in a timings dict"""
+        for stage, ms in timings.items():
+            if stages is None or stage in stages:
+                self.observe(stage, ms)
+
+    def snapshot(self):
+        with self._lock:
+            return {stage: h.snapshot() for stage, h in sorted(self._histograms.items())}
+
+def server_timing(timings):
+    """Server-Timing header value, e.g. 'image_prompt;dur=812.4, background;dur=9120.7'"""
+    return ", ".join(f"{stage};dur={ms:.1f}" for stage, ms in timings.items())
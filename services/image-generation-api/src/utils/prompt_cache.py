@@ -0,0 +1,165 @@
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+def normalize_input(text):
+    """Cache form of a user prompt: NFKC, case-folded, whitespace collapsed, outer punctuation stripped"""
+    if not text:
+        return None
+    text = " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+    text = text.strip(" .,!?;:~。，！？；：～、")
+    return text or None
+
+def _key_label(key):
+    return "|".join(str(part) for part in key) if isinstance(key, tuple) else str(key)
+
+class PromptPair:
+    """A Gemini image prompt and the blessing generated for it"""
+    __slots__ = ("prompt", "blessing", "created", "uses")
+
+    def __init__(self, prompt, blessing):
+        self.prompt = prompt
+        self.blessing = blessing
+        self.created = time.time()
+        self.uses = 0
+
+class PromptCache:
+    """Rotating pool of up to `size` prompt/blessing pairs per key, refilled by a worker thread.
+
+    take() serves the pairs of a key round-robin, so repeated requests still
+    vary; a pair is retired after `max_uses` serves or `ttl` seconds. Keys
+    requested within `idle_ttl` seconds are topped back up to `size` with
+    `produce(key)` -> (prompt, blessing), which is only called from the
+    worker and should raise rather than return fallback text. At most
+    `max_keys` keys are kept (least recently requested dropped first).
+    size=0 disables the cache.
+    """
+
+    def __init__(self, produce, size=3, ttl=6 * 3600, max_uses=5, idle_ttl=3600,
+                 max_keys=256, poll_interval=30):
+        self.produce = produce
+        self.size = size
+        self.ttl = ttl
+        self.max_uses = max_uses
+        self.idle_ttl = idle_ttl
+        self.max_keys = max_keys
+        self.poll_interval = poll_interval
+        self._pairs = {}              # key -> [PromptPair], next to serve first
+        self._demand = OrderedDict()  # key -> last request time, LRU order
+        self._cond = threading.Condition()
+        self._worker = None
+        self.stats = {"hits": 0, "misses": 0, "produced": 0, "stored": 0, "retired": 0, "expired": 0, "errors": 0}
+
+    @property
+    def enabled(self):
+        return self.size > 0
+
+    def start(self):
+        """Start the worker thread (once; safe to call from concurrent requests)"""
+        with self._cond:
+            if self.enabled and self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="prompt-cache", daemon=True)
+                self._worker.start()
+        return self
+
+    def take(self, key):
+        """Next pair for key in rotation (None on a miss); schedules a refill"""
+        if not self.enabled:
+            return None
+        with self._cond:
+            self._demand[key] = time.time()
+            self._demand.move_to_end(key)
+            self._expire(key)
+            pairs = self._pairs.get(key)
+            pair = pairs.pop(0) if pairs else None
+            if pair is not None:
+                pair.uses += 1
+                if pair.uses < self.max_uses:
+                    pairs.append(pair)
+                else:
+                    self.stats["retired"] += 1
+                self.stats["hits"] += 1
+            else:
+                self.stats["misses"] += 1
+            self._trim_keys()
+            self._cond.notify()
+        return pair
+
+    def put(self, key, prompt, blessing):
+        """Store a pair generated on the request path (it counts as already served once)"""
+        if not self.enabled:
+            return
+        pair = PromptPair(prompt, blessing)
+        pair.uses = 1
+        with self._cond:
+            self._add(key, pair)
+            self.stats["stored"] += 1
+
+    def _add(self, key, pair):
+        pairs = self._pairs.setdefault(key, [])
+        pairs.append(pair)
+        while len(pairs) > self.size:
+            pairs.pop(0)
+
+    # ---- worker ----
+    def _run(self):
+        while True:
+            key = self._next_key()
+            if key is None:
+                with self._cond:
+                    self._cond.wait(self.poll_interval)
+                continue
+            try:
+                prompt, blessing = self.produce(key)
+            except Exception as e:
+                print(f"[PROMPT_CACHE] Failed to produce {key}: {e}")
+                with self._cond:
+                    self.stats["errors"] += 1
+                    self._cond.wait(self.poll_interval)
+                continue
+            with self._cond:
+                if key in self._demand:
+                    self._add(key, PromptPair(prompt, blessing))
+                    self.stats["produced"] += 1
+
+    def _next_key(self):
+        """The most recently requested key below size, if any"""
+        with self._cond:
+            now = time.time()
+            for key, last in list(self._demand.items()):
+                if now - last > self.idle_ttl:
+                    del self._demand[key]
+                    self._pairs.pop(key, None)
+            for key in reversed(self._demand):
+                self._expire(key)
+                if len(self._pairs.get(key, [])) < self.size:
+                    return key
+            return None
+
+    def _expire(self, key):
+        pairs = self._pairs.get(key)
+        if not pairs:
+            return
+        cutoff = time.time() - self.ttl
+        live = [p for p in pairs if p.created >= cutoff]
+        self.stats["expired"] += len(pairs) - len(live)
+        self._pairs[key] = live
+
+    def _trim_keys(self):
+        while len(self._demand) > self.max_keys:
+            oldest, _ = self._demand.popitem(last=False)
+            self._pairs.pop(oldest, None)
+
+    # ---- introspection ----
+    def snapshot(self):
+        with self._cond:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                "enabled": self.enabled,
+                "size_per_key": self.size,
+                "keys": len(self._demand),
+                "ready": {_key_label(key): len(pairs) for key, pairs in self._pairs.items() if pairs},
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else None,
+                **self.stats,
+            }
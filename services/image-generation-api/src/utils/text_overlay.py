@@ -1,228 +1,343 @@
-from PIL import Image, ImageDraw, ImageFont
-import os
-import random
-
-CANDIDATE_FONTS = [
-    # Linux (Debian/Ubuntu) Noto fonts - these should be available after Docker install
-    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
-    "/usr/share/fonts/opentype/noto/NotoSerifCJK-Regular.ttc", 
-    "/usr/share/fonts/opentype/noto/NotoSansCJK-Bold.ttc",
-    "/usr/share/fonts/truetype/noto/NotoSansCJK-Regular.ttc",
-    "/usr/share/fonts/truetype/noto/NotoSerifCJK-Regular.ttc",
-    # Windows fonts
-    r"C:\Windows\Fonts\simsun.ttc",
-    r"C:\Windows\Fonts\simsunb.ttf", 
-    r"C:\Windows\Fonts\mingliu.ttc",
-    r"C:\Windows\Fonts\msjh.ttc",
-    r"C:\Windows\Fonts\msyh.ttc",
-    # macOS fonts
-    "/System/Library/Fonts/STSong.ttf",
-    "/System/Library/Fonts/Songti.ttc",
-    "/System/Library/Fonts/Songti SC.ttc",
-]
-
-def find_font():
-    for p in CANDIDATE_FONTS:
-        if os.path.exists(p):
-            return p
-    return None
-
-def load_font(size, font_path=None):
-    try:
-        if font_path is None:
-            font_path = find_font()
-        if font_path:
-            print(f"[FONT] Loading font: {font_path} size {size}")
-            return ImageFont.truetype(font_path, size=size)
-        else:
-            print(f"[FONT] No suitable font found, using default font size {size}")
-    except Exception as e:
-        print(f"[FONT] Error loading font {font_path}: {e}")
-    
-    # Try to load a basic font that supports some Unicode
-    try:
-        # Try to use DejaVu Sans which often supports more characters
-        return ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", size=size)
-    except:
-        pass
-    
-    print(f"[FONT] Falling back to default font")
-    return ImageFont.load_default()
-
-def corner_xy(W, H, w, h, corner, margin):
-    if corner == "top_left":
-        return margin, margin
-    if corner == "top_right":
-        return W - margin - w, margin
-    if corner == "bottom_left":
-        return margin, H - margin - h
-    if corner == "bottom_right":
-        return W - margin - w, H - margin - h
-    return W - margin - w, margin
-
-def size_text_to_target_width(draw, text, init_px, target_w_ratio, W, stroke_ratio, font_path):
-    font = load_font(init_px, font_path)
-    stroke = max(1, int(font.size * stroke_ratio))
-    for _ in range(12):
-        bbox = draw.textbbox((0, 0), text, font=font, stroke_width=stroke)
-        tw = bbox[2] - bbox[0]
-        if tw <= W * target_w_ratio or font.size <= 12:
-            break
-        scale = (W * target_w_ratio) / max(1, tw)
-        new_size = max(12, int(font.size * scale))
-        font = load_font(new_size, font_path)
-        stroke = max(1, int(font.size * stroke_ratio))
-    bbox = draw.textbbox((0, 0), text, font=font, stroke_width=stroke)
-    return font, stroke, (bbox[2] - bbox[0], bbox[3] - bbox[1])
-
-def size_vertical_text_to_target_height(draw, text, init_px, target_h_ratio, W, H, line_spacing_ratio, stroke_ratio, font_path):
-    n = max(1, len(text))
-    
-    # Calculate minimum font size based on what 7 characters would use
-    target_chars = 7
-    min_guess = init_px
-    for _ in range(12):
-        f = load_font(min_guess, font_path)
-        line_spacing = int(f.size * line_spacing_ratio)
-        bb = draw.textbbox((0, 0), "字", font=f)
-        ch_h = (bb[3] - bb[1])
-        total_h = target_chars * ch_h + (target_chars - 1) * line_spacing
-        if total_h <= int(H * target_h_ratio) or min_guess <= 16:
-            break
-        scale = (H * target_h_ratio) / max(1, total_h)
-        min_guess = max(16, int(f.size * (0.9 * scale + 0.1)))
-    
-    # Now calculate font size for actual text, using the 6-char size as minimum
-    min_font_size = min_guess
-    guess = init_px
-    for _ in range(12):
-        f = load_font(guess, font_path)
-        line_spacing = int(f.size * line_spacing_ratio)
-        bb = draw.textbbox((0, 0), "字", font=f)
-        ch_h = (bb[3] - bb[1])
-        total_h = n * ch_h + (n - 1) * line_spacing
-        if total_h <= int(H * target_h_ratio) or guess <= min_font_size:
-            break
-        scale = (H * target_h_ratio) / max(1, total_h)
-        guess = max(min_font_size, int(f.size * (0.9 * scale + 0.1)))
-    f = load_font(guess, font_path)
-    line_spacing = int(f.size * line_spacing_ratio)
-    stroke = max(1, int(f.size * stroke_ratio))
-    vt = "\n".join(list(text))
-    vb = draw.multiline_textbbox((0, 0), vt, font=f, spacing=line_spacing, stroke_width=stroke)
-    return f, stroke, line_spacing, vt, (vb[2] - vb[0], vb[3] - vb[1])
-
-def size_text_to_target_width_min(draw, text, init_px, min_px, target_w_ratio, W, stroke_ratio, font_path):
-    font = load_font(init_px, font_path)
-    stroke = max(1, int(font.size * (stroke_ratio * 0.8)))
-    for _ in range(12):
-        bb = draw.textbbox((0, 0), text, font=font, stroke_width=stroke)
-        bw = bb[2] - bb[0]
-        if bw <= W * target_w_ratio or font.size <= min_px:
-            break
-        scale = (W * target_w_ratio) / max(1, bw)
-        new_size = max(min_px, int(font.size * scale))
-        font = load_font(new_size, font_path)
-        stroke = max(1, int(font.size * (stroke_ratio * 0.8)))
-    bb = draw.textbbox((0, 0), text, font=font, stroke_width=stroke)
-    return font, stroke, (bb[2] - bb[0], bb[3] - bb[1])
-
-def overlay_greeting(
-    image_path: str,
-    top_text: str,
-    small_vertical_text: str,
-    output_path: str = "out.jpg",
-    font_path: str | None = None,
-    layout: int | str = "random",
-    top_color=(255, 255, 255),
-    bottom_color=(255, 255, 255),
-    br_color=(255, 255, 255),
-    br_text="認同請分享",
-    margin_ratio=0.04,
-    top_target_width_ratio=0.85,
-    bottom_target_height_ratio=0.45,
-    br_target_width_ratio=0.35,
-    stroke_ratio=0.06,
-    line_spacing_ratio=0.18,
-):
-    print(f"[TEXT_OVERLAY] Starting overlay: top_text='{top_text}', small_text='{small_vertical_text}'")
-    print(f"[TEXT_OVERLAY] Input image: {image_path}")
-    print(f"[TEXT_OVERLAY] Output path: {output_path}")
-    img = Image.open(image_path).convert("RGBA")
-    W, H = img.size
-    assert W == H, "請提供 1:1 方形圖片。"
-    draw = ImageDraw.Draw(img)
-    margin = int(W * margin_ratio)
-    if layout == "random":
-        layout = random.choice([1, 2, 3, 4])
-    if layout not in (1, 2, 3, 4):
-        raise ValueError("layout 只能是 1~4 或 'random'。")
-    if layout == 1:
-        big_corner = "top_right"
-        v_corner = "bottom_left"
-        br_corner = "bottom_right"
-    elif layout == 2:
-        big_corner = "bottom_right"
-        v_corner = "top_left"
-        br_corner = "top_right"
-    elif layout == 3:
-        big_corner = "top_left"
-        v_corner = "bottom_right"
-        br_corner = "bottom_left"
-    else:  # layout == 4
-        big_corner = "bottom_left"
-        v_corner = "top_right"
-        br_corner = "top_left"
-    font_top, stroke_top, (tw, th) = size_text_to_target_width(
-        draw, top_text, init_px=int(W * 0.20),  # Increased from 0.16 to 0.20 to make greeting text bigger
-        target_w_ratio=0.75, W=W,  # Increased from 0.65 to 0.75 for bigger text
-        stroke_ratio=stroke_ratio, font_path=font_path
-    )
-    # Reduce margin further to align closer to edges, especially top alignment
-    reduced_margin = int(margin * 0.1)  # Much smaller margin for tighter edge alignment
-    
-    # Custom positioning logic for better bottom alignment
-    if big_corner == "top_left":
-        top_x, top_y = reduced_margin, reduced_margin
-    elif big_corner == "top_right":
-        top_x, top_y = W - reduced_margin - tw, reduced_margin
-    elif big_corner == "bottom_left":
-        # For bottom positioning, use same margin calculation as br_text for consistency
-        top_x = reduced_margin
-        top_y = H - margin - th  # Use standard margin like br_text for proper bottom alignment
-    elif big_corner == "bottom_right":
-        # For bottom-right, use same margin calculation as br_text for consistency  
-        top_x = W - reduced_margin - tw
-        top_y = H - margin - th  # Use standard margin like br_text for proper bottom alignment
-    else:
-        top_x, top_y = W - reduced_margin - tw, reduced_margin
-    draw.text((top_x, top_y), top_text, font=font_top,
-              fill=top_color, stroke_width=stroke_top, stroke_fill=(0, 0, 0))
-    f_v, stroke_v, line_spacing, v_text, (vw, vh) = size_vertical_text_to_target_height(
-        draw, small_vertical_text, init_px=int(W * 0.12),
-        target_h_ratio=bottom_target_height_ratio, W=W, H=H,
-        line_spacing_ratio=line_spacing_ratio, stroke_ratio=stroke_ratio, font_path=font_path
-    )
-    vx, vy = corner_xy(W, H, vw, vh, v_corner, margin)
-    draw.multiline_text((vx, vy), v_text, font=f_v, spacing=line_spacing,
-                        fill=bottom_color, stroke_width=stroke_v, stroke_fill=(0, 0, 0), align="left")
-    f_br, stroke_br, (bw, bh) = size_text_to_target_width_min(
-        draw, br_text, init_px=int(W * 0.06), min_px=max(14, int(W * 0.03)),
-        target_w_ratio=br_target_width_ratio, W=W,
-        stroke_ratio=stroke_ratio, font_path=font_path
-    )
-    br_x, br_y = corner_xy(W, H, bw, bh, br_corner, margin)
-    draw.text((br_x, br_y), br_text, font=f_br,
-              fill=br_color, stroke_width=stroke_br, stroke_fill=(0, 0, 0))
-    img.convert("RGB").save(output_path, quality=95)
-    print(f"已輸出：{output_path}（版面 {layout}）")
-
-if __name__ == "__main__":
-    overlay_greeting(
-        image_path="background.jpg",
-        top_text="早安",
-        small_vertical_text="順心如意",
-        output_path="greeting_out.jpg",
-        font_path=r"C:\Windows\Fonts\simsun.ttc",
-        layout="random",
-    )
+from PIL import Image, ImageDraw, ImageFont
+import io
+import os
+import random
+from functools import lru_cache
+
+CANDIDATE_FONTS = [
+    # Linux (Debian/Ubuntu) Noto fonts - these should be available after Docker install
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/opentype/noto/NotoSerifCJK-Regular.ttc", 
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Bold.ttc",
+    "/usr/share/fonts/truetype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/noto/NotoSerifCJK-Regular.ttc",
+    # Windows fonts
+    r"C:\Windows\Fonts\simsun.ttc",
+    r"C:\Windows\Fonts\simsunb.ttf", 
+    r"C:\Windows\Fonts\mingliu.ttc",
+    r"C:\Windows\Fonts\msjh.ttc",
+    r"C:\Windows\Fonts\msyh.ttc",
+    # macOS fonts
+    "/System/Library/Fonts/STSong.ttf",
+    "/System/Library/Fonts/Songti.ttc",
+    "/System/Library/Fonts/Songti SC.ttc",
+]
+
+# FreeTypeFont objects keyed by (path, size). Fonts are opened by path, so
+# FreeType memory-maps the .ttc and forked workers share its pages.
+FONT_CACHE_SIZE = int(os.environ.get("FONT_CACHE_SIZE", "64"))
+FALLBACK_FONT = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+
+# Pre-rendered RGBA layers for repeated strings (早安/午安/晚安, 認同請分享),
+# keyed by (text, font, size, stroke, colours). 0 disables the cache.
+TEXT_LAYER_CACHE_SIZE = int(os.environ.get("TEXT_LAYER_CACHE_SIZE", "64"))
+
+@lru_cache(maxsize=1)
+def find_font():
+    for p in CANDIDATE_FONTS:
+        if os.path.exists(p):
+            return p
+    return None
+
+@lru_cache(maxsize=FONT_CACHE_SIZE)
+def _load_font_cached(font_path, size):
+    try:
+        if font_path:
+            print(f"[FONT] Loading font: {font_path} size {size}")
+            return ImageFont.truetype(font_path, size=size)
+        else:
+            print(f"[FONT] No suitable font found, using default font size {size}")
+    except Exception as e:
+        print(f"[FONT] Error loading font {font_path}: {e}")
+    
+    # Try to load a basic font that supports some Unicode
+    try:
+        # Try to use DejaVu Sans which often supports more characters
+        return ImageFont.truetype(FALLBACK_FONT, size=size)
+    except:
+        pass
+    
+    print(f"[FONT] Falling back to default font")
+    try:
+        # Pillow >= 10.1 ships a scalable default font
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        return ImageFont.load_default()
+
+def load_font(size, font_path=None):
+    if font_path is None:
+        font_path = find_font()
+    return _load_font_cached(font_path, int(size))
+
+def font_cache_info():
+    """lru_cache statistics: hits + misses == load_font calls"""
+    return _load_font_cached.cache_info()
+
+def clear_font_cache():
+    _load_font_cached.cache_clear()
+    _reference_extent.cache_clear()
+    find_font.cache_clear()
+    clear_text_layer_cache()
+
+def text_layer_cache_info():
+    return _text_layer.cache_info()
+
+def clear_text_layer_cache():
+    _text_layer.cache_clear()
+
+def preload_fonts(widths=(1024,), font_path=None):
+    """Resolve the font once and warm the cache with the initial sizes overlay_greeting
+    starts from, so workers forked after start-up inherit the loaded faces."""
+    font_path = font_path or find_font()
+    for W in widths:
+        for ratio in (0.20, 0.12, 0.06):
+            load_font(int(W * ratio), font_path)
+    return font_path
+
+def corner_xy(W, H, w, h, corner, margin):
+    if corner == "top_left":
+        return margin, margin
+    if corner == "top_right":
+        return W - margin - w, margin
+    if corner == "bottom_left":
+        return margin, H - margin - h
+    if corner == "bottom_right":
+        return W - margin - w, H - margin - h
+    return W - margin - w, margin
+
+# Glyph extents scale linearly with the font size, so each text is measured
+# once at REFERENCE_PX and the fitting size is derived in closed form; a
+# single verification measurement (or a short bisection) corrects rounding.
+REFERENCE_PX = 200
+
+@lru_cache(maxsize=256)
+def _reference_extent(font_path, text):
+    """(width, height) of `text` per pixel of font size, measured at REFERENCE_PX"""
+    font = load_font(REFERENCE_PX, font_path)
+    bbox = font.getbbox(text)
+    return (bbox[2] - bbox[0]) / REFERENCE_PX, (bbox[3] - bbox[1]) / REFERENCE_PX
+
+def _largest_fitting(size, min_size, fits):
+    """Largest size in [min_size, size] for which fits(size) holds. One call when the
+    estimate is right, otherwise a bisection over the remaining range."""
+    if size <= min_size or fits(size):
+        return max(size, min_size)
+    lo, hi = min_size, size - 1
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if fits(mid):
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+def _fit_single_line(draw, text, init_px, min_px, target_w, stroke_ratio, font_path):
+    measured = {}
+
+    def measure(size):
+        if size not in measured:
+            font = load_font(size, font_path)
+            stroke = max(1, int(font.size * stroke_ratio))
+            measured[size] = (font, stroke, draw.textbbox((0, 0), text, font=font, stroke_width=stroke))
+        return measured[size]
+
+    def fits(size):
+        bbox = measure(size)[2]
+        return bbox[2] - bbox[0] <= target_w
+
+    per_px, _ = _reference_extent(font_path, text)
+    estimate = int(target_w / max(1e-6, per_px + 2 * stroke_ratio))
+    size = _largest_fitting(min(init_px, estimate), min(min_px, init_px), fits)
+    font, stroke, bbox = measure(size)
+    return font, stroke, (bbox[2] - bbox[0], bbox[3] - bbox[1])
+
+def size_text_to_target_width(draw, text, init_px, target_w_ratio, W, stroke_ratio, font_path):
+    return _fit_single_line(draw, text, init_px, 12, W * target_w_ratio, stroke_ratio, font_path)
+
+def size_vertical_text_to_target_height(draw, text, init_px, target_h_ratio, W, H, line_spacing_ratio, stroke_ratio, font_path):
+    n = max(1, len(text))
+    target_h = int(H * target_h_ratio)
+    char_heights = {}
+
+    def total_height(size, chars):
+        if size not in char_heights:
+            bb = draw.textbbox((0, 0), "字", font=load_font(size, font_path))
+            char_heights[size] = bb[3] - bb[1]
+        return chars * char_heights[size] + (chars - 1) * int(size * line_spacing_ratio)
+
+    _, ch_per_px = _reference_extent(font_path, "字")
+
+    def estimate(chars):
+        return int(target_h / max(1e-6, chars * ch_per_px + (chars - 1) * line_spacing_ratio))
+
+    # Minimum font size: what 7 characters would use (never below 16px)
+    target_chars = 7
+    floor_px = min(16, init_px)
+    min_font_size = _largest_fitting(
+        max(floor_px, min(init_px, estimate(target_chars))), floor_px,
+        lambda size: total_height(size, target_chars) <= target_h
+    )
+    # Font size for the actual text, never below the 7-character size
+    guess = _largest_fitting(
+        max(min_font_size, min(init_px, estimate(n))), min_font_size,
+        lambda size: total_height(size, n) <= target_h
+    )
+    f = load_font(guess, font_path)
+    line_spacing = int(f.size * line_spacing_ratio)
+    stroke = max(1, int(f.size * stroke_ratio))
+    vt = "\n".join(list(text))
+    vb = draw.multiline_textbbox((0, 0), vt, font=f, spacing=line_spacing, stroke_width=stroke)
+    return f, stroke, line_spacing, vt, (vb[2] - vb[0], vb[3] - vb[1])
+
+def size_text_to_target_width_min(draw, text, init_px, min_px, target_w_ratio, W, stroke_ratio, font_path):
+    return _fit_single_line(draw, text, init_px, min_px, W * target_w_ratio, stroke_ratio * 0.8, font_path)
+
+@lru_cache(maxsize=TEXT_LAYER_CACHE_SIZE)
+def _text_layer(text, font_path, size, stroke, fill, stroke_fill):
+    """RGBA raster of a stroked single-line text and the offset of its top-left
+    corner from the draw.text anchor. Stroke and fill are rendered as separate
+    masks and composited like ImageDraw does, so the layer has straight alpha."""
+    font = load_font(size, font_path)
+    x0, y0, x1, y1 = font.getbbox(text, stroke_width=stroke)
+    box = (max(1, x1 - x0), max(1, y1 - y0))
+    stroke_mask = Image.new("L", box, 0)
+    ImageDraw.Draw(stroke_mask).text((-x0, -y0), text, font=font, fill=255, stroke_width=stroke, stroke_fill=255)
+    fill_mask = Image.new("L", box, 0)
+    ImageDraw.Draw(fill_mask).text((-x0, -y0), text, font=font, fill=255)
+    layer = Image.new("RGBA", box, tuple(stroke_fill[:3]) + (0,))
+    layer.putalpha(stroke_mask)
+    fill_layer = Image.new("RGBA", box, tuple(fill[:3]) + (0,))
+    fill_layer.putalpha(fill_mask)
+    layer.alpha_composite(fill_layer)
+    return layer, (x0, y0)
+
+def draw_text_layer(img, xy, text, font, fill, stroke_width, stroke_fill=(0, 0, 0), font_path=None):
+    """Equivalent of draw.text(xy, text, ...) on an RGBA image, using a cached layer"""
+    layer, (dx, dy) = _text_layer(text, font_path, font.size, stroke_width, tuple(fill), tuple(stroke_fill))
+    x, y = int(xy[0]) + dx, int(xy[1]) + dy
+    # alpha_composite needs a non-negative, in-bounds destination: clip the layer
+    left, top = max(0, -x), max(0, -y)
+    right = min(layer.width, img.width - x)
+    bottom = min(layer.height, img.height - y)
+    if right > left and bottom > top:
+        img.alpha_composite(layer, dest=(x + left, y + top), source=(left, top, right, bottom))
+
+def open_image(image):
+    """Accept a PIL image, raw bytes, a file-like object or a path"""
+    if isinstance(image, Image.Image):
+        return image
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return Image.open(io.BytesIO(image))
+    return Image.open(image)
+
+def pick_layout(seed=None):
+    """Layout 1~4: deterministic for a given seed, random without one"""
+    rng = random.Random(seed) if seed is not None else random
+    return rng.choice([1, 2, 3, 4])
+
+def overlay_greeting(
+    image,
+    top_text: str,
+    small_vertical_text: str,
+    output_path: str | None = None,
+    font_path: str | None = None,
+    layout: int | str = "random",
+    top_color=(255, 255, 255),
+    bottom_color=(255, 255, 255),
+    br_color=(255, 255, 255),
+    br_text="認同請分享",
+    margin_ratio=0.04,
+    top_target_width_ratio=0.85,
+    bottom_target_height_ratio=0.45,
+    br_target_width_ratio=0.35,
+    stroke_ratio=0.06,
+    line_spacing_ratio=0.18,
+    layout_seed: int | None = None,
+):
+    """Draw the greeting texts onto `image` (PIL image, bytes, file object or path)
+    and return the composed RGB image. It is also saved when output_path is given.
+    layout="random" draws from layout_seed when one is given, so results are reproducible."""
+    print(f"[TEXT_OVERLAY] Starting overlay: top_text='{top_text}', small_text='{small_vertical_text}'")
+    img = open_image(image).convert("RGBA")
+    W, H = img.size
+    assert W == H, "請提供 1:1 方形圖片。"
+    draw = ImageDraw.Draw(img)
+    margin = int(W * margin_ratio)
+    if layout == "random":
+        layout = pick_layout(layout_seed)
+    if layout not in (1, 2, 3, 4):
+        raise ValueError("layout 只能是 1~4 或 'random'。")
+    if layout == 1:
+        big_corner = "top_right"
+        v_corner = "bottom_left"
+        br_corner = "bottom_right"
+    elif layout == 2:
+        big_corner = "bottom_right"
+        v_corner = "top_left"
+        br_corner = "top_right"
+    elif layout == 3:
+        big_corner = "top_left"
+        v_corner = "bottom_right"
+        br_corner = "bottom_left"
+    else:  # layout == 4
+        big_corner = "bottom_left"
+        v_corner = "top_right"
+        br_corner = "top_left"
+    font_top, stroke_top, (tw, th) = size_text_to_target_width(
+        draw, top_text, init_px=int(W * 0.20),  # Increased from 0.16 to 0.20 to make greeting text bigger
+        target_w_ratio=0.75, W=W,  # Increased from 0.65 to 0.75 for bigger text
+        stroke_ratio=stroke_ratio, font_path=font_path
+    )
+    # Reduce margin further to align closer to edges, especially top alignment
+    reduced_margin = int(margin * 0.1)  # Much smaller margin for tighter edge alignment
+    
+    # Custom positioning logic for better bottom alignment
+    if big_corner == "top_left":
+        top_x, top_y = reduced_margin, reduced_margin
+    elif big_corner == "top_right":
+        top_x, top_y = W - reduced_margin - tw, reduced_margin
+    elif big_corner == "bottom_left":
+        # For bottom positioning, use same margin calculation as br_text for consistency
+        top_x = reduced_margin
+        top_y = H - margin - th  # Use standard margin like br_text for proper bottom alignment
+    elif big_corner == "bottom_right":
+        # For bottom-right, use same margin calculation as br_text for consistency  
+        top_x = W - reduced_margin - tw
+        top_y = H - margin - th  # Use standard margin like br_text for proper bottom alignment
+    else:
+        top_x, top_y = W - reduced_margin - tw, reduced_margin
+    draw_text_layer(img, (top_x, top_y), top_text, font_top,
+                    fill=top_color, stroke_width=stroke_top, stroke_fill=(0, 0, 0), font_path=font_path)
+    f_v, stroke_v, line_spacing, v_text, (vw, vh) = size_vertical_text_to_target_height(
+        draw, small_vertical_text, init_px=int(W * 0.12),
+        target_h_ratio=bottom_target_height_ratio, W=W, H=H,
+        line_spacing_ratio=line_spacing_ratio, stroke_ratio=stroke_ratio, font_path=font_path
+    )
+    vx, vy = corner_xy(W, H, vw, vh, v_corner, margin)
+    draw.multiline_text((vx, vy), v_text, font=f_v, spacing=line_spacing,
+                        fill=bottom_color, stroke_width=stroke_v, stroke_fill=(0, 0, 0), align="left")
+    f_br, stroke_br, (bw, bh) = size_text_to_target_width_min(
+        draw, br_text, init_px=int(W * 0.06), min_px=max(14, int(W * 0.03)),
+        target_w_ratio=br_target_width_ratio, W=W,
+        stroke_ratio=stroke_ratio, font_path=font_path
+    )
+    br_x, br_y = corner_xy(W, H, bw, bh, br_corner, margin)
+    draw_text_layer(img, (br_x, br_y), br_text, f_br,
+                    fill=br_color, stroke_width=stroke_br, stroke_fill=(0, 0, 0), font_path=font_path)
+    result = img.convert("RGB")
+    if output_path:
+        result.save(output_path, quality=95)
+        print(f"已輸出：{output_path}（版面 {layout}）")
+    else:
+        print(f"[TEXT_OVERLAY] Done（版面 {layout}）")
+    return result
+
+if __name__ == "__main__":
+    overlay_greeting(
+        image="background.jpg",
+        top_text="早安",
+        small_vertical_text="順心如意",
+        output_path="greeting_out.jpg",
+        font_path=r"C:\Windows\Fonts\simsun.ttc",
+        layout="random",
+    )
@@ -0,0 +1,98 @@
+from PIL import Image, ImageOps
+import io
+import os
+
+# Uploads are read in chunks up to MAX_UPLOAD_BYTES and never touch disk
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", str(15 * 1024 * 1024)))
+MAX_UPLOAD_PIXELS = int(os.environ.get("MAX_UPLOAD_PIXELS", str(50_000_000)))
+UPLOAD_TARGET_SIZE = int(os.environ.get("UPLOAD_TARGET_SIZE", "1024"))
+CHUNK_SIZE = 64 * 1024
+
+class UploadError(Exception):
+    """Rejected upload; status is the HTTP status to answer with (400 / 413 / 415)"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def read_limited(stream, max_bytes=MAX_UPLOAD_BYTES):
+    """Read a stream in chunks, failing with 413 as soon as it exceeds max_bytes"""
+    buf = io.BytesIO()
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        if buf.tell() + len(chunk) > max_bytes:
+            raise UploadError(413, f"Image larger than {max_bytes // (1024 * 1024)} MB")
+        buf.write(chunk)
+    return buf.getvalue()
+
+def sniff_format(head):
+    """Image format from magic bytes (JPEG / PNG / WEBP / GIF), or None"""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "JPEG"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "PNG"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "WEBP"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "GIF"
+    return None
+
+def square_box(width, height):
+    """Centred square crop box"""
+    side = min(width, height)
+    left = (width - side) // 2
+    top = (height - side) // 2
+    return (left, top, left + side, top + side)
+
+def ingest_upload(stream, max_bytes=MAX_UPLOAD_BYTES, target=UPLOAD_TARGET_SIZE):
+    """Read, validate and normalize an uploaded photo.
+
+    Returns (square RGB PIL image at most target px, info dict). Large JPEGs
+    are decoded at a reduced DCT scale (draft mode) that still covers the
+    target; EXIF rotation is applied, then the centre crop and the resize
+    happen in a single resample.
+    """
+    data = read_limited(stream, max_bytes)
+    if not data:
+        raise UploadError(400, "Empty image upload")
+    fmt = sniff_format(data[:16])
+    if fmt is None:
+        raise UploadError(415, "Unsupported image format (JPEG, PNG, WEBP or GIF)")
+
+    try:
+        img = Image.open(io.BytesIO(data), formats=[fmt])
+    except Exception as e:
+        raise UploadError(415, f"Unreadable {fmt} image: {e}")
+    original_size = img.size
+    if original_size[0] * original_size[1] > MAX_UPLOAD_PIXELS:
+        raise UploadError(413, f"Image has too many pixels ({original_size[0]}x{original_size[1]})")
+
+    if fmt == "JPEG":
+        # Ask for the smallest DCT scale whose short side still reaches target
+        short = min(original_size)
+        if short > target:
+            scale = target / short
+            img.draft("RGB", (int(original_size[0] * scale) + 1, int(original_size[1] * scale) + 1))
+    decoded_size = img.size
+
+    try:
+        img = ImageOps.exif_transpose(img)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        box = square_box(*img.size)
+        side = box[2] - box[0]
+        out = min(side, target)
+        img = img.resize((out, out), Image.LANCZOS, box=box)
+    except Exception as e:
+        raise UploadError(415, f"Could not decode {fmt} image: {e}")
+
+    info = {
+        "format": fmt,
+        "bytes": len(data),
+        "original_size": list(original_size),
+        "decoded_size": list(decoded_size),
+        "output_size": list(img.size),
+    }
+    return img, info
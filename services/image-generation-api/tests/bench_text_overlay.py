@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite for the text_overlay rendering engine.
+
+Renders synthetic square backgrounds at several resolutions, all four
+layouts and a range of blessing lengths, and reports per render: wall and
+CPU time, peak memory (Python heap via tracemalloc, and the process peak
+RSS increase on Linux, which covers Pillow's image buffers but reads low
+once freed buffers are already resident) and the number of load_font
+calls. Results can be saved as a baseline JSON file and later runs
+compared against it; the exit status is 1 on regressions.
+
+--cache-compare runs the older comparison instead: cold font cache (every
+size re-opened, as before the cache existed), warm fonts without the text
+layer cache, and fully warm caches.
+
+Usage (from services/image-generation-api):
+    PYTHONPATH=. python tests/bench_text_overlay.py [--runs 5] [--sizes 512,1024,2048] [--font PATH]
+    PYTHONPATH=. python tests/bench_text_overlay.py --save-baseline overlay_baseline.json
+    PYTHONPATH=. python tests/bench_text_overlay.py --baseline overlay_baseline.json [--tolerance 0.25]
+    PYTHONPATH=. python tests/bench_text_overlay.py --cache-compare [--runs 10] [--size 1024]
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import PIL
+from PIL import Image
+
+from src.utils.text_overlay import (
+    overlay_greeting,
+    clear_font_cache,
+    clear_text_layer_cache,
+    find_font,
+    font_cache_info,
+    text_layer_cache_info,
+)
+
+BLESSINGS = {
+    2: '平安',
+    4: '平安喜樂',
+    8: '平安喜樂萬事如意',
+    14: '平安喜樂萬事如意心想事成健康',
+}
+TOP_TEXT = '早安'
+
+def make_background(size):
+    """Square gradient background as PNG bytes"""
+    img = Image.linear_gradient('L').resize((size, size)).convert('RGB')
+    buf = io.BytesIO()
+    img.save(buf, format='PNG')
+    return buf.getvalue()
+
+def make_background_image(size):
+    """Square gradient + noise background (decoded, so only the overlay is measured)"""
+    gradient = Image.linear_gradient('L').resize((size, size))
+    noise = Image.effect_noise((size, size), 48)
+    return Image.merge('RGB', (gradient, noise, gradient.transpose(Image.Transpose.ROTATE_90)))
+
+# ---- memory probes ----
+
+def _read_status(field):
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+def _reset_peak_rss():
+    """Reset VmHWM to the current RSS (Linux >= 4.0); False when unsupported"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def peak_rss_increase_kb(fn):
+    """Process peak RSS growth while running fn(), or None off Linux"""
+    if not _reset_peak_rss():
+        fn()
+        return None
+    before = _read_status('VmRSS')
+    fn()
+    peak = _read_status('VmHWM')
+    return peak - before if before is not None and peak is not None else None
+
+# ---- suite ----
+
+def render_case(background, layout, blessing, font_path):
+    return overlay_greeting(
+        image=background,
+        top_text=TOP_TEXT,
+        small_vertical_text=blessing,
+        font_path=font_path,
+        layout=layout,
+    )
+
+def measure_case(background, layout, blessing, font_path, runs):
+    render_case(background, layout, blessing, font_path)  # warm-up (fonts, layers)
+
+    wall, cpu = [], []
+    font_before = font_cache_info()
+    for _ in range(runs):
+        start, cpu_start = time.perf_counter(), time.process_time()
+        render_case(background, layout, blessing, font_path)
+        wall.append((time.perf_counter() - start) * 1000)
+        cpu.append((time.process_time() - cpu_start) * 1000)
+    font_after = font_cache_info()
+    load_font_calls = (font_after.hits + font_after.misses) - (font_before.hits + font_before.misses)
+
+    rss_kb = peak_rss_increase_kb(lambda: render_case(background, layout, blessing, font_path))
+
+    tracemalloc.start()
+    render_case(background, layout, blessing, font_path)
+    _, python_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'wall_ms': round(statistics.median(wall), 3),
+        'cpu_ms': round(statistics.median(cpu), 3),
+        'python_peak_kb': round(python_peak / 1024, 1),
+        'rss_peak_kb': rss_kb,
+        'load_font_calls': round(load_font_calls / runs, 2),
+    }
+
+def run_suite(sizes, layouts, runs, font_path):
+    clear_font_cache()
+    cases = {}
+    for size in sizes:
+        background = make_background_image(size)
+        for layout in layouts:
+            for length, blessing in BLESSINGS.items():
+                name = f"{size}px/layout{layout}/{length}ch"
+                cases[name] = measure_case(background, layout, blessing, font_path, runs)
+                print(f"  {name:<24} {cases[name]['cpu_ms']:8.2f} ms cpu", file=sys.stderr)
+    return {
+        'meta': {
+            'font': font_path or find_font(),
+            'runs': runs,
+            'python': platform.python_version(),
+            'pillow': PIL.__version__,
+            'machine': platform.machine(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'cases': cases,
+    }
+
+def compare(current, baseline, tolerance):
+    """Regressions: time or Python heap above baseline * (1 + tolerance), or more load_font calls"""
+    regressions = []
+    for name, base in baseline['cases'].items():
+        now = current['cases'].get(name)
+        if now is None:
+            continue
+        for metric in ('cpu_ms', 'python_peak_kb'):
+            if base[metric] and now[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{name}: {metric} {base[metric]} -> {now[metric]}")
+        if now['load_font_calls'] > base['load_font_calls']:
+            regressions.append(f"{name}: load_font_calls {base['load_font_calls']} -> {now['load_font_calls']}")
+    return regressions
+
+def print_report(report, baseline=None):
+    header = f"{'case':<24} {'wall ms':>9} {'cpu ms':>9} {'py peak KB':>11} {'rss peak KB':>12} {'load_font':>10}"
+    if baseline:
+        header += f" {'cpu vs base':>12}"
+    print("\n" + header)
+    print("-" * len(header))
+    for name, case in report['cases'].items():
+        rss = case['rss_peak_kb'] if case['rss_peak_kb'] is not None else '-'
+        line = (f"{name:<24} {case['wall_ms']:9.2f} {case['cpu_ms']:9.2f} {case['python_peak_kb']:11.1f}"
+                f" {rss:>12} {case['load_font_calls']:10.2f}")
+        base = baseline['cases'].get(name) if baseline else None
+        if base:
+            line += f" {(case['cpu_ms'] / base['cpu_ms'] - 1) * 100:+11.1f}%" if base['cpu_ms'] else f" {'-':>12}"
+        print(line)
+
+# ---- cache comparison ----
+
+def render(background, font_path):
+    """(wall ms, CPU ms) for one overlay"""
+    start, cpu_start = time.perf_counter(), time.process_time()
+    overlay_greeting(
+        image=background,
+        top_text='早安',
+        small_vertical_text='平安喜樂萬事如意',
+        font_path=font_path,
+        layout=1,
+    )
+    return (time.perf_counter() - start) * 1000, (time.process_time() - cpu_start) * 1000
+
+def bench(runs, size, font_path, reset):
+    background = make_background(size)
+    clear_font_cache()
+    render(background, font_path)  # warm-up (imports, decoder)
+    times = []
+    for _ in range(runs):
+        if reset:
+            reset()
+        times.append(render(background, font_path))
+    return times
+
+def cache_compare(runs, size, font_path):
+    results = {}
+    modes = (
+        ('cold_cache', clear_font_cache),
+        ('no_layers', clear_text_layer_cache),
+        ('warm_cache', None),
+    )
+    for label, reset in modes:
+        results[label] = bench(runs, size, font_path, reset)
+    info = font_cache_info()
+    layers = text_layer_cache_info()
+
+    print("\n" + "=" * 60)
+    print(f"overlay_greeting {size}x{size}, {runs} runs")
+    print("=" * 60)
+    for label, times in results.items():
+        wall = [t[0] for t in times]
+        cpu = [t[1] for t in times]
+        print(f"{label:>11}: wall median {statistics.median(wall):8.2f} ms   min {min(wall):8.2f} ms"
+              f"   cpu median {statistics.median(cpu):8.2f} ms")
+    print(f"font cache: {info.hits} hits / {info.misses} misses (warm run)")
+    print(f"text layer cache: {layers.hits} hits / {layers.misses} misses (warm run)")
+
+def main():
+    parser = argparse.ArgumentParser(description='text_overlay benchmark suite')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--sizes', default='512,1024,2048', help='comma-separated square resolutions')
+    parser.add_argument('--layouts', default='1,2,3,4')
+    parser.add_argument('--font', default=None, help='font path (default: first available CJK font)')
+    parser.add_argument('--save-baseline', metavar='PATH', help='write the results as a baseline JSON file')
+    parser.add_argument('--baseline', metavar='PATH', help='compare against a saved baseline (exit 1 on regressions)')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative slowdown / memory growth')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    parser.add_argument('--cache-compare', action='store_true', help='cold vs warm font / text layer caches')
+    parser.add_argument('--size', type=int, default=1024, help='resolution for --cache-compare')
+    args = parser.parse_args()
+
+    if args.cache_compare:
+        cache_compare(args.runs, args.size, args.font)
+        return 0
+
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+    layouts = [int(l) for l in args.layouts.split(',') if l.strip()]
+    report = run_suite(sizes, layouts, args.runs, args.font)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report, baseline)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nBaseline saved to {args.save_baseline}")
+
+    if baseline:
+        if baseline['meta'].get('font') != report['meta']['font']:
+            print(f"\n⚠️ baseline font {baseline['meta'].get('font')} differs from {report['meta']['font']}")
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) over {args.tolerance:.0%} tolerance:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"\n✅ no regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
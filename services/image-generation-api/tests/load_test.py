@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Offline load driver for the image service.
+
+Runs the Flask app in-process with the fake Vertex backend
+(VERTEX_BACKEND=fake, see src/utils/fake_vertex.py) and fires
+/generate, /generate-json and /generate-template at each concurrency
+level. Per endpoint and level it reports throughput, p50/p95/p99
+latency, status counts (429 = admission control, 503 = job pool full)
+and process RSS growth (current and peak, Linux only).
+
+By default every request uses a distinct prompt or custom text, so the
+result, prompt and composed-image caches do not hide the pipeline cost;
+--cached repeats the same inputs instead. Admission limits are lifted
+unless --keep-admission is given (or the IMAGEN_* / GEMINI_* variables
+are already set). --url drives a running server instead (needs
+`requests`; no memory numbers).
+
+Usage (from services/image-generation-api):
+    PYTHONPATH=. python tests/load_test.py [--levels 1,4,16] [--requests 32]
+    PYTHONPATH=. python tests/load_test.py --imagen-latency 0.5 --gemini-latency 0.1 --json
+    PYTHONPATH=. python tests/load_test.py --endpoints generate-template --cached
+    PYTHONPATH=. python tests/load_test.py --url http://localhost:8081 --levels 1,8
+"""
+
+import argparse
+import gc
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+ENDPOINTS = ('generate', 'generate-json', 'generate-template')
+TEMPLATES = ('countryside_landscape', 'coffee_rose')
+
+# ---- memory probes (same approach as bench_text_overlay.py) ----
+
+def _read_status(field):
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+def _reset_peak_rss():
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+# ---- request builders ----
+
+def request_args(endpoint, i, cached):
+    """(path, kwargs for the client) for the i-th request to endpoint"""
+    tag = 0 if cached else i
+    if endpoint == 'generate-template':
+        body = {'template': TEMPLATES[i % len(TEMPLATES)], 'custom_text': f'平安喜樂{tag}', 'layout_seed': tag}
+        return '/generate-template', {'json': body}
+    return f'/{endpoint}', {'form': {'prompt': f'load test scene {tag}', 'layout_seed': str(tag)}}
+
+class InProcessClient:
+    """Flask test client; each worker thread gets its own"""
+
+    def __init__(self, app):
+        self.app = app
+
+    def post(self, path, form=None, json=None):
+        client = self.app.test_client()
+        if json is not None:
+            response = client.post(path, json=json)
+        else:
+            response = client.post(path, data=form, content_type='multipart/form-data')
+        response.get_data()
+        return response.status_code
+
+class HttpClient:
+    def __init__(self, base_url):
+        import requests
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+
+    def post(self, path, form=None, json=None):
+        if json is not None:
+            response = self.session.post(self.base_url + path, json=json, timeout=300)
+        else:
+            # files= forces multipart/form-data like the in-process client
+            response = self.session.post(self.base_url + path, files={k: (None, v) for k, v in form.items()}, timeout=300)
+        return response.status_code
+
+# ---- driver ----
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+def run_level(client, endpoint, concurrency, total, cached, offset, measure_memory):
+    def one(i):
+        path, kwargs = request_args(endpoint, offset + i, cached)
+        start = time.perf_counter()
+        try:
+            status = client.post(path, **kwargs)
+        except Exception as e:
+            print(f"  request failed: {e}", file=sys.stderr)
+            status = 'error'
+        return status, (time.perf_counter() - start) * 1000
+
+    gc.collect()
+    rss_before = _read_status('VmRSS') if measure_memory else None
+    peak_supported = measure_memory and _reset_peak_rss()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    rss_after = _read_status('VmRSS') if measure_memory else None
+    rss_peak = _read_status('VmHWM') if peak_supported else None
+
+    statuses = {}
+    for status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    ok = sorted(ms for status, ms in results if status == 200)
+    return {
+        'endpoint': endpoint,
+        'concurrency': concurrency,
+        'requests': total,
+        'statuses': statuses,
+        'throughput_rps': round(len(ok) / elapsed, 2) if elapsed else None,
+        'p50_ms': round(statistics.median(ok), 1) if ok else None,
+        'p95_ms': round(percentile(ok, 0.95), 1) if ok else None,
+        'p99_ms': round(percentile(ok, 0.99), 1) if ok else None,
+        'max_ms': round(ok[-1], 1) if ok else None,
+        'rss_growth_kb': rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+        'rss_peak_growth_kb': rss_peak - rss_before if rss_before is not None and rss_peak is not None else None,
+    }
+
+def print_report(rows):
+    header = (f"{'endpoint':<18} {'conc':>5} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+              f" {'rss +KB':>9} {'peak +KB':>9}  statuses")
+    print("\n" + header)
+    print("-" * len(header))
+    for row in rows:
+        def fmt(value, spec):
+            return format(value, spec) if value is not None else f"{'-':>{spec.split('.')[0]}}"
+        print(f"{row['endpoint']:<18} {row['concurrency']:>5} {fmt(row['throughput_rps'], '8.2f')}"
+              f" {fmt(row['p50_ms'], '9.1f')} {fmt(row['p95_ms'], '9.1f')} {fmt(row['p99_ms'], '9.1f')}"
+              f" {fmt(row['rss_growth_kb'], '9')} {fmt(row['rss_peak_growth_kb'], '9')}  {row['statuses']}")
+
+def configure_environment(args):
+    """Environment for the in-process app; must run before src.core.app is imported"""
+    os.environ['VERTEX_BACKEND'] = 'fake'
+    os.environ['FAKE_GEMINI_LATENCY'] = str(args.gemini_latency)
+    os.environ['FAKE_IMAGEN_LATENCY'] = str(args.imagen_latency)
+    os.environ.setdefault('DEBUG_SINK_MODE', 'off')
+    os.environ.setdefault('WARMUP_ON_START', 'false')
+    # warmup() starts the pool and prompt cache workers; they would produce in the background and skew the numbers
+    os.environ.setdefault('BACKGROUND_POOL_SIZE', '0')
+    os.environ.setdefault('PROMPT_CACHE_SIZE', '0')
+    if not args.keep_admission:
+        for name in ('IMAGEN_QPM', 'IMAGEN_MAX_CONCURRENT', 'GEMINI_QPM', 'GEMINI_MAX_CONCURRENT'):
+            os.environ.setdefault(name, '0')
+
+def main():
+    parser = argparse.ArgumentParser(description='offline load driver for the image service')
+    parser.add_argument('--levels', default='1,4,16', help='comma-separated concurrency levels')
+    parser.add_argument('--requests', type=int, default=32, help='requests per endpoint and level')
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS))
+    parser.add_argument('--gemini-latency', type=float, default=0.2, help='fake Gemini seconds per call')
+    parser.add_argument('--imagen-latency', type=float, default=1.0, help='fake Imagen seconds per call')
+    parser.add_argument('--cached', action='store_true', help='repeat identical inputs (cache hit path)')
+    parser.add_argument('--keep-admission', action='store_true', help='keep the IMAGEN_/GEMINI_ admission limits')
+    parser.add_argument('--url', help='drive a running server instead of the in-process app')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.levels.split(',') if level.strip()]
+    endpoints = [e.strip() for e in args.endpoints.split(',') if e.strip()]
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+
+    if args.url:
+        client = HttpClient(args.url)
+        measure_memory = False
+    else:
+        configure_environment(args)
+        from src.core import app as service
+        service.warmup()
+        client = InProcessClient(service.app)
+        measure_memory = True
+
+    rows = []
+    offset = 0
+    for endpoint in endpoints:
+        for concurrency in levels:
+            row = run_level(client, endpoint, concurrency, args.requests, args.cached, offset, measure_memory)
+            offset += args.requests
+            rows.append(row)
+            print(f"  {endpoint:<18} x{concurrency:<3} {row['throughput_rps']} req/s  p95 {row['p95_ms']} ms",
+                  file=sys.stderr)
+
+    if args.json:
+        print(json.dumps({'levels': levels, 'results': rows}, ensure_ascii=False, indent=2))
+    else:
+        print_report(rows)
+    return 0 if all(set(row['statuses']) <= {'200', '429', '503'} for row in rows) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
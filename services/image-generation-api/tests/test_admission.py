@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Offline tests for the Vertex AI admission controller (no network needed).
+
+Run from services/image-generation-api:
+    PYTHONPATH=. python -m pytest tests/test_admission.py -q
+"""
+
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.utils.admission import AdmissionController, AdmissionRejected, is_quota_error
+
+class ResourceExhausted(Exception):
+    """Stand-in with the google.api_core class name"""
+
+def test_concurrency_cap_and_full_queue_rejects_fast():
+    gate = threading.Event()
+    admission = AdmissionController('imagen', rate_per_minute=0, max_concurrent=1, max_queue=1, max_wait=5)
+
+    def call(_):
+        start = time.monotonic()
+        try:
+            admission.call(gate.wait, 5)
+            return 'ok', time.monotonic() - start
+        except AdmissionRejected as e:
+            return e.reason, time.monotonic() - start
+
+    with ThreadPoolExecutor(4) as pool:
+        futures = [pool.submit(call, i) for i in range(4)]
+        time.sleep(0.2)
+        gate.set()
+        results = [f.result() for f in futures]
+
+    outcomes = sorted(r[0] for r in results)
+    assert outcomes == ['ok', 'ok', 'queue full', 'queue full']
+    assert all(elapsed < 0.1 for reason, elapsed in results if reason == 'queue full')
+    snapshot = admission.snapshot()
+    assert snapshot['admitted'] == 2 and snapshot['rejected_queue_full'] == 2
+    assert snapshot['in_flight'] == 0 and snapshot['queue_wait_ms']['max'] >= 150
+
+def test_token_bucket_paces_calls_and_times_out():
+    admission = AdmissionController('gemini', rate_per_minute=600, burst=2, max_concurrent=0, max_queue=8, max_wait=1)
+    start = time.monotonic()
+    for _ in range(4):
+        admission.call(lambda: None)
+    # 2 from the burst, then one token per 0.1 s
+    assert 0.15 <= time.monotonic() - start < 0.5
+
+    slow = AdmissionController('imagen', rate_per_minute=6, burst=1, max_concurrent=0, max_queue=8, max_wait=0.1)
+    slow.call(lambda: None)
+    with pytest.raises(AdmissionRejected) as e:
+        slow.call(lambda: None)
+    assert e.value.reason == 'queue wait timed out' and e.value.retry_after >= 1
+    assert slow.snapshot()['rejected_timeout'] == 1
+
+def test_quota_errors_become_rejections_and_drain_the_bucket():
+    assert is_quota_error(ResourceExhausted('quota'))
+    assert is_quota_error(RuntimeError('429 Quota exceeded for aiplatform'))
+    assert not is_quota_error(RuntimeError('500 internal'))
+
+    admission = AdmissionController('imagen', rate_per_minute=60, burst=5, max_concurrent=2, max_queue=4, max_wait=5)
+
+    def exhausted():
+        raise ResourceExhausted('429 Quota exceeded')
+
+    with pytest.raises(AdmissionRejected) as e:
+        admission.call(exhausted)
+    assert e.value.reason == 'quota exceeded' and isinstance(e.value.__cause__, ResourceExhausted)
+    snapshot = admission.snapshot()
+    assert snapshot['quota_errors'] == 1 and snapshot['tokens'] < 1 and snapshot['in_flight'] == 0
+
+    with pytest.raises(ValueError):
+        admission.call(lambda: (_ for _ in ()).throw(ValueError('not a quota error')))
+
+def test_slot_takes_over_an_earlier_admission():
+    admission = AdmissionController('imagen', rate_per_minute=0, max_concurrent=1, max_queue=0, max_wait=0)
+    waited = admission.acquire()
+    with pytest.raises(AdmissionRejected):
+        admission.acquire()
+    with admission.slot(waited) as queued:
+        assert queued == waited
+        assert admission.snapshot()['in_flight'] == 1
+    snapshot = admission.snapshot()
+    assert snapshot['in_flight'] == 0 and snapshot['admitted'] == 1
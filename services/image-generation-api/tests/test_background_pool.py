@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Offline tests for the pre-generated background pool (no network needed).
+
+Run from services/image-generation-api:
+    PYTHONPATH=. python -m pytest tests/test_background_pool.py -q
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.utils.background_pool import BackgroundPool
+
+def wait_for(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+def test_warm_key_is_filled_and_refilled_after_take():
+    produced = []
+
+    def produce(key):
+        produced.append(key)
+        return b"x" * 10, f"prompt for {key}", "gemini_generated"
+
+    pool = BackgroundPool(produce, size=2, warm_keys=lambda: [("style", None, "早安")], poll_interval=0.05).start()
+    assert wait_for(lambda: pool.snapshot()["ready"].get("style|None|早安") == 2)
+    item = pool.take(("style", None, "早安"))
+    assert item.prompt == "prompt for ('style', None, '早安')"
+    assert pool.take(("other", None, "早安")) is None  # miss, but now in demand
+    assert wait_for(lambda: pool.snapshot()["ready"].get("other|None|早安") == 2)
+    assert wait_for(lambda: pool.snapshot()["ready"].get("style|None|早安") == 2)
+
+def test_byte_budget_evicts_least_recently_requested_key():
+    pool = BackgroundPool(lambda key: (b"x" * 100, "p", "s"), size=2, max_bytes=300, poll_interval=0.05)
+    pool.take("old")
+    pool.take("new")
+    pool.start()
+    assert wait_for(lambda: pool.snapshot()["ready"].get("new") == 2)
+    snapshot = pool.snapshot()
+    assert snapshot["bytes"] <= 300
+    assert snapshot["ready"].get("old", 0) < 2
+
+def test_disabled_pool_never_serves():
+    pool = BackgroundPool(lambda key: (b"x", "p", "s"), size=0).start()
+    assert pool.take("key") is None
+    assert not pool.enabled
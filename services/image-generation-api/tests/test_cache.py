@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Offline tests for the result cache (no network needed).
+
+Run from services/image-generation-api:
+    PYTHONPATH=. python -m pytest tests/test_cache.py -q
+"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.utils.cache import ResultCache
+
+def test_concurrent_identical_computes_are_coalesced():
+    calls = []
+    started = threading.Event()
+
+    def compute():
+        calls.append(1)
+        started.set()
+        time.sleep(0.1)
+        return b"image"
+
+    cache = ResultCache(ttl=60, max_bytes=1024)
+    statuses = []
+    threads = [threading.Thread(target=lambda: statuses.append(cache.get_or_compute("k", compute)[1])) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert sorted(statuses) == ["coalesced"] * 4 + ["miss"]
+    assert cache.get_or_compute("k", compute) == (b"image", "hit")
+
+def test_byte_budget_evicts_least_recently_used_and_ttl_expires():
+    cache = ResultCache(ttl=0.05, max_bytes=10)
+    cache.put("a", b"12345")
+    cache.put("b", b"12345")
+    cache.get("a")
+    cache.put("c", b"12345")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"12345"
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    assert cache.snapshot()["expired"] >= 1
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    cache = ResultCache(ttl=60, max_bytes=1024)
+
+    def boom():
+        raise RuntimeError("imagen down")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute("k", boom)
+    assert cache.get_or_compute("k", lambda: b"ok") == (b"ok", "miss")
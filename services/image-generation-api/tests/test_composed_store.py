@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Offline tests for content-addressed composition and GET /images/<key> (no network needed).
+
+Run from services/image-generation-api:
+    PYTHONPATH=. python -m pytest tests/test_composed_store.py -q
+"""
+
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from PIL import Image
+
+from src.core import app as service
+
+TEXT = {'main_text': '早安', 'blessing_text': '平安喜樂'}
+
+@pytest.fixture(autouse=True)
+def no_workers(monkeypatch):
+    # Requests start the pool / prompt cache workers, which would call Vertex AI
+    monkeypatch.setattr(service.background_pool, 'size', 0)
+    monkeypatch.setattr(service.prompt_cache, 'size', 0)
+
+def background_png(color):
+    buf = io.BytesIO()
+    Image.new('RGB', (256, 256), color).save(buf, format='PNG')
+    return buf.getvalue()
+
+def test_same_inputs_share_one_key_and_one_render():
+    background = background_png((90, 120, 160))
+    first_bytes, _, key = service.compose_final_image(background, TEXT, layout=2)
+    hits = service.composed_store.snapshot()['hits']
+    again_bytes, _, again_key = service.compose_final_image(background, TEXT, layout=2)
+    assert again_key == key and again_bytes is first_bytes
+    assert service.composed_store.snapshot()['hits'] == hits + 1
+
+    # Any change to the background or the overlay parameters changes the address
+    assert service.composition_key(background, TEXT, 3) != key
+    assert service.composition_key(background, {**TEXT, 'blessing_text': '萬事如意'}, 2) != key
+    assert service.composition_key(background_png((91, 120, 160)), TEXT, 2) != key
+    # Decoded uploads are addressed by their pixels
+    upload = Image.new('RGB', (256, 256), (10, 20, 30))
+    assert service.composition_key(upload, TEXT, 2) == service.composition_key(upload.copy(), TEXT, 2)
+
+def test_images_route_serves_by_key_with_etag():
+    _, _, key = service.compose_final_image(background_png((200, 80, 40)), TEXT, layout=1)
+    client = service.app.test_client()
+
+    response = client.get(f'/images/{key}')
+    assert response.status_code == 200 and response.mimetype == 'image/jpeg'
+    assert 'immutable' in response.headers['Cache-Control']
+    assert client.get(f'/images/{key}', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+    thumb = client.get(f'/images/{key}?format=webp&size=thumb')
+    assert thumb.mimetype == 'image/webp' and thumb.headers['ETag'] != response.headers['ETag']
+    assert client.get('/images/not-a-key').status_code == 400
+    assert client.get(f'/images/{"0" * 64}').status_code == 404
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Offline tests for the debug artifact sink (no network needed).
+
+Run from services/image-generation-api:
+    PYTHONPATH=. python -m pytest tests/test_debug_sink.py -q
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.utils.debug_sink import DebugSink
+
+def test_off_mode_writes_nothing(tmp_path):
+    sink = DebugSink(str(tmp_path / "debug"), mode="off")
+    _, token = sink.begin_request("req")
+    assert sink.write("a.txt", "hello") is None
+    sink.end_request(token)
+    assert not (tmp_path / "debug").exists()
+
+def test_all_mode_groups_by_request_and_evicts_oldest(tmp_path):
+    root = tmp_path / "debug"
+    sink = DebugSink(str(root), mode="all", max_bytes=1500)
+    for request_id in ("r1", "r2", "r3"):
+        _, token = sink.begin_request(request_id)
+        sink.write("payload.bin", b"x" * 600)
+        sink.write("meta.json", {"id": request_id})
+        sink.end_request(token)
+    sink.flush()
+    assert sorted(os.listdir(root)) == ["r2", "r3"]
+    assert sink.snapshot()["evicted_requests"] == 1
+    assert sink.write("outside.txt", "no request") is None
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Offline tests for output format negotiation and encoding (no network needed).
+
+Run from services/image-generation-api:
+    PYTHONPATH=. python -m pytest tests/test_encoder.py -q
+"""
+
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from PIL import Image
+
+from src.utils.cache import ResultCache
+from src.utils.encoder import OutputEncoder, negotiate, parse_accept
+
+def composed_jpeg(size=1024):
+    img = Image.radial_gradient('L').resize((size, size)).convert('RGB')
+    buf = io.BytesIO()
+    img.save(buf, format='JPEG', quality=95)
+    return buf.getvalue()
+
+def test_negotiation_prefers_explicit_then_accept_then_jpeg():
+    assert negotiate('image/webp,*/*', 'png', 'thumb') == ('png', 'thumb')
+    assert negotiate('image/webp,image/jpeg;q=0.9', None, None) == ('webp', 'full')
+    assert negotiate('image/webp;q=0.5,image/png', None, 'share') == ('png', 'share')
+    assert negotiate('*/*') == ('jpeg', 'full')
+    assert parse_accept('application/json') is None
+    with pytest.raises(ValueError):
+        negotiate(None, 'gif')
+    with pytest.raises(ValueError):
+        negotiate(None, 'webp', 'huge')
+
+def test_previews_are_smaller_and_encoded_once():
+    source = composed_jpeg()
+    encoder = OutputEncoder(ResultCache(ttl=60, max_bytes=1024 * 1024))
+    assert encoder.encode(source, 'jpeg', 'full') == (source, 'image/jpeg')
+    thumb, mime = encoder.encode(source, 'webp', 'thumb')
+    assert mime == 'image/webp'
+    assert Image.open(io.BytesIO(thumb)).size == (256, 256)
+    assert len(thumb) < len(source) / 4
+    assert encoder.encode(source, 'webp', 'thumb')[0] is thumb
+    assert encoder.cache.snapshot()['hits'] == 1
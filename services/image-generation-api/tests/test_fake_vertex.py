@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Offline tests for the fake Vertex backend (no network needed).
+
+Run from services/image-generation-api:
+    PYTHONPATH=. python -m pytest tests/test_fake_vertex.py -q
+"""
+
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from PIL import Image
+
+from src.utils.fake_vertex import BLESSINGS, FakeGenerativeModel, FakeImageGenerationModel
+
+def test_fake_models_are_deterministic_square_and_slow(monkeypatch):
+    monkeypatch.setenv('FAKE_IMAGEN_LATENCY', '0.05')
+    monkeypatch.setenv('FAKE_LATENCY_JITTER', '0')
+    monkeypatch.setenv('FAKE_IMAGE_SIZE', '256')
+    model = FakeImageGenerationModel.from_pretrained('imagen-3.0-generate-001')
+
+    start = time.perf_counter()
+    images = model.generate_images(prompt='tea garden', number_of_images=2)
+    assert time.perf_counter() - start >= 0.05
+    assert [Image.open(io.BytesIO(i._image_bytes)).size for i in images] == [(256, 256)] * 2
+    assert images[0]._image_bytes != images[1]._image_bytes
+    assert model.generate_images(prompt='tea garden')[0]._image_bytes == images[0]._image_bytes
+
+    monkeypatch.setenv('FAKE_GEMINI_LATENCY', '0')
+    text_model = FakeGenerativeModel(model_name='gemini-2.5-flash')
+    assert text_model.generate_content('請生成一句中文祝福語').text in BLESSINGS
+    assert 'no text' in text_model.generate_content('Turn the following text into a prompt').text
+
+def test_service_runs_end_to_end_on_fake_backend(monkeypatch):
+    from src.core import app as service
+
+    for name in ('FAKE_GEMINI_LATENCY', 'FAKE_IMAGEN_LATENCY'):
+        monkeypatch.setenv(name, '0')
+    monkeypatch.setenv('FAKE_IMAGE_SIZE', '256')
+    monkeypatch.setattr(service, 'VERTEX_BACKEND', 'fake')
+    monkeypatch.setattr(service, 'image_model', None)
+    monkeypatch.setattr(service, 'text_model', None)
+    # No pool / prompt cache workers: they would keep producing after the test
+    monkeypatch.setattr(service.background_pool, 'size', 0)
+    monkeypatch.setattr(service.prompt_cache, 'size', 0)
+
+    response = service.app.test_client().post(
+        '/generate-json', data={'prompt': 'offline fake backend'}, content_type='multipart/form-data'
+    )
+    assert response.status_code == 200
+    savepoints = response.json['savepoints']
+    assert savepoints['3_prompt_building']['source_type'] == 'gemini_generated'
+    assert savepoints['2_text_generation']['blessing_text'] in BLESSINGS
+    assert isinstance(service.image_model, FakeImageGenerationModel)
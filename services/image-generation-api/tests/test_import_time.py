@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Offline import-time budget for the image service modules (no network needed).
+
+Each module is imported in a fresh interpreter with the default environment;
+the best of a few runs must stay under IMPORT_TIME_BUDGET_MS, and no run may
+import the Vertex AI SDK or start a thread (models load on the first model
+call or /warmup, pool and prompt cache workers on warmup or the first request).
+
+Run from services/image-generation-api:
+    PYTHONPATH=. python -m pytest tests/test_import_time.py -q
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+SERVICE_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+IMPORT_TIME_BUDGET_MS = float(os.environ.get('IMPORT_TIME_BUDGET_MS', '1000'))
+RUNS = 3
+
+PROBE = """
+import json, sys, threading, time
+threads = {{t.name for t in threading.enumerate()}}
+start = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({{
+    "ms": elapsed,
+    "vertexai": any(name == "vertexai" or name.startswith("vertexai.") for name in sys.modules),
+    "new_threads": sorted({{t.name for t in threading.enumerate()}} - threads),
+}}))
+"""
+
+# Variables that change what importing the app starts; the probe runs without them
+SERVICE_ENV = ('BACKGROUND_POOL_SIZE', 'PROMPT_CACHE_SIZE', 'VERTEX_BACKEND', 'WARMUP_ON_START')
+
+def measure_import(module):
+    env = {name: value for name, value in os.environ.items() if name not in SERVICE_ENV}
+    env['PYTHONPATH'] = SERVICE_ROOT
+    result = subprocess.run(
+        [sys.executable, '-c', PROBE.format(module=module)],
+        cwd=SERVICE_ROOT, env=env, capture_output=True, text=True, timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+@pytest.mark.parametrize('module', ['src.core.app', 'src.core.prompt_generator'])
+def test_import_is_fast_and_defers_vertex(module):
+    runs = [measure_import(module) for _ in range(RUNS)]
+    assert not any(run['vertexai'] for run in runs), f"{module} imported the Vertex AI SDK"
+    assert not any(run['new_threads'] for run in runs), f"{module} started threads: {runs[0]['new_threads']}"
+    best = min(run['ms'] for run in runs)
+    assert best < IMPORT_TIME_BUDGET_MS, f"{module} took {best:.0f} ms to import (budget {IMPORT_TIME_BUDGET_MS:.0f} ms)"
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Offline tests for the job pool (no network needed).
+
+Run from services/image-generation-api:
+    PYTHONPATH=. python -m pytest tests/test_jobs.py -q
+"""
+
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.utils.jobs import JobManager, JobQueueFull
+
+def test_job_lifecycle_and_result():
+    manager = JobManager(workers=1)
+    release = threading.Event()
+    job = manager.submit("test", lambda: release.wait(5) and "done")
+    assert not job.wait(0.05)
+    assert manager.get(job.id).status in ("queued", "running")
+    release.set()
+    assert job.wait(5)
+    assert job.status == "succeeded" and job.result == "done"
+    assert manager.run("test", lambda x: x * 2, 21) == 42
+
+def test_failures_are_recorded_and_reraised_by_run():
+    manager = JobManager(workers=1)
+
+    def boom():
+        raise ValueError("bad input")
+
+    with pytest.raises(ValueError):
+        manager.run("test", boom)
+    assert manager.snapshot()["failed"] == 1
+
+def test_pending_limit_rejects_and_finished_jobs_expire():
+    manager = JobManager(workers=1, max_pending=1, result_ttl=0)
+    release = threading.Event()
+    job = manager.submit("test", release.wait, 5)
+    with pytest.raises(JobQueueFull):
+        manager.submit("test", lambda: None)
+    release.set()
+    job.wait(5)
+    assert manager.get(job.id) is None
+
+def test_finished_results_are_evicted_beyond_the_byte_budget():
+    manager = JobManager(workers=1, max_bytes=250, size_of=len)
+    jobs = [manager.submit("test", lambda n=n: b"x" * 100) for n in range(3)]
+    for job in jobs:
+        job.wait(5)
+    assert manager.get(jobs[0].id) is None
+    assert manager.get(jobs[1].id).result == b"x" * 100
+    assert manager.get(jobs[2].id) is not None
+    snapshot = manager.snapshot()
+    assert snapshot["retained_bytes"] == 200 and snapshot["evicted"] == 1
+
+    # Failed jobs hold no result bytes
+    failed = manager.submit("test", int, "not a number")
+    failed.wait(5)
+    assert manager.get(failed.id).status == "failed"
+    assert manager.snapshot()["retained_bytes"] == 200
+
+def test_run_does_not_retain_the_job():
+    manager = JobManager(workers=1)
+    assert manager.run("test", lambda: "x" * 1024) == "x" * 1024
+    with pytest.raises(ValueError):
+        manager.run("test", int, "not a number")
+    assert len(manager._jobs) == 0
+    assert manager.snapshot()["succeeded"] == 1 and manager.snapshot()["failed"] == 1
+
+def test_sync_routes_leave_no_jobs_behind(monkeypatch):
+    from src.core import app as service
+
+    for name in ('FAKE_GEMINI_LATENCY', 'FAKE_IMAGEN_LATENCY'):
+        monkeypatch.setenv(name, '0')
+    monkeypatch.setenv('FAKE_IMAGE_SIZE', '256')
+    monkeypatch.setattr(service, 'VERTEX_BACKEND', 'fake')
+    monkeypatch.setattr(service, 'image_model', None)
+    monkeypatch.setattr(service, 'text_model', None)
+    # No pool / prompt cache workers: they would keep producing after the test
+    monkeypatch.setattr(service.background_pool, 'size', 0)
+    monkeypatch.setattr(service.prompt_cache, 'size', 0)
+
+    client = service.app.test_client()
+    retained = len(service.job_manager._jobs)
+    responses = [
+        client.post('/generate', data={'prompt': 'sync job a'}, content_type='multipart/form-data'),
+        client.post('/generate-json', data={'prompt': 'sync job b'}, content_type='multipart/form-data'),
+        client.post('/generate-template', json={'template': 'coffee_rose', 'custom_text': '平安喜樂'}),
+    ]
+    assert [r.status_code for r in responses] == [200, 200, 200]
+    assert len(service.job_manager._jobs) == retained
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Offline tests for the per-stage latency histograms (no network needed).
+
+Run from services/image-generation-api:
+    PYTHONPATH=. python -m pytest tests/test_metrics.py -q
+"""
+
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.utils.metrics import Histogram, StageMetrics, server_timing
+
+def test_histogram_buckets_and_quantiles():
+    histogram = Histogram(buckets=(10, 100, 1000))
+    for value in [1] * 50 + [50] * 45 + [500] * 4 + [5000]:
+        histogram.observe(value)
+    snapshot = histogram.snapshot()
+    assert snapshot['count'] == 100 and snapshot['max_ms'] == 5000
+    assert snapshot['buckets_le_ms'] == {'10': 50, '100': 95, '1000': 99, '+Inf': 100}
+    assert snapshot['p50_ms'] == 10.0
+    assert 10 < snapshot['p95_ms'] <= 100
+    assert 100 < snapshot['p99_ms'] <= 1000
+    assert Histogram().quantile(0.5) is None
+
+def test_stage_metrics_record_filters_and_is_thread_safe():
+    metrics = StageMetrics()
+    timings = {'image_prompt': 800.0, 'imagen': 9000.0, 'encode': 12.5, 'total': 9900.0}
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda _: metrics.record(timings, ('encode', 'total')), range(200)))
+    snapshot = metrics.snapshot()
+    assert set(snapshot) == {'encode', 'total'}
+    assert snapshot['encode']['count'] == 200 and snapshot['encode']['sum_ms'] == 2500.0
+
+    metrics.record(timings)
+    assert metrics.snapshot()['imagen']['p50_ms'] == 9000.0
+
+def test_server_timing_header():
+    assert server_timing({'image_prompt': 812.44, 'total': 1000}) == 'image_prompt;dur=812.4, total;dur=1000.0'
+    assert server_timing({}) == ''
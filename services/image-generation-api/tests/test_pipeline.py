@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+App-level tests for the generation pipeline on the fake Vertex backend
+(no network needed): how many Gemini and Imagen calls one request costs.
+
+Run from services/image-generation-api:
+    PYTHONPATH=. python -m pytest tests/test_pipeline.py -q
+"""
+
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.utils.fake_vertex import FakeGenerativeModel, FakeImageGenerationModel
+
+class VertexCalls:
+    """Records what the fake Gemini / Imagen models were asked"""
+
+    def __init__(self):
+        self.gemini = []   # prompt text per generate_content call
+        self.imagen = []   # (prompt, number_of_images) per generate_images call
+        self.lock = threading.Lock()
+
+@pytest.fixture
+def vertex(monkeypatch):
+    from src.core import app as service
+
+    for name in ('FAKE_GEMINI_LATENCY', 'FAKE_IMAGEN_LATENCY'):
+        monkeypatch.setenv(name, '0')
+    monkeypatch.setenv('FAKE_IMAGE_SIZE', '256')
+    monkeypatch.setattr(service, 'VERTEX_BACKEND', 'fake')
+    monkeypatch.setattr(service, 'image_model', None)
+    monkeypatch.setattr(service, 'text_model', None)
+    # No pool / prompt cache: every request has to go through Gemini and Imagen
+    monkeypatch.setattr(service.background_pool, 'size', 0)
+    monkeypatch.setattr(service.prompt_cache, 'size', 0)
+
+    calls = VertexCalls()
+    generate_content = FakeGenerativeModel.generate_content
+    generate_images = FakeImageGenerationModel.generate_images
+
+    def record_content(self, contents, **kwargs):
+        with calls.lock:
+            calls.gemini.append(str(contents))
+        return generate_content(self, contents, **kwargs)
+
+    def record_images(self, prompt, number_of_images=1, **kwargs):
+        with calls.lock:
+            calls.imagen.append((prompt, number_of_images))
+        return generate_images(self, prompt, number_of_images, **kwargs)
+
+    monkeypatch.setattr(FakeGenerativeModel, 'generate_content', record_content)
+    monkeypatch.setattr(FakeImageGenerationModel, 'generate_images', record_images)
+    calls.client = service.app.test_client()
+    return calls
+
+def post_form(client, path, **form):
+    return client.post(path, data=form, content_type='multipart/form-data')
+
+def test_image_prompt_is_generated_once_and_shared(vertex):
+    response = post_form(vertex.client, '/generate-json', prompt='pipeline prompt sharing')
+    assert response.status_code == 200
+
+    # One Gemini call for the image prompt, one for the blessing; none repeated
+    assert len(vertex.gemini) == 2
+    prompt_call, blessing_call = sorted(vertex.gemini, key=lambda text: '祝福' in text)
+    assert 'pipeline prompt sharing' in prompt_call
+    image_prompt = response.json['savepoints']['3_prompt_building']['image_prompt']
+    # The same prompt feeds Imagen and is the blessing's context
+    assert [prompt for prompt, _ in vertex.imagen] == [image_prompt]
+    assert image_prompt in blessing_call
+
+def test_variants_share_one_imagen_call(vertex):
+    response = post_form(vertex.client, '/generate-json', prompt='pipeline three variants', variants='3')
+    assert response.status_code == 200
+
+    assert [n for _, n in vertex.imagen] == [3]
+    assert len(vertex.gemini) == 2
+    variants = response.json['variants']
+    assert [v['index'] for v in variants] == [0, 1, 2]
+    assert len({v['image_key'] for v in variants}) == 3
+    assert response.json['savepoints']['5_final_composition']['variants'] == 3
+
+def test_template_variants_share_one_imagen_call(vertex):
+    response = vertex.client.post('/generate-template', json={
+        'template': 'coffee_rose', 'custom_text': '變體測試', 'variants': 2, 'layout_seed': 'pipeline',
+    })
+    assert response.status_code == 200
+    assert [n for _, n in vertex.imagen] == [2]
+    # custom_text: no blessing call, only the image prompt
+    assert len(vertex.gemini) == 1
+
+def test_saturated_imagen_rejects_before_any_gemini_call(vertex, monkeypatch):
+    from src.core import app as service
+    from src.utils.admission import AdmissionController
+
+    imagen = AdmissionController('imagen', rate_per_minute=0, max_concurrent=1, max_queue=0, max_wait=0)
+    monkeypatch.setattr(service, 'imagen_admission', imagen)
+    imagen.acquire()  # another request's Imagen call in flight
+    try:
+        response = post_form(vertex.client, '/generate-json', prompt='pipeline admission first')
+    finally:
+        imagen.release()
+
+    assert response.status_code == 429
+    assert 'Retry-After' in response.headers
+    # Rejected before the prompt was generated: no Gemini quota spent, nothing left held
+    assert vertex.gemini == [] and vertex.imagen == []
+    assert imagen.snapshot()['in_flight'] == 0
+
+    response = post_form(vertex.client, '/generate-json', prompt='pipeline admission first')
+    assert response.status_code == 200
+    assert len(vertex.imagen) == 1
+    assert imagen.snapshot()['in_flight'] == 0
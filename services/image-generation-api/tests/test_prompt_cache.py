@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Offline tests for the Gemini prompt/blessing cache (no network needed).
+
+Run from services/image-generation-api:
+    PYTHONPATH=. python -m pytest tests/test_prompt_cache.py -q
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.utils.prompt_cache import PromptCache, normalize_input
+
+KEY = ("coffee", None, None, "早安")
+
+def wait_for(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+def test_normalize_input():
+    assert normalize_input("  Coffee   and ROSES! ") == "coffee and roses"
+    assert normalize_input("早安，咖啡。") == "早安,咖啡"  # NFKC folds the full-width comma
+    assert normalize_input("ｃｏｆｆｅｅ") == "coffee"  # full-width
+    assert normalize_input("  !! ") is None
+    assert normalize_input(None) is None
+
+def test_miss_then_background_refill_and_rotation():
+    produced = []
+
+    def produce(key):
+        produced.append(key)
+        return f"prompt {len(produced)}", f"blessing {len(produced)}"
+
+    cache = PromptCache(produce, size=3, max_uses=100, poll_interval=0.05).start()
+    assert cache.take(KEY) is None
+    cache.put(KEY, "prompt 0", "blessing 0")
+    assert wait_for(lambda: cache.snapshot()["ready"].get("coffee|None|None|早安") == 3)
+    served = [cache.take(KEY).prompt for _ in range(6)]
+    assert served[:3] == served[3:] and len(set(served)) == 3
+    assert all(key == KEY for key in produced)
+    assert cache.snapshot()["hits"] == 6
+
+def test_pairs_retire_after_max_uses_and_ttl():
+    cache = PromptCache(lambda key: ("p", "b"), size=1, max_uses=2)  # worker not started
+    cache.put(KEY, "p", "b")  # counts as one use
+    assert cache.take(KEY).prompt == "p"
+    assert cache.take(KEY) is None
+    assert cache.snapshot()["retired"] == 1
+
+    cache = PromptCache(lambda key: ("p", "b"), size=1, ttl=0.05)
+    cache.put(KEY, "p", "b")
+    time.sleep(0.1)
+    assert cache.take(KEY) is None
+    assert cache.snapshot()["expired"] == 1
+
+def test_producer_errors_and_disabled_cache():
+    def failing(key):
+        raise RuntimeError("gemini down")
+
+    cache = PromptCache(failing, size=2, poll_interval=0.05).start()
+    assert cache.take(KEY) is None
+    assert wait_for(lambda: cache.snapshot()["errors"] >= 1)
+    assert cache.take(KEY) is None
+
+    disabled = PromptCache(failing, size=0).start()
+    disabled.put(KEY, "p", "b")
+    assert disabled.take(KEY) is None and not disabled.enabled
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Tests for the raw and multipart response modes of /generate-json and
+/generate-template on the fake Vertex backend (no network needed).
+
+Run from services/image-generation-api:
+    PYTHONPATH=. python -m pytest tests/test_response_modes.py -q
+"""
+
+import json
+import os
+import sys
+from urllib.parse import unquote
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+EVIL_TEMPLATE = 'a"b\r\nX-Evil: 1'
+
+@pytest.fixture
+def client(monkeypatch):
+    from src.core import app as service
+
+    for name in ('FAKE_GEMINI_LATENCY', 'FAKE_IMAGEN_LATENCY'):
+        monkeypatch.setenv(name, '0')
+    monkeypatch.setenv('FAKE_IMAGE_SIZE', '256')
+    monkeypatch.setattr(service, 'VERTEX_BACKEND', 'fake')
+    monkeypatch.setattr(service, 'image_model', None)
+    monkeypatch.setattr(service, 'text_model', None)
+    monkeypatch.setattr(service.background_pool, 'size', 0)
+    monkeypatch.setattr(service.prompt_cache, 'size', 0)
+    return service.app.test_client()
+
+def template(client, name, response, variants=1):
+    return client.post(f'/generate-template?response={response}', json={
+        'template': name, 'custom_text': '模式測試', 'variants': variants, 'layout_seed': 7
+    })
+
+def multipart_parts(response):
+    """(headers dict, body bytes) per part of a multipart/mixed response"""
+    boundary = response.mimetype_params['boundary'].encode('ascii')
+    parts = []
+    for chunk in response.data.split(b'--' + boundary)[1:-1]:
+        head, _, body = chunk.strip(b'\r\n').partition(b'\r\n\r\n')
+        headers = dict(line.decode('ascii').split(': ', 1) for line in head.split(b'\r\n'))
+        parts.append((headers, body))
+    return parts
+
+def test_raw_returns_first_variant_and_names_the_others(client):
+    response = template(client, 'coffee_rose', 'raw', variants=2)
+    assert response.status_code == 200
+    assert response.mimetype == 'image/jpeg'
+    assert response.data[:2] == b'\xff\xd8'
+    assert response.headers['Content-Disposition'] == 'inline; filename="coffee_rose.jpg"'
+    assert response.headers['X-Variants'] == '2'
+    urls = response.headers['X-Variant-Urls'].split(', ')
+    assert len(urls) == 2 and all(url.startswith('/images/') for url in urls)
+    assert client.get(urls[0]).data == response.data
+    assert json.loads(response.headers['X-Savepoints'])['image_url'] == urls[0]
+
+def test_multipart_has_metadata_then_one_part_per_variant(client):
+    response = template(client, 'coffee_rose', 'multipart', variants=2)
+    assert response.status_code == 200
+    (meta_headers, meta), *images = multipart_parts(response)
+    assert meta_headers['Content-Type'] == 'application/json; charset=utf-8'
+    metadata = json.loads(meta)
+    assert [v['index'] for v in metadata['variants']] == [0, 1]
+    assert len(images) == 2
+    for i, (headers, body) in enumerate(images):
+        assert headers['Content-Disposition'] == f'inline; name="image"; filename="coffee_rose_{i}.jpg"'
+        assert int(headers['Content-Length']) == len(body)
+        assert body[:2] == b'\xff\xd8'
+
+@pytest.mark.parametrize('name', ['咖啡', EVIL_TEMPLATE])
+def test_raw_download_name_is_sanitized(client, name):
+    response = template(client, name, 'raw')
+    assert response.status_code == 200
+    disposition = response.headers['Content-Disposition']
+    disposition.encode('ascii')
+    assert 'X-Evil' not in response.headers
+    assert '\r' not in disposition and '\n' not in disposition
+    plain, _, extended = disposition.partition("; filename*=UTF-8''")
+    assert plain in ('inline; filename="morning.jpg"', 'inline; filename="abX-Evil1.jpg"')
+    assert unquote(extended) == f'{name}.jpg'
+
+@pytest.mark.parametrize('name', ['咖啡', EVIL_TEMPLATE])
+def test_multipart_part_headers_are_sanitized(client, name):
+    response = template(client, name, 'multipart')
+    assert response.status_code == 200
+    (_, meta), (headers, body) = multipart_parts(response)
+    assert json.loads(meta)['template'] == name
+    assert set(headers) == {'Content-Type', 'Content-Disposition', 'Content-Length'}
+    assert unquote(headers['Content-Disposition'].split("filename*=UTF-8''")[1]) == f'{name}_0.jpg'
+    assert int(headers['Content-Length']) == len(body)
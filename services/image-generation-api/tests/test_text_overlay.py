@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Offline tests for the text fitting helpers and text layer cache in text_overlay (no network needed).
+
+Run from services/image-generation-api:
+    PYTHONPATH=. python -m pytest tests/test_text_overlay.py -q
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from PIL import Image, ImageChops, ImageDraw
+
+from src.utils import text_overlay
+from src.utils.text_overlay import (
+    draw_text_layer,
+    load_font,
+    overlay_greeting,
+    pick_layout,
+    size_text_to_target_width,
+    size_text_to_target_width_min,
+    size_vertical_text_to_target_height,
+)
+
+TEXTS = ['早安', '認同請分享', '平安喜樂', '萬事如意心想事成平安喜樂']
+
+def _draw(W):
+    return ImageDraw.Draw(Image.new('RGBA', (W, W)))
+
+def _width(draw, text, size, stroke_ratio):
+    font = load_font(size)
+    stroke = max(1, int(font.size * stroke_ratio))
+    bbox = draw.textbbox((0, 0), text, font=font, stroke_width=stroke)
+    return bbox[2] - bbox[0]
+
+def test_width_fit_is_close_to_largest_size_that_fits():
+    for W in (512, 1024):
+        draw = _draw(W)
+        for text in TEXTS:
+            init_px, target = int(W * 0.20), W * 0.75
+            font, stroke, (tw, th) = size_text_to_target_width(draw, text, init_px, 0.75, W, 0.06, None)
+            assert font.size <= init_px
+            assert tw <= target or font.size == 12
+            largest = max(s for s in range(12, init_px + 1) if _width(draw, text, s, 0.06) <= target)
+            assert font.size >= largest * 0.97
+
+def test_width_min_fit_respects_minimum():
+    W = 1024
+    draw = _draw(W)
+    min_px = max(14, int(W * 0.03))
+    for text in TEXTS:
+        font, stroke, (bw, bh) = size_text_to_target_width_min(draw, text, int(W * 0.06), min_px, 0.35, W, 0.06, None)
+        assert min_px <= font.size <= int(W * 0.06)
+        assert bw <= W * 0.35 or font.size == min_px
+
+def test_vertical_fit_shrinks_with_length():
+    W = 1024
+    draw = _draw(W)
+    sizes = []
+    for text in ['平安', '平安喜樂', '平安喜樂萬事如意']:
+        f, stroke, spacing, vt, (vw, vh) = size_vertical_text_to_target_height(
+            draw, text, int(W * 0.12), 0.45, W, W, 0.18, 0.06, None
+        )
+        assert vt.count('\n') == len(text) - 1
+        assert f.size <= int(W * 0.12)
+        sizes.append(f.size)
+    assert sizes == sorted(sizes, reverse=True)
+
+def test_cached_text_layers_match_direct_drawing():
+    background = Image.linear_gradient('L').resize((512, 512)).convert('RGB')
+    for xy in ((40, 30), (-15, -10), (480, 490)):  # inside, and clipped at both edges
+        direct = background.convert('RGBA')
+        font = load_font(90)
+        ImageDraw.Draw(direct).text(xy, '早安', font=font, fill=(255, 255, 255), stroke_width=5, stroke_fill=(0, 0, 0))
+        layered = background.convert('RGBA')
+        draw_text_layer(layered, xy, '早安', font, fill=(255, 255, 255), stroke_width=5)
+        assert ImageChops.difference(direct, layered).getbbox() is None
+
+def test_repeated_greetings_reuse_text_layers():
+    text_overlay.clear_text_layer_cache()
+    background = Image.new('RGB', (512, 512), (90, 120, 160))
+    for blessing in ('平安喜樂', '萬事如意', '心想事成'):
+        overlay_greeting(background, '早安', blessing, layout=1)
+    info = text_overlay.text_layer_cache_info()
+    assert info.misses == 2  # top text + corner text, rendered once
+    assert info.hits == 4
+
+def test_seeded_random_layout_is_reproducible():
+    assert [pick_layout(seed) for seed in range(8)] == [pick_layout(seed) for seed in range(8)]
+    assert {pick_layout(seed) for seed in range(50)} == {1, 2, 3, 4}
+    background = Image.new('RGB', (256, 256), (90, 120, 160))
+    first = overlay_greeting(background, '早安', '平安喜樂', layout='random', layout_seed=7)
+    second = overlay_greeting(background, '早安', '平安喜樂', layout='random', layout_seed=7)
+    fixed = overlay_greeting(background, '早安', '平安喜樂', layout=pick_layout(7))
+    assert ImageChops.difference(first, second).getbbox() is None
+    assert ImageChops.difference(first, fixed).getbbox() is None
+
+if __name__ == "__main__":
+    test_width_fit_is_close_to_largest_size_that_fits()
+    test_width_min_fit_respects_minimum()
+    test_vertical_fit_shrinks_with_length()
+    test_cached_text_layers_match_direct_drawing()
+    test_repeated_greetings_reuse_text_layers()
+    test_seeded_random_layout_is_reproducible()
+    print("✅ text_overlay fitting tests passed")
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Offline tests for upload ingestion (no network needed).
+
+Run from services/image-generation-api:
+    PYTHONPATH=. python -m pytest tests/test_upload.py -q
+"""
+
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from PIL import Image
+
+from src.utils.upload import UploadError, ingest_upload, sniff_format
+
+def photo(width, height, fmt='JPEG', orientation=None):
+    img = Image.new('RGB', (width, height), (200, 120, 40))
+    img.paste((20, 40, 220), (0, 0, width // 2, height))  # left half blue
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    buf = io.BytesIO()
+    img.save(buf, format=fmt, **({'exif': exif.tobytes()} if fmt == 'JPEG' else {}))
+    return buf.getvalue()
+
+def test_sniffing_and_rejections():
+    assert sniff_format(photo(8, 8)[:16]) == 'JPEG'
+    assert sniff_format(photo(8, 8, 'PNG')[:16]) == 'PNG'
+    assert sniff_format(photo(8, 8, 'WEBP')[:16]) == 'WEBP'
+    assert sniff_format(b'<html>hello</html>') is None
+
+    for data, status in ((b'', 400), (b'not an image at all', 415), (b'\xff\xd8\xff' + b'\0' * 64, 415)):
+        with pytest.raises(UploadError) as e:
+            ingest_upload(io.BytesIO(data))
+        assert e.value.status == status
+
+    with pytest.raises(UploadError) as e:
+        ingest_upload(io.BytesIO(photo(400, 300)), max_bytes=1000)
+    assert e.value.status == 413
+
+def test_large_jpeg_is_draft_decoded_and_square_cropped():
+    img, info = ingest_upload(io.BytesIO(photo(4000, 3000)), target=1024)
+    assert img.mode == 'RGB' and img.size == (1024, 1024)
+    assert info['original_size'] == [4000, 3000]
+    assert info['decoded_size'] == [2000, 1500]  # 1/2 DCT scale still covers 1024
+    # Centre crop keeps both halves
+    assert img.getpixel((10, 512))[2] > 200 and img.getpixel((1010, 512))[0] > 180
+
+def test_small_upload_is_not_upscaled_and_exif_rotation_applied():
+    img, info = ingest_upload(io.BytesIO(photo(600, 400, 'PNG')), target=1024)
+    assert img.size == (400, 400) and info['format'] == 'PNG'
+
+    # Orientation 6 = rotate 90° clockwise for display: the blue half ends up on top
+    img, _ = ingest_upload(io.BytesIO(photo(600, 400, orientation=6)), target=1024)
+    assert img.size == (400, 400)
+    assert img.getpixel((200, 10))[2] > 200 and img.getpixel((200, 390))[0] > 180
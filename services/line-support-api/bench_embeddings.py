@@ -0,0 +1,115 @@
+# bench_embeddings.py
+"""Compare vector / halfvec / binary(+rescore) storage for the conversations table.
+
+Reports per-row embedding size, index size, query latency and recall@5
+(ground truth = exact full-precision search). Needs migrations/001 applied.
+
+Usage:
+    python bench_embeddings.py [--queries 50] [--k 5]
+"""
+import argparse
+import json
+import statistics
+import time
+import sqlalchemy
+
+from main import EMBEDDING_DIM, get_db_engine, set_hnsw_scan, similar_conversations_query
+
+MODES = ["vector", "halfvec", "binary"]
+
+INDEXES = {
+    "vector": None,
+    "halfvec": "conversations_vec_half_hnsw",
+    "binary": "conversations_vec_bin_hnsw",
+}
+
+
+def storage_report(conn):
+    dim = EMBEDDING_DIM
+    row = conn.execute(sqlalchemy.text(
+        "SELECT COUNT(*), "
+        "  AVG(pg_column_size(user_input_vector)), "
+        f"  AVG(pg_column_size(user_input_vector::halfvec({dim}))), "
+        f"  AVG(pg_column_size(binary_quantize(user_input_vector)::bit({dim}))) "
+        "FROM conversations WHERE user_input_vector IS NOT NULL"
+    )).fetchone()
+    report = {
+        "rows": int(row[0] or 0),
+        "avg_bytes_per_row": {
+            "vector": float(row[1] or 0),
+            "halfvec": float(row[2] or 0),
+            "binary": float(row[3] or 0),
+        },
+        "index_bytes": {},
+    }
+    for mode, index in INDEXES.items():
+        if not index:
+            continue
+        # conversations 已分區：父索引本身沒有資料，要加總每個分區的索引
+        size = conn.execute(
+            sqlalchemy.text("SELECT SUM(pg_relation_size(relid)) FROM pg_partition_tree(to_regclass(:idx))"),
+            {"idx": index},
+        ).scalar()
+        report["index_bytes"][mode] = int(size or 0)
+    return report
+
+
+def sample_queries(conn, n):
+    rows = conn.execute(sqlalchemy.text(
+        "SELECT user_input_vector::text, goal_id FROM conversations "
+        "WHERE user_input_vector IS NOT NULL AND goal_id IS NOT NULL ORDER BY random() LIMIT :n"
+    ), {"n": n}).fetchall()
+    return [(json.loads(vec), goal_id) for vec, goal_id in rows]
+
+
+def run_mode(conn, mode, queries, k, exact=False):
+    query, params = similar_conversations_query(mode, k)
+    latencies, results = [], []
+    set_hnsw_scan(conn)
+    if exact:
+        # 停用索引，取得全精度精確結果作為 ground truth
+        conn.exec_driver_sql("SET LOCAL enable_indexscan = off")
+    for vec, goal_id in queries:
+        start = time.perf_counter()
+        rows = conn.execute(query, {**params, "vec": str(vec), "goal_ids": [goal_id]}).fetchall()
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append([(r[0], r[1]) for r in rows])
+    conn.rollback()
+    return latencies, results
+
+
+def recall_at_k(truth, found, k):
+    hits, total = 0, 0
+    for t, f in zip(truth, found):
+        t_set = set(t[:k])
+        if not t_set:
+            continue
+        hits += len(t_set & set(f[:k]))
+        total += len(t_set)
+    return hits / total if total else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = get_db_engine()
+    with engine.connect() as conn:
+        report = {"storage": storage_report(conn), "modes": {}}
+        queries = sample_queries(conn, args.queries)
+        _, truth = run_mode(conn, "vector", queries, args.k, exact=True)
+        for mode in MODES:
+            run_mode(conn, mode, queries[:5], args.k)  # warm-up
+            latencies, found = run_mode(conn, mode, queries, args.k)
+            report["modes"][mode] = {
+                "p50_ms": round(statistics.median(latencies), 2) if latencies else None,
+                "p95_ms": round(sorted(latencies)[int(len(latencies) * 0.95) - 1], 2) if latencies else None,
+                f"recall@{args.k}": round(recall_at_k(truth, found, args.k), 4),
+            }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
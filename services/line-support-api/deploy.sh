@@ -23,7 +23,26 @@ docker build -t $IMAGE_NAME .
 echo "Pushing image to Google Container Registry..."
 docker push $IMAGE_NAME
 
+# Schema first: the new revision reads goal_id, screen_key, goals and
+# screen_payloads, which only exist after migrations/ are applied.
+# Needs DB_USER, DB_PASS, DB_NAME, INSTANCE_CONNECTION_NAME (and Vertex AI
+# credentials for the goal embeddings); SKIP_MIGRATIONS=true skips this step.
+if [ "${SKIP_MIGRATIONS:-false}" != "true" ]; then
+    echo "Applying database migrations..."
+    python migrate.py
+    echo "Backfilling goal ids..."
+    python goal_registry.py --backfill
+else
+    echo "SKIP_MIGRATIONS=true - not touching the database schema"
+fi
+
 # Deploy to Cloud Run
+DEPLOY_ENV_ARGS=()
+if [ -n "$MAINTENANCE_TOKEN" ]; then
+    # /maintenance/retention compares the scheduler's header against this value
+    DEPLOY_ENV_ARGS+=(--update-env-vars "MAINTENANCE_TOKEN=$MAINTENANCE_TOKEN")
+fi
+
 echo "Deploying to Cloud Run..."
 gcloud run deploy $SERVICE_NAME \
     --image $IMAGE_NAME \
@@ -34,7 +53,38 @@ gcloud run deploy $SERVICE_NAME \
     --memory 2Gi \
     --cpu 2 \
     --timeout 300 \
+    "${DEPLOY_ENV_ARGS[@]}" \
     --project $PROJECT_ID
 
 echo "Deployment completed!"
-echo "Service URL: $(gcloud run services describe $SERVICE_NAME --region $REGION --project $PROJECT_ID --format 'value(status.url)')"
\ No newline at end of file
+SERVICE_URL=$(gcloud run services describe $SERVICE_NAME --region $REGION --project $PROJECT_ID --format 'value(status.url)')
+echo "Service URL: $SERVICE_URL"
+
+if [ "${SKIP_MIGRATIONS:-false}" != "true" ]; then
+    # Rows written by the previous revision during the rollout have no goal_id yet
+    echo "Backfilling goal ids written during the rollout..."
+    python goal_registry.py --backfill
+fi
+
+# Daily retention job (partition upkeep, health-check purge, archive compaction)
+if [ -n "$MAINTENANCE_TOKEN" ]; then
+    echo "Scheduling daily retention job..."
+    gcloud scheduler jobs create http conversations-retention \
+        --location $REGION \
+        --schedule "30 3 * * *" \
+        --time-zone "Asia/Taipei" \
+        --uri "$SERVICE_URL/maintenance/retention" \
+        --http-method POST \
+        --headers "X-Maintenance-Token=$MAINTENANCE_TOKEN" \
+        --project $PROJECT_ID \
+    || gcloud scheduler jobs update http conversations-retention \
+        --location $REGION \
+        --schedule "30 3 * * *" \
+        --time-zone "Asia/Taipei" \
+        --uri "$SERVICE_URL/maintenance/retention" \
+        --http-method POST \
+        --update-headers "X-Maintenance-Token=$MAINTENANCE_TOKEN" \
+        --project $PROJECT_ID
+else
+    echo "MAINTENANCE_TOKEN not set - skipping retention scheduler job"
+fi
\ No newline at end of file
@@ -0,0 +1,133 @@
+# goal_registry.py
+"""Canonical goal registry.
+
+Free-text goals are normalized and mapped to integer ids in the `goals`
+table together with a goal embedding. Conversations are filtered on the
+indexed goal_id, and RAG expands the current goal to the most similar
+registered goals so that near-identical wordings share history.
+
+Usage:
+    python goal_registry.py --backfill    # register existing goals and fill goal_id
+"""
+import os
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, List, Tuple
+
+import sqlalchemy
+
+GOAL_EXPANSION_K = int(os.environ.get('GOAL_EXPANSION_K', '3'))
+GOAL_MAX_DISTANCE = float(os.environ.get('GOAL_MAX_DISTANCE', '0.12'))  # cosine distance
+GOAL_EXPANSION_TTL = int(os.environ.get('GOAL_EXPANSION_TTL', '600'))  # 秒，新目標註冊後才會被納入
+GOAL_CACHE_MAX = int(os.environ.get('GOAL_CACHE_MAX', '2048'))  # 每個行程快取的目標數上限（LRU）
+
+_ids: "OrderedDict[str, int]" = OrderedDict()
+_expansions: "OrderedDict[int, Tuple[float, List[int]]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _remember(cache: OrderedDict, key, value) -> None:
+    """寫入 LRU 快取，超過 GOAL_CACHE_MAX 時淘汰最久未用的；呼叫端持有 _lock"""
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > GOAL_CACHE_MAX:
+        cache.popitem(last=False)
+
+
+def normalize_goal(goal: str) -> str:
+    """NFKC、轉小寫，並移除空白、標點與符號"""
+    text = unicodedata.normalize("NFKC", str(goal or "")).casefold()
+    return "".join(
+        ch for ch in text
+        if not ch.isspace() and unicodedata.category(ch)[0] not in ("P", "S")
+    )
+
+
+def get_goal_id(engine, goal: str, embed: Callable[[str], List[float]]) -> int:
+    """取得（必要時註冊）目標 id；只有新目標才會計算向量"""
+    normalized = normalize_goal(goal) or str(goal or "")
+    with _lock:
+        if normalized in _ids:
+            _ids.move_to_end(normalized)
+            return _ids[normalized]
+    with engine.connect() as conn:
+        goal_id = conn.execute(
+            sqlalchemy.text("SELECT id FROM goals WHERE normalized = :n"), {"n": normalized}
+        ).scalar()
+        if goal_id is None:
+            vector = embed(goal)
+            goal_id = conn.execute(
+                sqlalchemy.text(
+                    "INSERT INTO goals (normalized, display, embedding) "
+                    "VALUES (:n, :d, CAST(:v AS vector)) "
+                    "ON CONFLICT (normalized) DO UPDATE SET normalized = EXCLUDED.normalized "
+                    "RETURNING id"
+                ),
+                {"n": normalized, "d": goal, "v": str(vector)},
+            ).scalar()
+            conn.commit()
+    with _lock:
+        _remember(_ids, normalized, int(goal_id))
+    return int(goal_id)
+
+
+def similar_goal_ids(engine, goal_id: int, k: int = GOAL_EXPANSION_K,
+                     max_distance: float = GOAL_MAX_DISTANCE) -> List[int]:
+    """目前目標加上最多 k 個向量相近的已註冊目標（目前目標永遠排第一）"""
+    now = time.time()
+    with _lock:
+        cached = _expansions.get(goal_id)
+        if cached and cached[0] > now:
+            _expansions.move_to_end(goal_id)
+            return cached[1]
+    ids = [goal_id]
+    if k > 0:
+        with engine.connect() as conn:
+            rows = conn.execute(
+                sqlalchemy.text(
+                    "SELECT g.id FROM goals g, goals cur "
+                    "WHERE cur.id = :gid AND g.id <> cur.id "
+                    "  AND cur.embedding IS NOT NULL AND g.embedding IS NOT NULL "
+                    "  AND g.embedding <=> cur.embedding <= :maxd "
+                    "ORDER BY g.embedding <=> cur.embedding "
+                    "LIMIT :k"
+                ),
+                {"gid": goal_id, "k": k, "maxd": max_distance},
+            ).fetchall()
+        ids.extend(int(r[0]) for r in rows)
+    with _lock:
+        _remember(_expansions, goal_id, (now + GOAL_EXPANSION_TTL, ids))
+    return ids
+
+
+def backfill(engine, embed: Callable[[str], List[float]]) -> int:
+    """為既有資料列註冊目標並補上 goal_id"""
+    updated = 0
+    with engine.connect() as conn:
+        goals = [r[0] for r in conn.execute(sqlalchemy.text(
+            "SELECT DISTINCT goal FROM conversations WHERE goal_id IS NULL AND goal IS NOT NULL "
+            "UNION SELECT DISTINCT goal FROM conversations_archive WHERE goal_id IS NULL AND goal IS NOT NULL"
+        ))]
+    for goal in goals:
+        goal_id = get_goal_id(engine, goal, embed)
+        with engine.connect() as conn:
+            for table in ("conversations", "conversations_archive"):
+                updated += conn.execute(
+                    sqlalchemy.text(f"UPDATE {table} SET goal_id = :gid WHERE goal = :g AND goal_id IS NULL"),
+                    {"gid": goal_id, "g": goal},
+                ).rowcount or 0
+            conn.commit()
+        print(f"[GOAL_REGISTRY] {goal!r} -> {goal_id}")
+    return updated
+
+
+if __name__ == "__main__":
+    import sys
+    from main import get_db_engine, get_embedding
+
+    if "--backfill" in sys.argv:
+        print(f"Updated {backfill(get_db_engine(), get_embedding)} rows")
+    else:
+        print(__doc__)
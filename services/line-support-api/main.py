@@ -8,17 +8,32 @@ import vertexai
 from vertexai.generative_models import GenerativeModel
 from vertexai.generative_models import Part
 from vertexai.language_models import TextEmbeddingInput, TextEmbeddingModel
-from googleapiclient.discovery import build
 from vertexai.generative_models import GenerationConfig
 from typing import Any, Dict, List, Optional, Tuple
 import re, unicodedata
+import time
+import goal_registry
+import retention
+import screen_store
+from search import ENABLE_SEARCH, parse_batch_request, search_line_help, search_many
 
 app = Flask(__name__)
 
 # -----------------------------
 # Feature toggles / globals
 # -----------------------------
-ENABLE_SEARCH = os.environ.get('ENABLE_SEARCH', 'true').lower() == 'true'
+# 向量檢索精度：vector（全精度，預設）、halfvec（半精度）、binary（二值化粗篩 + 全精度重排序）
+# 量化索引由 migrations/001_embedding_quantization.sql 建立
+EMBEDDING_STORAGE = os.environ.get('EMBEDDING_STORAGE', 'vector').lower()
+EMBEDDING_DIM = 768  # text-embedding-005
+EMBEDDING_RESCORE_FACTOR = int(os.environ.get('EMBEDDING_RESCORE_FACTOR', '8'))
+# HNSW 只回傳 ef_search 個候選，goal_id / created_at 過濾在之後才套用；iterative_scan 需要 pgvector >= 0.8（舊版設為 off）
+HNSW_EF_SEARCH = int(os.environ.get('HNSW_EF_SEARCH', '100'))
+HNSW_ITERATIVE_SCAN = os.environ.get('HNSW_ITERATIVE_SCAN', 'relaxed_order').lower()
+
+# RAG / 上一筆查詢只看最近 HOT_DAYS 天的分區（更舊的資料由 retention.py 搬到封存表）
+HOT_DAYS = int(os.environ.get('HOT_DAYS', os.environ.get('ARCHIVE_AFTER_DAYS', '30')))
+MAINTENANCE_TOKEN = os.environ.get('MAINTENANCE_TOKEN')
 
 connector = None
 engine = None
@@ -128,97 +143,124 @@ def get_embedding(text: str):
     return embedding[0].values
 
 
-def get_similar_conversations(query_vector, goal):
-    engine_local = get_db_engine()
-    with engine_local.connect() as conn:
-        query = sqlalchemy.text(
-            "SELECT user_input, ai_response,screen_info "
+def similar_conversations_query(storage: str = None, k: int = 5, include_archive: bool = False) -> Tuple[sqlalchemy.TextClause, Dict[str, Any]]:
+    """依 EMBEDDING_STORAGE 產生 RAG 檢索 SQL；運算式需與 migration 的索引一致才會走索引。
+    預設只查熱分區（HOT_DAYS 內），include_archive=True 時另外合併封存表的結果。"""
+    storage = (storage or EMBEDDING_STORAGE).lower()
+    dim = EMBEDDING_DIM
+    params: Dict[str, Any] = {"k": k, "hot_days": HOT_DAYS}
+    hot_filter = "WHERE goal_id = ANY(:goal_ids) AND created_at >= now() - make_interval(days => :hot_days) "
+    if storage == "halfvec":
+        hot_sql = (
+            f"SELECT user_input, ai_response, screen_info, screen_key, "
+            f"  user_input_vector::halfvec({dim}) <-> CAST(:vec AS halfvec({dim})) AS dist "
+            "FROM conversations "
+            f"{hot_filter}"
+            "ORDER BY dist LIMIT :k"
+        )
+    elif storage == "binary":
+        # 先用 Hamming 距離取 k * factor 個候選，再以全精度距離重排序
+        params["candidates"] = k * max(1, EMBEDDING_RESCORE_FACTOR)
+        hot_sql = (
+            "SELECT user_input, ai_response, screen_info, screen_key, user_input_vector <-> CAST(:vec AS vector) AS dist FROM ("
+            "  SELECT user_input, ai_response, screen_info, screen_key, user_input_vector "
+            "  FROM conversations "
+            f"  {hot_filter}"
+            f"  ORDER BY binary_quantize(user_input_vector)::bit({dim}) <~> binary_quantize(CAST(:vec AS vector)) "
+            "  LIMIT :candidates"
+            ") AS candidates "
+            "ORDER BY dist LIMIT :k"
+        )
+    else:
+        hot_sql = (
+            "SELECT user_input, ai_response, screen_info, screen_key, user_input_vector <-> CAST(:vec AS vector) AS dist "
             "FROM conversations "
-            "WHERE goal = :goal_val "
-            "ORDER BY user_input_vector <-> CAST(:vec AS vector) LIMIT 5"
+            f"{hot_filter}"
+            "ORDER BY dist LIMIT :k"
         )
-        result = list(conn.execute(query, {"vec": str(query_vector), "goal_val": goal}))
-        return result
+    if include_archive:
+        archive_sql = (
+            f"SELECT user_input, ai_response, screen_info, screen_key, user_input_vector <-> CAST(:vec AS halfvec({dim})) AS dist "
+            "FROM conversations_archive "
+            "WHERE goal_id = ANY(:goal_ids) "
+            "ORDER BY dist LIMIT :k"
+        )
+        hot_sql = f"({hot_sql}) UNION ALL ({archive_sql})"
+    sql = f"SELECT user_input, ai_response, screen_info, screen_key FROM ({hot_sql}) AS ranked ORDER BY dist LIMIT :k"
+    return sqlalchemy.text(sql), params
+
 
+def set_hnsw_scan(conn):
+    """只在目前交易內（SET LOCAL）放寬 HNSW 掃描，讓過濾後仍能湊滿 k 筆；
+    relaxed_order 的順序由外層 ORDER BY dist 重新排序"""
+    conn.execute(sqlalchemy.text("SELECT set_config('hnsw.ef_search', :v, true)"), {"v": str(HNSW_EF_SEARCH)})
+    if HNSW_ITERATIVE_SCAN != 'off':
+        conn.execute(sqlalchemy.text("SELECT set_config('hnsw.iterative_scan', :v, true)"), {"v": HNSW_ITERATIVE_SCAN})
 
-def get_last_conversation(goal, id_window: int = 10):
+
+def get_similar_conversations(query_vector, goal_ids: List[int], storage: str = None, k: int = 5, include_archive: bool = False):
+    """goal_ids：目前目標的 id 與相近目標（goal_registry.similar_goal_ids）"""
     engine_local = get_db_engine()
+    query, params = similar_conversations_query(storage, k, include_archive)
     with engine_local.connect() as conn:
-        max_id_row = conn.execute(sqlalchemy.text("SELECT COALESCE(MAX(id), 0) FROM conversations")).scalar()
+        set_hnsw_scan(conn)
+        rows = conn.execute(query, {**params, "vec": str(query_vector), "goal_ids": list(goal_ids)}).fetchall()
+    # screen_info 只有在組 prompt 時才會從 screen_payloads 載入並解壓縮（k 筆一次查詢）
+    screens = screen_store.lazy_screens(engine_local, [(key, inline) for _, _, inline, key in rows])
+    return [(u, a, screen) for (u, a, _, _), screen in zip(rows, screens)]
+
+
+def get_last_conversation(goal_id: int, id_window: int = 10):
+    engine_local = get_db_engine()
+    with engine_local.connect() as conn:
+        # 只看熱分區，MAX(id) 不會掃到舊月份
+        max_id_row = conn.execute(
+            sqlalchemy.text(
+                "SELECT COALESCE(MAX(id), 0) FROM conversations "
+                "WHERE created_at >= now() - make_interval(days => :hot_days)"
+            ),
+            {"hot_days": HOT_DAYS},
+        ).scalar()
         lower_bound_id = max(0, (max_id_row or 0) - id_window)
 
         q_same_goal = sqlalchemy.text(
-            "SELECT user_input, ai_response, screen_info "
+            "SELECT user_input, ai_response, screen_info, screen_key "
             "FROM conversations "
-            "WHERE goal = :goal_val "
+            "WHERE goal_id = :goal_id "
             "  AND id >= :lower_id "
+            "  AND created_at >= now() - make_interval(days => :hot_days) "
             "ORDER BY id DESC "
             "LIMIT 1"
         )
-        row = conn.execute(q_same_goal, {"goal_val": goal, "lower_id": lower_bound_id}).fetchone()
-        if row:
-            return row
-        return None
+        row = conn.execute(
+            q_same_goal, {"goal_id": goal_id, "lower_id": lower_bound_id, "hot_days": HOT_DAYS}
+        ).fetchone()
+    if row:
+        return row[0], row[1], screen_store.LazyScreen(engine_local, row[3], row[2])
+    return None
 
 
-def insert_conversation(user_message, user_vector, ai_response, screen_info, goal):
+def insert_conversation(user_message, user_vector, ai_response, screen_info, goal, goal_id: Optional[int] = None):
     engine_local = get_db_engine()
     with engine_local.connect() as conn:
+        screen_key = screen_store.put(conn, screen_info)
         conn.execute(
             sqlalchemy.text(
-                "INSERT INTO conversations (user_input, user_input_vector, ai_response, screen_info, goal) "
-                "VALUES (:u, :v, :a, :s, :g)"
+                "INSERT INTO conversations (user_input, user_input_vector, ai_response, screen_key, goal, goal_id) "
+                "VALUES (:u, :v, :a, :sk, :g, :gid)"
             ),
             {
                 "u": user_message,
                 "v": str(user_vector),
                 "a": ai_response,
-                "s": json.dumps(screen_info, ensure_ascii=False) if isinstance(screen_info, (dict, list)) else str(screen_info or ""),
+                "sk": screen_key,
                 "g": goal,
+                "gid": goal_id,
             },
         )
         conn.commit()
 
 
-# -----------------------------
-# External search (optional)
-# -----------------------------
-def search_line_help(query, num_results=5):
-    """Search LINE help documentation using Custom Search API"""
-    if not ENABLE_SEARCH:
-        return []
-
-    API_KEY = os.environ.get("GOOGLE_SEARCH_API_KEY")
-    SEARCH_ENGINE_ID = os.environ.get("GOOGLE_CSE_ID", "44e73185ae7344428")
-    if not API_KEY:
-        print("Warning: GOOGLE_SEARCH_API_KEY not found in environment variables")
-        return []
-
-    try:
-        service = build("customsearch", "v1", developerKey=API_KEY)
-        result = (
-            service.cse()
-            .list(q=query, cx=SEARCH_ENGINE_ID, num=num_results, hl="zh-TW")
-            .execute()
-        )
-
-        search_results = []
-        for item in result.get("items", []):
-            search_results.append(
-                {
-                    "title": item.get("title"),
-                    "link": item.get("link"),
-                    "snippet": item.get("snippet"),
-                    "displayLink": item.get("displayLink"),
-                }
-            )
-
-        return search_results
-    except Exception as e:
-        print(f"Search error: {e}")
-        return []
-
-
 # -----------------------------
 # Flask routes
 # -----------------------------
@@ -264,14 +306,17 @@ def handle_app_request():
 
         # Embedding & RAG
         user_vector = get_embedding(user_message)
-        similar_conversations = get_similar_conversations(user_vector, current_goal)
+        goal_id = goal_registry.get_goal_id(get_db_engine(), current_goal, get_embedding)
+        similar_conversations = get_similar_conversations(
+            user_vector, goal_registry.similar_goal_ids(get_db_engine(), goal_id)
+        )
         rag_context = ""
         if similar_conversations:
             rag_context = "以下是相關的歷史對話，請參考：\n\n"
             for user_text, ai_text, hist_screen_info in similar_conversations:
                 rag_context += f"使用者: {user_text}\nGemini: {ai_text}\nscreen_info:{hist_screen_info}\n\n"
 
-        last_row = get_last_conversation(current_goal, id_window=10)
+        last_row = get_last_conversation(goal_id, id_window=10)
         last_conversation = ""
         if last_row:
             last_user, last_ai, last_screen = last_row
@@ -279,7 +324,7 @@ def handle_app_request():
                 last_screen_pretty = json.dumps(
                     last_screen
                     if isinstance(last_screen, (dict, list))
-                    else json.loads(last_screen),
+                    else json.loads(str(last_screen)),
                     ensure_ascii=False,
                     indent=2,
                 )
@@ -456,6 +501,7 @@ def handle_app_request():
             ai_response_str,
             screen_info if screen_info is not None else "IMAGE_UPLOADED",
             current_goal,
+            goal_id,
         )
 
         # === 回傳給 App：文字 + 座標 ===
@@ -498,13 +544,42 @@ def search_endpoint():
 
     try:
         request_json = request.get_json(silent=True)
-        if not request_json or 'query' not in request_json:
+        if not request_json or ('query' not in request_json and 'queries' not in request_json):
             return (
                 json.dumps({"status": "error", "message": "Missing query parameter"}),
                 400,
                 {"Content-Type": "application/json"},
             )
 
+        # 批次模式：{"queries": [...]}，去重後並行查詢
+        if 'queries' in request_json:
+            try:
+                queries, num_results = parse_batch_request(request_json)
+            except ValueError as e:
+                return (
+                    json.dumps({"status": "error", "message": str(e)}),
+                    400,
+                    {"Content-Type": "application/json"},
+                )
+            start = time.perf_counter()
+            items = search_many(queries, num_results)
+            return (
+                json.dumps(
+                    {
+                        'status': 'success',
+                        'requested': len(queries),
+                        'unique': len(items),
+                        'cached': sum(1 for item in items if item['cached']),
+                        'elapsed_ms': round((time.perf_counter() - start) * 1000, 2),
+                        'results': items,
+                        'search_enabled': ENABLE_SEARCH,
+                    },
+                    ensure_ascii=False,
+                ),
+                200,
+                {"Content-Type": "application/json"},
+            )
+
         query = request_json['query']
         results = search_line_help(query)
 
@@ -531,6 +606,49 @@ def search_endpoint():
         )
 
 
+@app.route('/stats/screens', methods=['GET'])
+def screen_stats_endpoint():
+    """Storage and read-bandwidth numbers for deduplicated screen payloads"""
+    try:
+        include_db = request.args.get('db', 'true').lower() == 'true'
+        result = screen_store.stats(get_db_engine() if include_db else None)
+        return (
+            json.dumps({"status": "success", **result}, ensure_ascii=False),
+            200,
+            {"Content-Type": "application/json"},
+        )
+    except Exception as e:
+        return (
+            json.dumps({'status': 'error', 'message': str(e)}),
+            500,
+            {"Content-Type": "application/json"},
+        )
+
+
+@app.route('/maintenance/retention', methods=['POST'])
+def retention_endpoint():
+    """Run partition upkeep, health-check purge and archive compaction (Cloud Scheduler)"""
+    if not MAINTENANCE_TOKEN or request.headers.get('X-Maintenance-Token') != MAINTENANCE_TOKEN:
+        return (
+            json.dumps({"status": "error", "message": "Forbidden"}),
+            403,
+            {"Content-Type": "application/json"},
+        )
+    try:
+        result = retention.run_retention(get_db_engine())
+        return (
+            json.dumps({"status": "success", **result}, ensure_ascii=False),
+            200,
+            {"Content-Type": "application/json"},
+        )
+    except Exception as e:
+        return (
+            json.dumps({'status': 'error', 'message': str(e)}),
+            500,
+            {"Content-Type": "application/json"},
+        )
+
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8080))
     app.run(host='0.0.0.0', port=port)
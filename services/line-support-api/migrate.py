@@ -0,0 +1,129 @@
+# migrate.py
+"""Apply the SQL files in migrations/ in order (each one only once).
+
+Usage:
+    python migrate.py            # apply pending migrations
+    python migrate.py --list     # show applied / pending migrations
+"""
+import os
+import re
+import sys
+import sqlalchemy
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+
+def list_migrations():
+    return sorted(f for f in os.listdir(MIGRATIONS_DIR) if f.endswith(".sql"))
+
+
+def applied_migrations(conn):
+    conn.execute(sqlalchemy.text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "  name TEXT PRIMARY KEY,"
+        "  applied_at TIMESTAMPTZ NOT NULL DEFAULT now()"
+        ")"
+    ))
+    conn.commit()
+    return {row[0] for row in conn.execute(sqlalchemy.text("SELECT name FROM schema_migrations"))}
+
+
+def apply_migration(conn, name):
+    with open(os.path.join(MIGRATIONS_DIR, name), "r", encoding="utf-8") as f:
+        sql = f.read()
+    # pg8000 不支援一次送多個語句，逐句執行
+    for statement in _split_statements(sql):
+        conn.exec_driver_sql(statement)
+    conn.execute(sqlalchemy.text("INSERT INTO schema_migrations (name) VALUES (:n)"), {"n": name})
+    conn.commit()
+
+
+_DOLLAR_TAG_RE = re.compile(r"\$(?:[A-Za-z_][A-Za-z0-9_]*)?\$")
+
+
+def _split_statements(sql):
+    """Split on top-level ';'. Quoted strings/identifiers, $tag$ bodies and
+    '--' / '/* */' comments are scanned as whole tokens; comments are dropped."""
+    statements, buf = [], []
+    i, n = 0, len(sql)
+    while i < n:
+        ch = sql[i]
+        if sql.startswith("--", i):
+            end = sql.find("\n", i)
+            i = n if end < 0 else end
+            continue
+        if sql.startswith("/*", i):
+            # 區塊註解可巢狀
+            depth, i = 1, i + 2
+            while i < n and depth:
+                if sql.startswith("/*", i):
+                    depth, i = depth + 1, i + 2
+                elif sql.startswith("*/", i):
+                    depth, i = depth - 1, i + 2
+                else:
+                    i += 1
+            buf.append(" ")
+            continue
+        if ch in ("'", '"'):
+            # 引號內以連續兩個引號跳脫；E'...' 另外允許反斜線跳脫
+            backslash = ch == "'" and i > 0 and sql[i - 1] in "Ee"
+            end = i + 1
+            while end < n:
+                if backslash and sql[end] == "\\":
+                    end += 2
+                    continue
+                if sql[end] == ch:
+                    if end + 1 < n and sql[end + 1] == ch:
+                        end += 2
+                        continue
+                    break
+                end += 1
+            buf.append(sql[i:end + 1])
+            i = end + 1
+            continue
+        if ch == "$":
+            m = _DOLLAR_TAG_RE.match(sql, i)
+            if m and not (i and (sql[i - 1].isalnum() or sql[i - 1] == "_")):
+                tag = m.group(0)
+                end = sql.find(tag, m.end())
+                end = n if end < 0 else end + len(tag)
+                buf.append(sql[i:end])
+                i = end
+                continue
+        if ch == ";":
+            statement = "".join(buf).strip()
+            if statement:
+                statements.append(statement)
+            buf = []
+            i += 1
+            continue
+        buf.append(ch)
+        i += 1
+    statement = "".join(buf).strip()
+    if statement:
+        statements.append(statement)
+    return statements
+
+
+def main(argv):
+    from main import get_db_engine
+    engine = get_db_engine()
+    with engine.connect() as conn:
+        done = applied_migrations(conn)
+        pending = [m for m in list_migrations() if m not in done]
+        if "--list" in argv:
+            for m in list_migrations():
+                print(f"{'[x]' if m in done else '[ ]'} {m}")
+            return 0
+        if not pending:
+            print("No pending migrations")
+            return 0
+        for name in pending:
+            print(f"Applying {name} ...")
+            apply_migration(conn, name)
+        print(f"Applied {len(pending)} migration(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,12 @@
+-- 001: 量化向量索引（halfvec / binary），供 EMBEDDING_STORAGE=halfvec|binary 使用
+-- 需要 pgvector >= 0.7.0；索引以運算式建立，既有資料列不需回填。
+-- 欄位刻意維持 vector(768)：vector 模式與 binary 模式的重排序都需要全精度向量，只有封存表改存 halfvec。
+CREATE EXTENSION IF NOT EXISTS vector;
+
+CREATE INDEX IF NOT EXISTS conversations_vec_half_hnsw
+    ON conversations
+    USING hnsw ((user_input_vector::halfvec(768)) halfvec_l2_ops);
+
+CREATE INDEX IF NOT EXISTS conversations_vec_bin_hnsw
+    ON conversations
+    USING hnsw ((binary_quantize(user_input_vector)::bit(768)) bit_hamming_ops);
@@ -0,0 +1,100 @@
+-- 002: conversations 改為依 created_at 每月分區，並建立壓縮封存表 conversations_archive
+-- 舊資料若有 created_at 則保留原值，沒有（或為 NULL）的記為 migration 當下，保留期滿後由 retention 封存。
+ALTER TABLE conversations RENAME TO conversations_legacy;
+-- 001 的索引名稱仍掛在舊表上，不先移除的話下方的 CREATE INDEX IF NOT EXISTS 會被略過，舊表刪除後新表就沒有量化索引
+DROP INDEX IF EXISTS conversations_vec_half_hnsw;
+DROP INDEX IF EXISTS conversations_vec_bin_hnsw;
+
+CREATE TABLE conversations (
+    id BIGSERIAL,
+    user_input TEXT,
+    user_input_vector vector(768),
+    ai_response TEXT,
+    screen_info TEXT,
+    goal TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE conversations_default PARTITION OF conversations DEFAULT;
+
+-- 建立從 start_month 起 months_ahead 個月份的分區（已存在則略過）
+CREATE OR REPLACE FUNCTION ensure_conversation_partitions(months_ahead INT DEFAULT 2, start_month DATE DEFAULT now()::date)
+RETURNS INT AS $$
+DECLARE
+    month_start DATE;
+    part_name TEXT;
+    created INT := 0;
+BEGIN
+    FOR i IN 0..months_ahead LOOP
+        month_start := (date_trunc('month', start_month) + make_interval(months => i))::date;
+        part_name := format('conversations_y%sm%s', to_char(month_start, 'YYYY'), to_char(month_start, 'MM'));
+        IF to_regclass(part_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF conversations FOR VALUES FROM (%L) TO (%L)',
+                part_name, month_start, (month_start + interval '1 month')::date
+            );
+            created := created + 1;
+        END IF;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT ensure_conversation_partitions(2);
+
+-- 搬移後筆數不符就中止整個 migration，舊表不會被刪除
+DO $$
+DECLARE
+    created_expr TEXT := 'now()';
+    expected BIGINT;
+    copied BIGINT;
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'conversations_legacy' AND column_name = 'created_at'
+    ) THEN
+        created_expr := 'COALESCE(created_at, now())';
+    END IF;
+    EXECUTE format(
+        'INSERT INTO conversations (id, user_input, user_input_vector, ai_response, screen_info, goal, created_at) '
+        'SELECT id, user_input, user_input_vector, ai_response, screen_info, goal, %s FROM conversations_legacy',
+        created_expr
+    );
+    GET DIAGNOSTICS copied = ROW_COUNT;
+    SELECT count(*) INTO expected FROM conversations_legacy;
+    IF copied <> expected THEN
+        RAISE EXCEPTION 'conversations_legacy has % rows but % were copied', expected, copied;
+    END IF;
+END;
+$$;
+
+SELECT setval(pg_get_serial_sequence('conversations', 'id'), COALESCE((SELECT MAX(id) FROM conversations), 0) + 1, false);
+
+DROP TABLE conversations_legacy;
+
+CREATE INDEX IF NOT EXISTS conversations_goal_created_idx ON conversations (goal, created_at DESC);
+
+CREATE INDEX IF NOT EXISTS conversations_vec_half_hnsw
+    ON conversations
+    USING hnsw ((user_input_vector::halfvec(768)) halfvec_l2_ops);
+
+CREATE INDEX IF NOT EXISTS conversations_vec_bin_hnsw
+    ON conversations
+    USING hnsw ((binary_quantize(user_input_vector)::bit(768)) bit_hamming_ops);
+
+-- 封存表：向量以 halfvec 保存，screen_info 以 lz4 壓縮並優先存在主表頁面內
+CREATE TABLE IF NOT EXISTS conversations_archive (
+    id BIGINT PRIMARY KEY,
+    user_input TEXT,
+    user_input_vector halfvec(768),
+    ai_response TEXT,
+    screen_info TEXT COMPRESSION lz4,
+    goal TEXT,
+    created_at TIMESTAMPTZ NOT NULL,
+    archived_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+ALTER TABLE conversations_archive ALTER COLUMN screen_info SET STORAGE MAIN;
+
+CREATE INDEX IF NOT EXISTS conversations_archive_goal_created_idx
+    ON conversations_archive (goal, created_at DESC);
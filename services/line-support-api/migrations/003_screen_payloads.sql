@@ -0,0 +1,18 @@
+-- 003: screen_info 改存到以內容雜湊為鍵的壓縮側表 screen_payloads，conversations 只存 screen_key
+-- 既有資料列的 screen_info 仍可讀取；執行 `python screen_store.py --backfill` 可搬移舊資料。
+CREATE TABLE IF NOT EXISTS screen_payloads (
+    key TEXT PRIMARY KEY,                -- sha256(正規化後的 screen_info UTF-8 文字)
+    codec TEXT NOT NULL DEFAULT 'zlib',
+    data BYTEA NOT NULL,
+    raw_bytes INT NOT NULL,
+    stored_bytes INT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+-- 內容已壓縮，避免 TOAST 再壓一次
+ALTER TABLE screen_payloads ALTER COLUMN data SET STORAGE EXTERNAL;
+
+ALTER TABLE conversations ADD COLUMN IF NOT EXISTS screen_key TEXT;
+ALTER TABLE conversations_archive ADD COLUMN IF NOT EXISTS screen_key TEXT;
+
+CREATE INDEX IF NOT EXISTS conversations_screen_key_idx ON conversations (screen_key);
+CREATE INDEX IF NOT EXISTS conversations_archive_screen_key_idx ON conversations_archive (screen_key);
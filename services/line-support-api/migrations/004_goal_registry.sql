@@ -0,0 +1,17 @@
+-- 004: 目標註冊表。正規化後的目標對應到整數 id 並保存目標向量，RAG 以 goal_id 過濾並擴充到相近目標
+-- 既有資料列的 goal_id 由 `python goal_registry.py --backfill` 補上。
+CREATE TABLE IF NOT EXISTS goals (
+    id SERIAL PRIMARY KEY,
+    normalized TEXT NOT NULL UNIQUE,
+    display TEXT NOT NULL,
+    embedding vector(768),
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS goals_embedding_hnsw ON goals USING hnsw (embedding vector_cosine_ops);
+
+ALTER TABLE conversations ADD COLUMN IF NOT EXISTS goal_id INT;
+ALTER TABLE conversations_archive ADD COLUMN IF NOT EXISTS goal_id INT;
+
+CREATE INDEX IF NOT EXISTS conversations_goal_id_created_idx ON conversations (goal_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS conversations_archive_goal_id_idx ON conversations_archive (goal_id);
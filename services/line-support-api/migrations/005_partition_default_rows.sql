@@ -0,0 +1,57 @@
+-- 005: DEFAULT 分區已有某月份資料時，直接 CREATE TABLE ... PARTITION OF 會失敗。
+-- ensure_conversation_partitions 改為先建立獨立表、把該月資料從 DEFAULT 搬過去，再 ATTACH 成分區；
+-- 並為 DEFAULT 分區中既有的資料（例如 002 保留下來的舊 created_at）補建月份分區。
+CREATE OR REPLACE FUNCTION ensure_conversation_partitions(months_ahead INT DEFAULT 2, start_month DATE DEFAULT now()::date)
+RETURNS INT AS $$
+DECLARE
+    month_start DATE;
+    month_end DATE;
+    part_name TEXT;
+    moved BIGINT;
+    created INT := 0;
+BEGIN
+    FOR i IN 0..months_ahead LOOP
+        month_start := (date_trunc('month', start_month) + make_interval(months => i))::date;
+        month_end := (month_start + interval '1 month')::date;
+        part_name := format('conversations_y%sm%s', to_char(month_start, 'YYYY'), to_char(month_start, 'MM'));
+        IF to_regclass(part_name) IS NOT NULL THEN
+            CONTINUE;
+        END IF;
+        IF EXISTS (SELECT 1 FROM conversations_default WHERE created_at >= month_start AND created_at < month_end) THEN
+            EXECUTE format(
+                'CREATE TABLE %I (LIKE conversations INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE)',
+                part_name
+            );
+            EXECUTE format(
+                'WITH moved AS ('
+                '  DELETE FROM conversations_default WHERE created_at >= %L AND created_at < %L RETURNING *'
+                ') INSERT INTO %I SELECT * FROM moved',
+                month_start, month_end, part_name
+            );
+            GET DIAGNOSTICS moved = ROW_COUNT;
+            EXECUTE format(
+                'ALTER TABLE conversations ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                part_name, month_start, month_end
+            );
+            RAISE NOTICE 'moved % rows from conversations_default into %', moved, part_name;
+        ELSE
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF conversations FOR VALUES FROM (%L) TO (%L)',
+                part_name, month_start, month_end
+            );
+        END IF;
+        created := created + 1;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    month_start DATE;
+BEGIN
+    FOR month_start IN SELECT DISTINCT date_trunc('month', created_at)::date FROM conversations_default LOOP
+        PERFORM ensure_conversation_partitions(0, month_start);
+    END LOOP;
+END;
+$$;
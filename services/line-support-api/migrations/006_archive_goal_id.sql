@@ -0,0 +1,6 @@
+-- 006: retention 之前封存時沒有帶上 goal_id，封存表的這些資料列在 include_archive 檢索時永遠不會命中。
+-- 以目標的顯示文字對回 goals；其他寫法的目標由 `python goal_registry.py --backfill` 補上（同樣涵蓋封存表）。
+UPDATE conversations_archive a
+SET goal_id = g.id
+FROM goals g
+WHERE a.goal_id IS NULL AND a.goal IS NOT NULL AND g.display = a.goal;
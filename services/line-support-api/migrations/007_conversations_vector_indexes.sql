@@ -0,0 +1,9 @@
+-- 007: 已套用舊版 002 的資料庫，分區後的 conversations 沒有 halfvec / binary HNSW 索引（名稱當時仍被舊表佔用）。
+-- 新建的資料庫在 002 就已建立，這裡不會重複建立。
+CREATE INDEX IF NOT EXISTS conversations_vec_half_hnsw
+    ON conversations
+    USING hnsw ((user_input_vector::halfvec(768)) halfvec_l2_ops);
+
+CREATE INDEX IF NOT EXISTS conversations_vec_bin_hnsw
+    ON conversations
+    USING hnsw ((binary_quantize(user_input_vector)::bit(768)) bit_hamming_ops);
@@ -0,0 +1,135 @@
+# retention.py
+"""Retention for the conversations table.
+
+- Keeps monthly partitions created ahead of time.
+- Moves rows older than ARCHIVE_AFTER_DAYS into conversations_archive.
+- Purges health-check / system-test rows after PURGE_AFTER_HOURS.
+- Drops monthly partitions that lie entirely before the archive cutoff.
+- Deletes screen_payloads no longer referenced by any row.
+
+Run directly (`python retention.py`) or via POST /maintenance/retention.
+"""
+import os
+import re
+import sqlalchemy
+
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', '30'))
+PURGE_AFTER_HOURS = int(os.environ.get('PURGE_AFTER_HOURS', '24'))
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', '1000'))
+PARTITIONS_AHEAD = int(os.environ.get('PARTITIONS_AHEAD', '2'))
+
+# status-monitor 的健康檢查探針寫入的目標
+PURGE_GOALS = [g.strip() for g in os.environ.get('PURGE_GOALS', '系統測試').split(',') if g.strip()]
+
+_PARTITION_RE = re.compile(r"^conversations_y(\d{4})m(\d{2})$")
+
+
+def ensure_partitions(conn, months_ahead: int = PARTITIONS_AHEAD) -> int:
+    return int(conn.execute(
+        sqlalchemy.text("SELECT ensure_conversation_partitions(:m)"), {"m": months_ahead}
+    ).scalar() or 0)
+
+
+def purge_health_checks(conn, hours: int = PURGE_AFTER_HOURS) -> int:
+    if not PURGE_GOALS:
+        return 0
+    params = {"goals": PURGE_GOALS, "hours": hours}
+    purged = 0
+    for table in ("conversations", "conversations_archive"):
+        purged += conn.execute(sqlalchemy.text(
+            f"DELETE FROM {table} "
+            "WHERE goal = ANY(:goals) AND created_at < now() - make_interval(hours => :hours)"
+        ), params).rowcount or 0
+    return purged
+
+
+def archive_old_rows(conn, days: int = ARCHIVE_AFTER_DAYS, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """分批把超過保留天數的資料搬到封存表（同一語句內 DELETE ... RETURNING 再 INSERT）。
+    id 衝突時整批失敗並回滾，不會刪掉沒寫進封存表的資料。"""
+    stmt = sqlalchemy.text(
+        "WITH moved AS ("
+        "  DELETE FROM conversations "
+        "  WHERE (id, created_at) IN ("
+        "    SELECT id, created_at FROM conversations "
+        "    WHERE created_at < now() - make_interval(days => :days) "
+        "    LIMIT :batch"
+        "  ) "
+        "  RETURNING id, user_input, user_input_vector, ai_response, screen_info, screen_key, goal, goal_id, created_at"
+        ") "
+        "INSERT INTO conversations_archive "
+        "  (id, user_input, user_input_vector, ai_response, screen_info, screen_key, goal, goal_id, created_at) "
+        "SELECT id, user_input, user_input_vector::halfvec(768), ai_response, screen_info, screen_key, goal, goal_id, created_at "
+        "FROM moved"
+    )
+    total = 0
+    while True:
+        moved = conn.execute(stmt, {"days": days, "batch": batch_size}).rowcount or 0
+        conn.commit()
+        total += moved
+        if moved < batch_size:
+            return total
+
+
+def purge_orphan_screens(conn, hours: int = PURGE_AFTER_HOURS) -> int:
+    """刪除已沒有任何資料列引用的 screen_payloads（保留最近寫入的，避免與進行中的 insert 競爭；
+    重複寫入也會更新 created_at，見 screen_store.put）"""
+    return conn.execute(sqlalchemy.text(
+        "DELETE FROM screen_payloads p "
+        "WHERE p.created_at < now() - make_interval(hours => :hours) "
+        "  AND NOT EXISTS (SELECT 1 FROM conversations c WHERE c.screen_key = p.key) "
+        "  AND NOT EXISTS (SELECT 1 FROM conversations_archive a WHERE a.screen_key = p.key)"
+    ), {"hours": hours}).rowcount or 0
+
+
+def drop_expired_partitions(conn, days: int = ARCHIVE_AFTER_DAYS) -> list:
+    """刪除整個月份都早於封存界線、且已清空的分區"""
+    cutoff = conn.execute(
+        sqlalchemy.text("SELECT (now() - make_interval(days => :days))::date"), {"days": days}
+    ).scalar()
+    rows = conn.execute(sqlalchemy.text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'conversations'::regclass"
+    )).fetchall()
+    dropped = []
+    for (name,) in rows:
+        m = _PARTITION_RE.match(name)
+        if not m:
+            continue
+        year, month = int(m.group(1)), int(m.group(2))
+        next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+        if (next_year, next_month) > (cutoff.year, cutoff.month):
+            continue
+        has_rows = conn.execute(sqlalchemy.text(f'SELECT EXISTS (SELECT 1 FROM "{name}")')).scalar()
+        if has_rows:
+            continue
+        conn.execute(sqlalchemy.text(f'DROP TABLE "{name}"'))
+        dropped.append(name)
+    return dropped
+
+
+def run_retention(engine) -> dict:
+    with engine.connect() as conn:
+        created = ensure_partitions(conn)
+        conn.commit()
+        purged = purge_health_checks(conn)
+        conn.commit()
+        archived = archive_old_rows(conn)
+        dropped = drop_expired_partitions(conn)
+        conn.commit()
+        orphans = purge_orphan_screens(conn)
+        conn.commit()
+    result = {
+        "partitions_created": created,
+        "health_checks_purged": purged,
+        "rows_archived": archived,
+        "partitions_dropped": dropped,
+        "screen_payloads_purged": orphans,
+    }
+    print(f"[RETENTION] {result}")
+    return result
+
+
+if __name__ == "__main__":
+    from main import get_db_engine
+    run_retention(get_db_engine())
@@ -0,0 +1,224 @@
+# screen_store.py
+"""Content-addressed, compressed storage for conversation screen_info payloads.
+
+Consecutive steps on the same screen produce identical payloads, so each
+distinct payload is stored once in screen_payloads (zlib, keyed by sha256)
+and conversations only keep the key. Readers get a LazyScreen that is only
+fetched and decompressed when it is turned into text; screens from the same
+query (lazy_screens) are fetched together in one round-trip.
+
+Usage:
+    python screen_store.py --backfill [--batch 500]   # move inline screen_info into screen_payloads
+    python screen_store.py --stats
+"""
+import hashlib
+import json
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import sqlalchemy
+
+CODEC = "zlib"
+COMPRESS_LEVEL = 6
+CACHE_SIZE = 256
+
+# 每次擷取都會變、但對判斷畫面沒有幫助的欄位，不納入雜湊與儲存
+VOLATILE_KEYS = ("timestampMs",)
+
+_cache: "OrderedDict[str, str]" = OrderedDict()
+_lock = threading.Lock()
+_stats = {
+    "writes": 0,
+    "dedup_hits": 0,
+    "raw_bytes_written": 0,
+    "stored_bytes_written": 0,
+    "reads": 0,
+    "cache_hits": 0,
+    "compressed_bytes_read": 0,
+    "decompressed_bytes_read": 0,
+}
+
+
+def _bump(**counts):
+    with _lock:
+        for name, value in counts.items():
+            _stats[name] += value
+
+
+def normalize_screen(screen_info: Any) -> str:
+    """轉成要儲存的文字；dict 會先移除 VOLATILE_KEYS"""
+    if isinstance(screen_info, dict):
+        screen_info = {k: v for k, v in screen_info.items() if k not in VOLATILE_KEYS}
+    if isinstance(screen_info, (dict, list)):
+        return json.dumps(screen_info, ensure_ascii=False)
+    return str(screen_info or "")
+
+
+def encode(text: str) -> Tuple[str, bytes, int]:
+    raw = text.encode("utf-8")
+    return hashlib.sha256(raw).hexdigest(), zlib.compress(raw, COMPRESS_LEVEL), len(raw)
+
+
+def decode(codec: str, data: bytes) -> str:
+    if codec != CODEC:
+        raise ValueError(f"Unknown screen payload codec: {codec}")
+    return zlib.decompress(bytes(data)).decode("utf-8")
+
+
+def put(conn, screen_info: Any) -> str:
+    """寫入並回傳 key；由呼叫端 commit。
+    已存在時只更新 created_at：retention 只清除一段時間內沒被寫入的孤兒，
+    正要被新資料列引用的舊 payload 因此不會被刪掉。"""
+    key, data, raw_len = encode(normalize_screen(screen_info))
+    # xmax = 0 表示這一列是新插入的，否則是衝突後的 UPDATE
+    inserted = conn.execute(
+        sqlalchemy.text(
+            "INSERT INTO screen_payloads (key, codec, data, raw_bytes, stored_bytes) "
+            "VALUES (:k, :c, :d, :r, :s) "
+            "ON CONFLICT (key) DO UPDATE SET created_at = now() "
+            "RETURNING (xmax = 0)"
+        ),
+        {"k": key, "c": CODEC, "d": data, "r": raw_len, "s": len(data)},
+    ).scalar()
+    if inserted:
+        _bump(writes=1, raw_bytes_written=raw_len, stored_bytes_written=len(data))
+    else:
+        _bump(dedup_hits=1)
+    return key
+
+
+def load_many(engine, keys: Iterable[str]) -> Dict[str, str]:
+    """一次載入多個 key：快取中沒有的以單一查詢（key = ANY(:keys)）取回；查無的 key 不在結果中"""
+    result: Dict[str, str] = {}
+    missing: List[str] = []
+    with _lock:
+        for key in dict.fromkeys(k for k in keys if k):
+            if key in _cache:
+                _cache.move_to_end(key)
+                _stats["reads"] += 1
+                _stats["cache_hits"] += 1
+                result[key] = _cache[key]
+            else:
+                missing.append(key)
+    if not missing:
+        return result
+    with engine.connect() as conn:
+        rows = conn.execute(
+            sqlalchemy.text("SELECT key, codec, data FROM screen_payloads WHERE key = ANY(:keys)"),
+            {"keys": missing},
+        ).fetchall()
+    for key, codec, data in rows:
+        text = decode(codec, data)
+        _bump(reads=1, compressed_bytes_read=len(data), decompressed_bytes_read=len(text.encode("utf-8")))
+        result[key] = text
+        with _lock:
+            _cache[key] = text
+            _cache.move_to_end(key)
+            while len(_cache) > CACHE_SIZE:
+                _cache.popitem(last=False)
+    return result
+
+
+def load(engine, key: str) -> str:
+    return load_many(engine, [key]).get(key, "")
+
+
+class LazyScreen:
+    """screen_info 的延遲載入代理；str() 時才查詢並解壓縮。
+    由 lazy_screens() 建立的同一批代理，第一次 str() 時會一起載入。"""
+
+    __slots__ = ("key", "_engine", "_text", "_batch")
+
+    def __init__(self, engine, key: Optional[str], inline: Optional[str] = None):
+        self.key = key
+        self._engine = engine
+        self._text = inline if not key else None
+        self._batch = None
+
+    def __str__(self) -> str:
+        if self._text is None:
+            pending = [s for s in (self._batch or [self]) if s._text is None]
+            texts = load_many(self._engine, [s.key for s in pending])
+            for screen in pending:
+                screen._text = texts.get(screen.key, "")
+        return self._text
+
+    def __repr__(self) -> str:
+        return f"LazyScreen(key={self.key!r}, loaded={self._text is not None})"
+
+
+def lazy_screens(engine, entries: Iterable[Tuple[Optional[str], Optional[str]]]) -> List[LazyScreen]:
+    """(key, inline) -> LazyScreen，整批共用一次 screen_payloads 查詢"""
+    screens = [LazyScreen(engine, key, inline) for key, inline in entries]
+    for screen in screens:
+        screen._batch = screens
+    return screens
+
+
+def stats(engine=None) -> Dict[str, Any]:
+    with _lock:
+        result: Dict[str, Any] = {"process": dict(_stats), "cache_entries": len(_cache)}
+    if engine is not None:
+        with engine.connect() as conn:
+            row = conn.execute(sqlalchemy.text(
+                "SELECT COUNT(*), COALESCE(SUM(raw_bytes), 0), COALESCE(SUM(stored_bytes), 0) FROM screen_payloads"
+            )).fetchone()
+            refs = conn.execute(sqlalchemy.text(
+                "SELECT COUNT(*) FROM conversations WHERE screen_key IS NOT NULL"
+            )).scalar()
+            ref_raw = conn.execute(sqlalchemy.text(
+                "SELECT COALESCE(SUM(p.raw_bytes), 0) FROM conversations c "
+                "JOIN screen_payloads p ON p.key = c.screen_key"
+            )).scalar()
+        payloads, raw_total, stored_total = int(row[0]), int(row[1]), int(row[2])
+        result["database"] = {
+            "payloads": payloads,
+            "referencing_rows": int(refs or 0),
+            "raw_bytes_if_inline": int(ref_raw or 0),
+            "raw_bytes_unique": raw_total,
+            "stored_bytes": stored_total,
+            "compression_ratio": round(raw_total / stored_total, 2) if stored_total else None,
+            "total_savings_ratio": round(int(ref_raw or 0) / stored_total, 2) if stored_total else None,
+        }
+    return result
+
+
+def backfill(engine, batch_size: int = 500) -> int:
+    """把舊資料列的 inline screen_info 搬到 screen_payloads"""
+    moved = 0
+    for table in ("conversations", "conversations_archive"):
+        while True:
+            with engine.connect() as conn:
+                rows = conn.execute(sqlalchemy.text(
+                    f"SELECT id, screen_info FROM {table} "
+                    "WHERE screen_key IS NULL AND screen_info IS NOT NULL LIMIT :n"
+                ), {"n": batch_size}).fetchall()
+                if not rows:
+                    break
+                for row_id, screen_text in rows:
+                    try:
+                        screen_info = json.loads(screen_text)
+                    except Exception:
+                        screen_info = screen_text
+                    key = put(conn, screen_info)
+                    conn.execute(
+                        sqlalchemy.text(f"UPDATE {table} SET screen_key = :k, screen_info = NULL WHERE id = :id"),
+                        {"k": key, "id": row_id},
+                    )
+                conn.commit()
+                moved += len(rows)
+                print(f"[SCREEN_STORE] {table}: backfilled {moved} rows")
+    return moved
+
+
+if __name__ == "__main__":
+    import sys
+    from main import get_db_engine
+
+    engine_main = get_db_engine()
+    if "--backfill" in sys.argv:
+        batch = int(sys.argv[sys.argv.index("--batch") + 1]) if "--batch" in sys.argv else 500
+        backfill(engine_main, batch)
+    print(json.dumps(stats(engine_main), ensure_ascii=False, indent=2))
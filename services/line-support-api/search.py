@@ -0,0 +1,160 @@
+# search.py
+"""LINE help search through the Google Custom Search API.
+
+Results are cached per (normalized query, num_results) in a size-bounded
+LRU with a TTL; only successful searches are cached. search_many() serves
+a deduplicated batch, running the cache misses on a bounded thread pool.
+"""
+import os
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+ENABLE_SEARCH = os.environ.get('ENABLE_SEARCH', 'true').lower() == 'true'
+
+# 搜尋結果快取與批次 /search 的並行上限
+SEARCH_CACHE_TTL = int(os.environ.get('SEARCH_CACHE_TTL', '21600'))  # 秒
+SEARCH_CACHE_MAX = int(os.environ.get('SEARCH_CACHE_MAX', '1000'))  # 筆數上限，超過時淘汰最久未用的
+SEARCH_MAX_WORKERS = int(os.environ.get('SEARCH_MAX_WORKERS', '8'))
+SEARCH_MAX_QUERIES = int(os.environ.get('SEARCH_MAX_QUERIES', '100'))
+SEARCH_MAX_RESULTS = 10  # Custom Search API 每次最多回傳 10 筆
+
+_search_cache: "OrderedDict[Tuple[str, int], Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+_search_cache_lock = threading.Lock()
+_search_local = threading.local()
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(unicodedata.normalize("NFKC", str(query or "")).split())
+
+
+def _search_cache_get(key) -> Optional[List[Dict[str, Any]]]:
+    with _search_cache_lock:
+        entry = _search_cache.get(key)
+        if entry is None:
+            return None
+        expires_at, results = entry
+        if expires_at < time.time():
+            del _search_cache[key]
+            return None
+        _search_cache.move_to_end(key)
+        return results
+
+
+def _search_cache_put(key, results):
+    with _search_cache_lock:
+        _search_cache[key] = (time.time() + SEARCH_CACHE_TTL, results)
+        _search_cache.move_to_end(key)
+        while len(_search_cache) > SEARCH_CACHE_MAX:
+            _search_cache.popitem(last=False)
+
+
+def _search_service(api_key):
+    # httplib2 不是 thread-safe，每個執行緒各自建立一個 client
+    service = getattr(_search_local, "service", None)
+    if service is None:
+        from googleapiclient.discovery import build
+        service = build("customsearch", "v1", developerKey=api_key)
+        _search_local.service = service
+    return service
+
+
+def search_line_help_cached(query, num_results=5) -> Tuple[List[Dict[str, Any]], bool]:
+    """Same as search_line_help but also reports whether the result came from the cache"""
+    if not ENABLE_SEARCH:
+        return [], False
+
+    key = (normalize_query(query), num_results)
+    cached = _search_cache_get(key)
+    if cached is not None:
+        return cached, True
+
+    API_KEY = os.environ.get("GOOGLE_SEARCH_API_KEY")
+    SEARCH_ENGINE_ID = os.environ.get("GOOGLE_CSE_ID", "44e73185ae7344428")
+    if not API_KEY:
+        print("Warning: GOOGLE_SEARCH_API_KEY not found in environment variables")
+        return [], False
+
+    try:
+        service = _search_service(API_KEY)
+        result = (
+            service.cse()
+            .list(q=query, cx=SEARCH_ENGINE_ID, num=num_results, hl="zh-TW")
+            .execute()
+        )
+
+        search_results = []
+        for item in result.get("items", []):
+            search_results.append(
+                {
+                    "title": item.get("title"),
+                    "link": item.get("link"),
+                    "snippet": item.get("snippet"),
+                    "displayLink": item.get("displayLink"),
+                }
+            )
+
+        # 只快取成功的查詢；錯誤不快取，下次會重試
+        _search_cache_put(key, search_results)
+        return search_results, False
+    except Exception as e:
+        print(f"Search error: {e}")
+        return [], False
+
+
+def search_line_help(query, num_results=5):
+    """Search LINE help documentation using Custom Search API"""
+    results, _ = search_line_help_cached(query, num_results)
+    return results
+
+
+def search_many(queries: List[str], num_results=5, max_workers=SEARCH_MAX_WORKERS) -> List[Dict[str, Any]]:
+    """Deduplicate queries, serve cached ones directly and run the rest on a bounded pool"""
+    unique: List[str] = []
+    seen = set()
+    for q in queries:
+        nq = normalize_query(q)
+        if nq and nq not in seen:
+            seen.add(nq)
+            unique.append(nq)
+
+    def run_one(q):
+        start = time.perf_counter()
+        results, cached = search_line_help_cached(q, num_results)
+        return {
+            "query": q,
+            "results": results,
+            "count": len(results),
+            "cached": cached,
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+        }
+
+    # 快取命中不佔用 worker
+    out: Dict[str, Dict[str, Any]] = {}
+    misses = []
+    for q in unique:
+        if _search_cache_get((q, num_results)) is not None:
+            out[q] = run_one(q)
+        else:
+            misses.append(q)
+    if misses:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(misses)))) as pool:
+            for item in pool.map(run_one, misses):
+                out[item["query"]] = item
+    return [out[q] for q in unique]
+
+
+def parse_batch_request(request_json: Dict[str, Any]) -> Tuple[List[str], int]:
+    """驗證批次 /search 的 body，回傳 (queries, num_results)；不合法時 raise ValueError（訊息直接回給呼叫端）"""
+    queries = request_json.get('queries')
+    if not isinstance(queries, list) or not all(isinstance(q, str) for q in queries):
+        raise ValueError("queries must be a list of strings")
+    if len(queries) > SEARCH_MAX_QUERIES:
+        raise ValueError(f"Too many queries (max {SEARCH_MAX_QUERIES})")
+    num_results = request_json.get('num_results', 5)
+    if not isinstance(num_results, int) or isinstance(num_results, bool) or not 1 <= num_results <= SEARCH_MAX_RESULTS:
+        raise ValueError(f"num_results must be an integer between 1 and {SEARCH_MAX_RESULTS}")
+    return queries, num_results
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Offline tests for the goal registry (no database needed; a small in-memory
+engine double stands in for the goals table).
+
+Run from services/line-support-api:
+    python -m pytest tests/test_goal_registry.py -q
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import goal_registry
+
+class GoalsEngine:
+    """Stands in for the SQLAlchemy engine; answers the goal_registry queries and records them"""
+
+    def __init__(self, goals=None, neighbours=None):
+        self.goals = dict(goals or {})            # normalized -> id
+        self.neighbours = dict(neighbours or {})  # id -> [(id, distance)], nearest first
+        self.queries = []
+        self.commits = 0
+
+    def connect(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def commit(self):
+        self.commits += 1
+
+    def execute(self, statement, params):
+        sql = str(statement)
+        self.queries.append((sql, params))
+        if sql.startswith("SELECT id FROM goals"):
+            self.value = self.goals.get(params["n"])
+        elif sql.startswith("INSERT INTO goals"):
+            self.value = self.goals.setdefault(params["n"], len(self.goals) + 1)
+        else:
+            found = [(gid,) for gid, dist in self.neighbours.get(params["gid"], []) if dist <= params["maxd"]]
+            self.value = found[:params["k"]]
+        return self
+
+    def scalar(self):
+        return self.value
+
+    def fetchall(self):
+        return self.value
+
+@pytest.fixture(autouse=True)
+def empty_caches():
+    goal_registry._ids.clear()
+    goal_registry._expansions.clear()
+    yield
+    goal_registry._ids.clear()
+    goal_registry._expansions.clear()
+
+def test_normalize_goal_folds_width_case_space_and_punctuation():
+    assert goal_registry.normalize_goal(" 加 好友！ ") == "加好友"
+    assert goal_registry.normalize_goal("ＬＩＮＥ　Pay：綁定") == "linepay綁定"
+    assert goal_registry.normalize_goal("傳送😀貼圖~") == "傳送貼圖"
+    assert goal_registry.normalize_goal(None) == ""
+
+def test_get_goal_id_registers_once_and_caches():
+    engine = GoalsEngine({"加好友": 7})
+    embedded = []
+    embed = lambda text: embedded.append(text) or [0.1] * 768
+
+    assert goal_registry.get_goal_id(engine, "加好友", embed) == 7
+    assert goal_registry.get_goal_id(engine, "加 好友!", embed) == 7
+    assert len(engine.queries) == 1 and embedded == []
+
+    assert goal_registry.get_goal_id(engine, "傳照片", embed) == 2
+    assert embedded == ["傳照片"] and engine.commits == 1
+    assert goal_registry.get_goal_id(engine, "傳照片。", embed) == 2
+    assert len(engine.queries) == 3
+
+def test_goal_id_cache_is_bounded_lru(monkeypatch):
+    monkeypatch.setattr(goal_registry, "GOAL_CACHE_MAX", 2)
+    engine = GoalsEngine({"a": 1, "b": 2, "c": 3})
+    for goal in ("a", "b", "a", "c"):
+        goal_registry.get_goal_id(engine, goal, lambda text: [0.0] * 768)
+    assert list(goal_registry._ids) == ["a", "c"]
+
+def test_similar_goal_ids_puts_current_goal_first_and_caches(monkeypatch):
+    engine = GoalsEngine(neighbours={1: [(4, 0.05), (9, 0.10), (3, 0.30)]})
+    assert goal_registry.similar_goal_ids(engine, 1, k=3, max_distance=0.12) == [1, 4, 9]
+    assert goal_registry.similar_goal_ids(engine, 1, k=3, max_distance=0.12) == [1, 4, 9]
+    assert len(engine.queries) == 1
+
+    # 過期後重新查詢
+    monkeypatch.setattr(goal_registry, "GOAL_EXPANSION_TTL", -1)
+    goal_registry._expansions.clear()
+    goal_registry.similar_goal_ids(engine, 1, k=1)
+    goal_registry.similar_goal_ids(engine, 1, k=1)
+    assert len(engine.queries) == 3
+
+def test_similar_goal_ids_without_expansion_skips_the_database():
+    engine = GoalsEngine()
+    assert goal_registry.similar_goal_ids(engine, 5, k=0) == [5]
+    assert engine.queries == []
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Offline tests for the migration statement splitter (no database needed).
+
+Run from services/line-support-api:
+    python -m pytest tests/test_migrate.py -q
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from migrate import MIGRATIONS_DIR, _split_statements, list_migrations
+
+def test_trailing_comment_after_semicolon_still_splits():
+    sql = "SELECT 1;  -- first\nSELECT 2; /* second */\n-- only a comment\nSELECT 3"
+    assert _split_statements(sql) == ["SELECT 1", "SELECT 2", "SELECT 3"]
+
+def test_semicolons_inside_quotes_and_comments_do_not_split():
+    sql = (
+        "INSERT INTO t VALUES ('a;b', 'it''s;', E'\\';');\n"
+        'SELECT "odd;name" FROM t; -- trailing; comment\n'
+        "SELECT 1 /* a; /* nested; */ b; */ + 1;"
+    )
+    assert _split_statements(sql) == [
+        "INSERT INTO t VALUES ('a;b', 'it''s;', E'\\';')",
+        'SELECT "odd;name" FROM t',
+        "SELECT 1   + 1",
+    ]
+
+def test_dollar_quoted_bodies_stay_intact():
+    sql = (
+        "CREATE FUNCTION f() RETURNS INT AS $$\nBEGIN\n  RETURN 1; -- inner\nEND;\n$$ LANGUAGE plpgsql;\n"
+        "DO $body$ BEGIN PERFORM 1; END $body$;  -- done\n"
+        "SELECT $1;"
+    )
+    statements = _split_statements(sql)
+    assert len(statements) == 3
+    assert statements[0].endswith("$$ LANGUAGE plpgsql")
+    assert "RETURN 1; -- inner" in statements[0]
+    assert statements[1] == "DO $body$ BEGIN PERFORM 1; END $body$"
+    assert statements[2] == "SELECT $1"
+
+def test_shipped_migrations_split_into_complete_statements():
+    for name in list_migrations():
+        with open(os.path.join(MIGRATIONS_DIR, name), encoding='utf-8') as f:
+            statements = _split_statements(f.read())
+        assert statements, name
+        for statement in statements:
+            assert not statement.lstrip().startswith('--'), (name, statement)
+            assert statement.count('$$') % 2 == 0, (name, statement)
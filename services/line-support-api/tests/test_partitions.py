@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Tests for the conversations partitioning (migrations 002 / 005).
+Need TEST_DATABASE_URL (see conftest.py); skipped otherwise.
+
+Run from services/line-support-api:
+    TEST_DATABASE_URL=postgresql+pg8000://... python -m pytest tests/test_partitions.py -q
+"""
+
+import datetime
+
+import sqlalchemy
+
+from conftest import vec
+
+def partition_of(conn, user_input):
+    return conn.execute(sqlalchemy.text(
+        "SELECT tableoid::regclass::text FROM conversations WHERE user_input = :u"
+    ), {'u': user_input}).scalar()
+
+def test_legacy_copy_keeps_every_row_and_its_created_at(migrated_db):
+    old = datetime.datetime(2024, 5, 17, 8, 30, tzinfo=datetime.timezone.utc)
+    conn = migrated_db([
+        ('old', vec(0.1), 'a', '加好友', old),
+        ('undated', vec(0.2), 'b', '加好友', None),
+    ])
+    rows = dict(conn.execute(sqlalchemy.text("SELECT user_input, created_at FROM conversations")).fetchall())
+    assert set(rows) == {'old', 'undated'}
+    assert rows['old'] == old
+    assert rows['undated'] > old
+    # 005 給 DEFAULT 中的舊月份補建分區
+    assert partition_of(conn, 'old') == 'conversations_y2024m05'
+    assert conn.execute(sqlalchemy.text("SELECT count(*) FROM conversations_default")).scalar() == 0
+    assert conn.execute(sqlalchemy.text("SELECT to_regclass('conversations_legacy')")).scalar() is None
+
+def test_new_partition_takes_rows_already_in_default(migrated_db):
+    conn = migrated_db()
+    for user_input, day in (('march', '2001-03-10'), ('april', '2001-04-02')):
+        conn.execute(sqlalchemy.text(
+            "INSERT INTO conversations (user_input, user_input_vector, created_at) "
+            "VALUES (:u, CAST(:v AS vector), CAST(:d AS timestamptz))"
+        ), {'u': user_input, 'v': vec(0.3), 'd': day})
+    conn.commit()
+    assert partition_of(conn, 'march') == 'conversations_default'
+
+    created = conn.execute(sqlalchemy.text("SELECT ensure_conversation_partitions(0, DATE '2001-03-01')")).scalar()
+    conn.commit()
+
+    assert created == 1
+    assert partition_of(conn, 'march') == 'conversations_y2001m03'
+    assert partition_of(conn, 'april') == 'conversations_default'
+    assert conn.execute(sqlalchemy.text("SELECT count(*) FROM conversations")).scalar() == 2
+    # 已存在的分區不會重建
+    assert conn.execute(sqlalchemy.text("SELECT ensure_conversation_partitions(0, DATE '2001-03-01')")).scalar() == 0
+
+def test_quantized_vector_indexes_exist_on_partitioned_table(migrated_db):
+    conn = migrated_db([('old', vec(0.1), 'a', '加好友', None)])
+    indexes = {row[0] for row in conn.execute(sqlalchemy.text(
+        "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE i.indrelid = 'conversations'::regclass"
+    ))}
+    assert {'conversations_vec_half_hnsw', 'conversations_vec_bin_hnsw'} <= indexes
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Tests for archiving old conversations (retention.py).
+Need TEST_DATABASE_URL (see conftest.py) and the service dependencies; skipped otherwise.
+
+Run from services/line-support-api:
+    TEST_DATABASE_URL=postgresql+pg8000://... python -m pytest tests/test_retention.py -q
+"""
+
+import sqlalchemy
+
+import retention
+from conftest import vec
+
+def test_archived_row_keeps_goal_id_and_is_found_with_include_archive(migrated_db):
+    conn = migrated_db()
+    import main
+
+    goal_id = conn.execute(sqlalchemy.text(
+        "INSERT INTO goals (normalized, display) VALUES ('加好友', '加好友') RETURNING id"
+    )).scalar()
+    conn.execute(sqlalchemy.text(
+        "INSERT INTO conversations (user_input, user_input_vector, ai_response, goal, goal_id, created_at) "
+        "VALUES ('怎麼加好友', CAST(:v AS vector), '點右上角的人像', '加好友', :gid, now() - interval '90 days')"
+    ), {'v': vec(1.0, 0.5), 'gid': goal_id})
+    conn.commit()
+
+    assert retention.archive_old_rows(conn, days=30) == 1
+    assert conn.execute(sqlalchemy.text("SELECT count(*) FROM conversations")).scalar() == 0
+    assert conn.execute(sqlalchemy.text("SELECT goal_id FROM conversations_archive")).scalar() == goal_id
+
+    params = {'vec': vec(1.0, 0.5), 'goal_ids': [goal_id]}
+    for storage in ('vector', 'halfvec', 'binary'):
+        query, base = main.similar_conversations_query(storage, k=5, include_archive=False)
+        assert conn.execute(query, {**base, **params}).fetchall() == []
+        query, base = main.similar_conversations_query(storage, k=5, include_archive=True)
+        rows = conn.execute(query, {**base, **params}).fetchall()
+        assert [(r[0], r[1]) for r in rows] == [('怎麼加好友', '點右上角的人像')], storage
+
+def test_archive_backfill_migration_fills_goal_id(migrated_db):
+    conn = migrated_db()
+    import migrate
+
+    goal_id = conn.execute(sqlalchemy.text(
+        "INSERT INTO goals (normalized, display) VALUES ('傳照片', '傳照片') RETURNING id"
+    )).scalar()
+    conn.execute(sqlalchemy.text(
+        "INSERT INTO conversations_archive (id, user_input, user_input_vector, goal, created_at) "
+        "VALUES (1, '照片怎麼傳', CAST(:v AS halfvec), '傳照片', now() - interval '90 days')"
+    ), {'v': vec(0.2)})
+    conn.commit()
+
+    with open(f"{migrate.MIGRATIONS_DIR}/006_archive_goal_id.sql", encoding='utf-8') as f:
+        for statement in migrate._split_statements(f.read()):
+            conn.exec_driver_sql(statement)
+    conn.commit()
+    assert conn.execute(sqlalchemy.text("SELECT goal_id FROM conversations_archive WHERE id = 1")).scalar() == goal_id
+
+def test_rewritten_payload_survives_orphan_purge(migrated_db):
+    conn = migrated_db()
+    import screen_store
+
+    key = screen_store.put(conn, {'screen': 'chat'})
+    conn.execute(sqlalchemy.text(
+        "UPDATE screen_payloads SET created_at = now() - interval '3 days' WHERE key = :k"
+    ), {'k': key})
+    conn.commit()
+
+    # 同一畫面又被寫入（新的資料列即將引用它）：created_at 會更新，purge 不會刪掉
+    assert screen_store.put(conn, {'screen': 'chat'}) == key
+    conn.commit()
+    assert retention.purge_orphan_screens(conn, hours=24) == 0
+    assert screen_store.put(conn, {'screen': 'settings'}) != key
+    conn.execute(sqlalchemy.text("UPDATE screen_payloads SET created_at = now() - interval '3 days'"))
+    assert retention.purge_orphan_screens(conn, hours=24) == 2
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Offline tests for screen payload loading (no database needed; a small
+in-memory engine double answers the screen_payloads SELECT).
+
+Run from services/line-support-api:
+    python -m pytest tests/test_screen_store.py -q
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import screen_store
+
+class PayloadEngine:
+    """Stands in for the SQLAlchemy engine; records every query it runs"""
+
+    def __init__(self, texts):
+        self.payloads = {}
+        for text in texts:
+            key, data, _ = screen_store.encode(text)
+            self.payloads[key] = (screen_store.CODEC, data)
+        self.queries = []
+
+    def connect(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement, params):
+        self.queries.append((str(statement), params))
+        keys = params['keys']
+        self.rows = [(k, *self.payloads[k]) for k in keys if k in self.payloads]
+        return self
+
+    def fetchall(self):
+        return self.rows
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    screen_store._cache.clear()
+    yield
+    screen_store._cache.clear()
+
+def key_of(text):
+    return screen_store.encode(text)[0]
+
+def test_batch_loads_every_screen_in_one_query():
+    texts = ['{"screen": "chat"}', '{"screen": "settings"}', '{"screen": "friends"}']
+    engine = PayloadEngine(texts)
+    screens = screen_store.lazy_screens(engine, [(key_of(t), None) for t in texts] + [(None, 'inline text')])
+    assert engine.queries == []
+
+    assert str(screens[1]) == texts[1]
+    assert len(engine.queries) == 1
+    assert 'key = ANY(:keys)' in engine.queries[0][0]
+    assert [str(s) for s in screens] == texts + ['inline text']
+    assert len(engine.queries) == 1
+
+def test_cached_keys_are_not_fetched_again():
+    texts = ['{"screen": "a"}', '{"screen": "b"}']
+    engine = PayloadEngine(texts)
+    assert screen_store.load(engine, key_of(texts[0])) == texts[0]
+
+    screens = screen_store.lazy_screens(engine, [(key_of(t), None) for t in texts])
+    assert [str(s) for s in screens] == texts
+    assert len(engine.queries) == 2
+    assert engine.queries[1][1]['keys'] == [key_of(texts[1])]
+
+    again = screen_store.lazy_screens(engine, [(key_of(t), None) for t in texts])
+    assert [str(s) for s in again] == texts
+    assert len(engine.queries) == 2
+
+def test_missing_payload_reads_as_empty_text():
+    engine = PayloadEngine([])
+    screens = screen_store.lazy_screens(engine, [('deadbeef', None), ('deadbeef', None)])
+    assert [str(s) for s in screens] == ['', '']
+    assert engine.queries[0][1]['keys'] == ['deadbeef']
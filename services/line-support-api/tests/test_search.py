@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Offline tests for the LINE help search cache and batch handling (no network
+needed; a fake Custom Search service answers the queries).
+
+Run from services/line-support-api:
+    python -m pytest tests/test_search.py -q
+"""
+
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import search
+
+class FakeSearchService:
+    """Mimics service.cse().list(...).execute() and records each query sent"""
+
+    def __init__(self, fail=()):
+        self.calls = []
+        self.fail = set(fail)
+        self._lock = threading.Lock()
+
+    def cse(self):
+        return self
+
+    def list(self, q, cx, num, hl):
+        self._request = (q, num)
+        return self
+
+    def execute(self):
+        q, num = self._request
+        with self._lock:
+            self.calls.append(q)
+        if q in self.fail:
+            raise RuntimeError('quota exceeded')
+        return {'items': [{'title': f'{q} #{i}', 'link': f'https://help.line.me/{i}'} for i in range(num)]}
+
+@pytest.fixture
+def backend(monkeypatch):
+    service = FakeSearchService()
+    monkeypatch.setattr(search, 'ENABLE_SEARCH', True)
+    monkeypatch.setenv('GOOGLE_SEARCH_API_KEY', 'test-key')
+    monkeypatch.setattr(search, '_search_service', lambda api_key: service)
+    search._search_cache.clear()
+    yield service
+    search._search_cache.clear()
+
+def test_batch_deduplicates_normalized_queries(backend):
+    items = search.search_many(['加好友', ' 加好友 ', '加　好友', '', '傳照片'], num_results=2)
+    assert [item['query'] for item in items] == ['加好友', '加 好友', '傳照片']
+    assert sorted(backend.calls) == sorted(['加好友', '加 好友', '傳照片'])
+    assert all(item['count'] == 2 and not item['cached'] for item in items)
+
+def test_cached_queries_skip_the_backend(backend):
+    search.search_many(['加好友'], num_results=3)
+    items = search.search_many(['加好友', '封鎖'], num_results=3)
+    assert backend.calls == ['加好友', '封鎖']
+    assert [item['cached'] for item in items] == [True, False]
+    # num_results 是快取鍵的一部分
+    search.search_many(['加好友'], num_results=5)
+    assert backend.calls[-1] == '加好友'
+
+def test_failed_searches_are_not_cached(backend):
+    backend.fail.add('壞掉')
+    assert search.search_line_help('壞掉') == []
+    backend.fail.clear()
+    assert len(search.search_line_help('壞掉')) == 5
+    assert backend.calls == ['壞掉', '壞掉']
+
+def test_cache_is_bounded_lru(backend, monkeypatch):
+    monkeypatch.setattr(search, 'SEARCH_CACHE_MAX', 2)
+    for q in ('a', 'b'):
+        search.search_line_help(q)
+    search.search_line_help('a')  # a 變成最近使用
+    search.search_line_help('c')  # 淘汰 b
+    assert [key[0] for key in search._search_cache] == ['a', 'c']
+
+def test_batch_request_validation():
+    assert search.parse_batch_request({'queries': ['a', 'b']}) == (['a', 'b'], 5)
+    assert search.parse_batch_request({'queries': [], 'num_results': 10}) == ([], 10)
+    for body in (
+        {'queries': 'a'},
+        {'queries': ['a', 1]},
+        {'queries': ['a'] * (search.SEARCH_MAX_QUERIES + 1)},
+        {'queries': ['a'], 'num_results': 0},
+        {'queries': ['a'], 'num_results': 11},
+        {'queries': ['a'], 'num_results': '5'},
+        {'queries': ['a'], 'num_results': 2.5},
+        {'queries': ['a'], 'num_results': True},
+    ):
+        with pytest.raises(ValueError):
+            search.parse_batch_request(body)